@@ -0,0 +1,260 @@
+"""
+Benchmark of the analysis pipeline on synthetic sessions. Sessions of several durations are generated from the test
+fixtures: all time-resolved tables are repeated in time, scans continue to be counted across repetitions. Times
+load_irrad_data, generate_fluence_map, generate_scan_overview, create_beam_scan_mask, calibration.main and the
+plotting of the scan analysis into a PDF. Each step runs in a fresh process which also loads its input data; the
+peak RSS of that process is recorded. Results are written to a JSON file and optionally compared to a baseline,
+failing if any step is slower or needs more memory than the baseline by more than the given tolerance, or if a
+session or step is missing in the baseline. Peak RSS is only compared if the baseline was recorded with the same
+Python version.
+
+Usage: python benchmarks/bench_analysis.py [--hours H [H ...]] [--bins N] [--output JSON] [--baseline JSON] [--tolerance FRACTION] [--report-only]
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import resource
+import tempfile
+import numpy as np
+import tables as tb
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+
+FIXTURES = os.path.join(os.path.dirname(__file__), '../tests/fixtures')
+
+FILTERS = tb.Filters(complib='blosc:lz4', complevel=5, shuffle=True)
+
+# Tables which describe the whole session and are not repeated in time
+STATIC_TABLES = ('irrad', 'result', 'rawoffset')
+
+# Allowed absolute slowdown in seconds; durations of the fast steps fluctuate by more than the relative tolerance
+DURATION_SLACK = 0.05
+
+STEPS = ('load', 'fluence_map', 'scan_overview', 'beam_scan_mask', 'calibration', 'plotting')
+
+
+def generate_session(fixture, hours, out_base):
+    """
+    Generate a synthetic session of *hours* duration from *fixture* and write it to *out_base*.h5 / .yaml
+
+    Returns
+    -------
+    dict
+        Number of rows per table of the generated session
+    """
+
+    def is_tiled(table):
+        return os.path.basename(table._v_pathname).lower() not in STATIC_TABLES and table.nrows > 0
+
+    with tb.open_file(os.path.join(FIXTURES, fixture + '.h5')) as in_file, tb.open_file(out_base + '.h5', 'w') as out_file:
+
+        tables = {table._v_pathname: table.read() for table in in_file.walk_nodes('/', classname='Table') if is_tiled(table)}
+
+        # Repeat the fixture with the period of its total duration
+        timestamps = np.concatenate([data[field] for data in tables.values() for field in data.dtype.names if field.endswith('timestamp')])
+        period = timestamps.max() - timestamps.min() + 1.0
+        reps = max(1, int(np.ceil(hours * 3600 / period)))
+
+        n_rows = {}
+
+        for leaf in in_file.walk_nodes('/', classname='Leaf'):
+
+            where, name = os.path.split(leaf._v_pathname)
+
+            # Histograms and session-wide tables are copied as they are
+            if leaf._v_pathname not in tables:
+                if where not in out_file:
+                    out_file.create_group(os.path.dirname(where), os.path.basename(where), createparents=True)
+                leaf.copy(newparent=out_file.get_node(where))
+                continue
+
+            data = tables[leaf._v_pathname]
+            tiled = np.tile(data, reps)
+            offsets = np.repeat(np.arange(reps), len(data))
+
+            for field in data.dtype.names:
+                if field.endswith('timestamp'):
+                    tiled[field] += offsets * period
+
+            # Scans continue to be counted; individually scanned rows are marked with -1
+            if 'scan' in data.dtype.names:
+                complete = tiled['scan'] != -1
+                tiled['scan'][complete] += (offsets * (data['scan'].max() + 1))[complete].astype(tiled['scan'].dtype)
+
+            out_file.create_table(where, name=name, obj=tiled, filters=FILTERS, createparents=True)
+            n_rows[leaf._v_pathname] = len(tiled)
+
+    shutil.copy(os.path.join(FIXTURES, fixture + '.yaml'), out_base + '.yaml')
+
+    return n_rows
+
+
+def _peak_rss():
+    """Peak resident set size of this process in MB"""
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes on Linux
+    return max_rss / 1e6 if sys.platform == 'darwin' else max_rss / 1e3
+
+
+def run_step(step, session_base, calibration_base, bins):
+    """
+    Run the analysis *step* on the synthetic sessions. Meant to be run in a fresh process
+
+    Returns
+    -------
+    tuple
+        Duration of the step in seconds and peak RSS of the process in MB
+    """
+
+    import matplotlib
+    matplotlib.use('Agg')
+
+    from matplotlib.backends.backend_pdf import PdfPages
+    from irrad_control.analysis import fluence, scan, calibration
+    from irrad_control.analysis.utils import load_irrad_data
+    from irrad_control.analysis.main import save_plots
+
+    base = calibration_base if step == 'calibration' else session_base
+
+    start = time.perf_counter()
+
+    data, config = load_irrad_data(data_file=base + '.h5', config_file=base + '.yaml')
+
+    if step != 'load':
+
+        server_config = next(iter(config['server'].values()))
+        server_data = data[server_config['name']]
+
+        # Exclude compilation of the fluence map generation
+        if step == 'fluence_map':
+            fluence.generate_fluence_map(beam_data=server_data['Beam'], scan_data=server_data['Scan'][:3], irrad_data=server_data['Irrad'], bins=(10, 10))
+
+        start = time.perf_counter()
+
+        if step == 'fluence_map':
+            fluence.generate_fluence_map(beam_data=server_data['Beam'], scan_data=server_data['Scan'], irrad_data=server_data['Irrad'], bins=(bins, bins))
+
+        elif step == 'scan_overview':
+            scan.generate_scan_overview(scan_data=server_data['Scan'], damage_data=server_data['Damage'], irrad_data=server_data['Irrad'])
+
+        elif step == 'beam_scan_mask':
+            scan.create_beam_scan_mask(beam_data=server_data['Beam'], scan_data=server_data['Scan'])
+
+        elif step == 'calibration':
+            calibration.main(data=data, config=server_config)
+
+        elif step == 'plotting':
+            with tempfile.TemporaryDirectory() as tmp_dir, PdfPages(os.path.join(tmp_dir, 'bench_analysis.pdf')) as out_pdf:
+                save_plots(plots=scan.main(data=data, config=server_config), outfile=out_pdf)
+
+    return time.perf_counter() - start, _peak_rss()
+
+
+def compare(results, baseline, tolerance):
+    """
+    Compare the durations and peak RSS of *results* to *baseline*. The memory usage depends on the Python version,
+    therefore peak RSS is only compared if *baseline* was recorded with the same Python version as *results*
+
+    Returns
+    -------
+    tuple
+        Descriptions of the steps which exceed the baseline by more than *tolerance* and of the sessions and
+        steps which are missing in the baseline
+    """
+
+    regressions, missing = [], []
+
+    quantities = [('duration', 's', DURATION_SLACK)]
+    if baseline.get('python') == results['python']:
+        quantities.append(('peak_rss_mb', 'MB', 0))
+
+    for session, steps in results['sessions'].items():
+
+        if session not in baseline['sessions']:
+            missing.append(f"{session}: session not in baseline")
+            continue
+
+        for step, res in steps['steps'].items():
+
+            if step not in baseline['sessions'][session]['steps']:
+                missing.append(f"{session} {step}: step not in baseline")
+                continue
+
+            reference = baseline['sessions'][session]['steps'][step]
+
+            for quantity, unit, slack in quantities:
+                if res[quantity] > reference[quantity] * (1 + tolerance) + slack:
+                    regressions.append(f"{session} {step}: {quantity} {res[quantity]:.3f} {unit} vs. {reference[quantity]:.3f} {unit} baseline")
+
+    return regressions, missing
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--hours', type=float, nargs='+', default=[1, 24], help='Durations of the synthetic sessions in hours')
+    parser.add_argument('--bins', type=int, default=100, help='Number of bins of the fluence map per dimension')
+    parser.add_argument('--fixture', default='test_irrad_w_corr', help='Name of the irradiation fixture in tests/fixtures')
+    parser.add_argument('--output', default=None, help='Path of the JSON file the results are written to')
+    parser.add_argument('--baseline', default=None, help='Path of a JSON file with baseline results to compare to')
+    parser.add_argument('--tolerance', type=float, default=0.5, help='Allowed relative increase of duration and peak RSS with respect to the baseline')
+    parser.add_argument('--report-only', action='store_true', help='Only report the comparison to the baseline, do not fail')
+    args = parser.parse_args()
+
+    results = {'python': platform.python_version(), 'platform': platform.platform(), 'bins': args.bins, 'sessions': {}}
+
+    print(f"{'session':>8} | {'step':>14} | {'duration [s]':>12} | {'peak RSS [MB]':>13}")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+
+        for hours in args.hours:
+
+            session = f'{hours:g}h'
+            session_base = os.path.join(tmp_dir, f'session_{session}')
+            calibration_base = os.path.join(tmp_dir, f'calibration_{session}')
+
+            n_rows = generate_session(fixture=args.fixture, hours=hours, out_base=session_base)
+            n_rows.update(generate_session(fixture='test_calibration', hours=hours, out_base=calibration_base))
+
+            results['sessions'][session] = {'rows': {node: n for node, n in n_rows.items() if node.endswith(('Beam', 'Scan', 'Raw'))}, 'steps': {}}
+
+            for step in STEPS:
+
+                with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as executor:
+                    duration, peak_rss = executor.submit(run_step, step, session_base, calibration_base, args.bins).result()
+
+                results['sessions'][session]['steps'][step] = {'duration': duration, 'peak_rss_mb': peak_rss}
+
+                print(f"{session:>8} | {step:>14} | {duration:>12.3f} | {peak_rss:>13.1f}")
+
+    if args.output is not None:
+        with open(args.output, 'w') as out_file:
+            json.dump(results, out_file, indent=2)
+
+    if args.baseline is not None:
+
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+
+        if baseline.get('python') != results['python']:
+            print(f"Baseline recorded with Python {baseline.get('python')}, not comparing peak RSS")
+
+        regressions, missing = compare(results=results, baseline=baseline, tolerance=args.tolerance)
+
+        for regression in regressions:
+            print(f"Regression: {regression}")
+
+        for entry in missing:
+            print(f"Missing: {entry}")
+
+        if (regressions or missing) and not args.report_only:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
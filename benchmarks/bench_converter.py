@@ -0,0 +1,323 @@
+"""
+End-to-end throughput benchmark of the IrradConverter. One or more simulated IrradServers, each in its own process,
+publish raw_data, scan, temp, axis and rad_monitor packets at fixed rates on localhost; the packets are replayed from
+the test fixtures. A converter process is started and set up as in a session. Reports the sustained rate of stored
+packets, the latency from publishing a packet to receiving its interpreted output on the converter's data port,
+the packets dropped at the high-water marks and the CPU usage of the converter, incl. its worker processes.
+
+Each simulated server publishes on its own loopback address 127.0.0.N, as servers are identified by their IP.
+CPU usage is read from /proc; Linux only.
+
+Usage: python benchmarks/bench_converter.py [--servers N [N ...]] [--duration SECONDS] [--rate TYPE=HZ [TYPE=HZ ...]]
+                                            [--hwm N] [--codec {json,msgpack}] [--sharded]
+"""
+import os
+import time
+import argparse
+import tempfile
+import threading
+import itertools
+import multiprocessing
+import numpy as np
+import tables as tb
+import zmq
+
+from irrad_control import pid_file
+from irrad_control.utils.tools import load_yaml
+from irrad_control.utils.serializer import Serializer, CODECS
+from irrad_control.analysis.utils import load_irrad_data
+from irrad_control.processes.converter import IrradConverter
+
+
+FIXTURES = os.path.join(os.path.dirname(__file__), '../tests/fixtures')
+
+FIXTURE = 'test_irrad_w_corr'
+
+# Packets per second and server
+RATES = {'raw_data': 100, 'scan': 2, 'temp': 1, 'axis': 2, 'rad_monitor': 1}
+
+# Output tables which hold one row per packet of the respective type
+TABLES = {'raw_data': 'Raw', 'temp': 'Temperature/ArduinoNTCReadout', 'axis': 'Motorstage/ScanStage', 'rad_monitor': 'RadMonitor'}
+
+
+def replay_packets(kind, data, server, ip):
+    """
+    Infinite generator of the data of packets of *kind*, replayed from the fixture *data* of *server*
+
+    Yields
+    ------
+    dict
+        Data of the packet; its meta data is added on sending
+    """
+
+    if kind == 'raw_data':
+        channels = [ch for ch in data['Raw'].dtype.names if ch != 'timestamp']
+        for raw in itertools.cycle(data['Raw']):
+            yield {ch: float(raw[ch]) for ch in channels}
+
+    elif kind == 'temp':
+        sensors = [s for s in data['Temperature']['ArduinoNTCReadout'].dtype.names if s != 'timestamp']
+        for temp in itertools.cycle(data['Temperature']['ArduinoNTCReadout']):
+            yield {s: float(temp[s]) for s in sensors}
+
+    elif kind == 'axis':
+        for axis in itertools.cycle(data['Motorstage']['ScanStage']):
+            yield {'axis_domain': 'ScanStage', 'axis': int(axis['axis']), 'status': axis['movement_status'].decode(),
+                   'position': float(axis['position']), 'speed': float(axis['speed']), 'accel': float(axis['accel']), 'travel': float(axis['travel'])}
+
+    elif kind == 'rad_monitor':
+        rng = np.random.default_rng()
+        while True:
+            yield {'dose_rate': float(rng.uniform(1, 10)), 'frequency': float(rng.uniform(10, 100))}
+
+    elif kind == 'scan':
+        irrad = data['Irrad'][0]
+        yield {'status': 'scan_init',
+               'row_sep': float(irrad['row_separation']),
+               'n_rows': int(irrad['n_rows']),
+               'aim_damage': irrad['aim_damage'].decode(),
+               'aim_value': float(irrad['aim_value']),
+               'min_current': float(irrad['min_scan_current']),
+               'scan_origin': (float(irrad['scan_origin_x']), float(irrad['scan_origin_y'])),
+               'scan_area_start': (float(irrad['scan_area_start_x']), float(irrad['scan_area_start_y'])),
+               'scan_area_stop': (float(irrad['scan_area_stop_x']), float(irrad['scan_area_stop_y'])),
+               'dut_rect_start': (float(irrad['dut_rect_start_x']), float(irrad['dut_rect_start_y'])),
+               'dut_rect_stop': (float(irrad['dut_rect_stop_x']), float(irrad['dut_rect_stop_y'])),
+               'beam_fwhm': (float(irrad['beam_fwhm_x']), float(irrad['beam_fwhm_y']))}
+
+        # Complete scans only; scans continue to be counted across repetitions
+        rows = data['Scan'][data['Scan']['scan'] != -1]
+        n_scans = int(rows['scan'][-1]) + 1
+
+        for rep in itertools.count():
+            for i, row in enumerate(rows):
+                scan = int(row['scan']) + rep * n_scans
+                yield {'status': 'scan_start', 'scan': scan, 'row': int(row['row']), 'speed': float(row['row_scan_speed']),
+                       'accel': float(row['row_scan_accel']), 'x_start': float(row['row_start_x']), 'y_start': float(row['row_start_y'])}
+                yield {'status': 'scan_stop', 'x_stop': float(row['row_stop_x']), 'y_stop': float(row['row_stop_y'])}
+                if i == len(rows) - 1 or rows['scan'][i + 1] != row['scan']:
+                    yield {'status': 'scan_complete', 'scan': scan}
+
+
+class SimulatedServer(multiprocessing.Process):
+    """
+    Process publishing packets of an IrradServer on *ip* at the given *rates* for *duration* seconds once *start_event*
+    is set. The port is put into *results* after binding, followed by the number of sent packets per type
+    """
+
+    def __init__(self, ip, rates, duration, hwm, codec, start_event):
+        super(SimulatedServer, self).__init__(name=f'SimulatedServer {ip}')
+        self.ip = ip
+        self.rates = rates
+        self.duration = duration
+        self.hwm = hwm
+        self.codec = codec
+        self.start_event = start_event
+        self.results = multiprocessing.Queue()
+
+    def run(self):
+
+        data, config = load_irrad_data(data_file=os.path.join(FIXTURES, FIXTURE + '.h5'),
+                                       config_file=os.path.join(FIXTURES, FIXTURE + '.yaml'),
+                                       subtract_raw_offset=False)
+        server = next(iter(data))
+
+        serializer = Serializer(codec=self.codec)
+        packets = {kind: replay_packets(kind=kind, data=data[server], server=server, ip=self.ip) for kind in self.rates}
+
+        context = zmq.Context()
+        pub = context.socket(zmq.PUB)
+        pub.setsockopt(zmq.SNDHWM, self.hwm)
+        pub.setsockopt(zmq.LINGER, 1000)
+        self.results.put(pub.bind_to_random_port(f'tcp://{self.ip}'))
+
+        self.start_event.wait()
+
+        sent = dict.fromkeys(self.rates, 0)
+        start = time.time()
+
+        while time.time() - start < self.duration:
+
+            elapsed = time.time() - start
+
+            # Send all packets which are due; keeps the average rate independent of the sleep granularity
+            for kind, rate in self.rates.items():
+                while sent[kind] < elapsed * rate:
+                    pub.send(serializer.dumps({'meta': {'timestamp': time.time(), 'name': self.ip, 'type': kind}, 'data': next(packets[kind])}))
+                    sent[kind] += 1
+
+            time.sleep(1e-3)
+
+        # Finish the scan
+        pub.send(serializer.dumps({'meta': {'timestamp': time.time(), 'name': self.ip, 'type': 'scan'}, 'data': {'status': 'scan_finished'}}))
+
+        pub.close()
+        context.term()
+
+        self.results.put(sent)
+
+
+def _cpu_time(pid):
+    """CPU time in seconds of process *pid* and all of its descendants"""
+
+    def stat(p):
+        with open(f'/proc/{p}/stat') as stat_file:
+            # Fields after the command name which is in parentheses; ppid, utime and stime are the 2nd, 12th and 13th field
+            fields = stat_file.read().rsplit(')', 1)[1].split()
+        return int(fields[1]), (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+
+    procs = {}
+    for p in os.listdir('/proc'):
+        if p.isdigit():
+            try:
+                procs[int(p)] = stat(p)
+            except (FileNotFoundError, ProcessLookupError):
+                continue
+
+    tree, cpu = [pid], 0
+    while tree:
+        p = tree.pop()
+        cpu += procs.get(p, (None, 0))[1]
+        tree.extend(child for child, (ppid, _) in procs.items() if ppid == p)
+
+    return cpu
+
+
+def run(n_servers, rates, duration, hwm, codec, sharded, out_dir):
+    """
+    Interpret the packets of *n_servers* simulated servers with a converter process
+
+    Returns
+    -------
+    dict
+        Sent and stored packets per type, duration until the last output in seconds, latencies in seconds and CPU usage
+    """
+
+    if os.path.isfile(pid_file):
+        raise RuntimeError(f"Converter seems to be running already, remove {pid_file} otherwise")
+
+    _, config = load_irrad_data(data_file=os.path.join(FIXTURES, FIXTURE + '.h5'), config_file=os.path.join(FIXTURES, FIXTURE + '.yaml'), specify_entries='Irrad')
+    server_setup = config['server'].pop(next(iter(config['server'])))
+    server_setup['devices']['RadiationMonitor'] = {'init': {}}
+
+    start_event = multiprocessing.Event()
+    servers = [SimulatedServer(ip=f'127.0.0.{i + 1}', rates=rates, duration=duration, hwm=hwm, codec=codec, start_event=start_event) for i in range(n_servers)]
+
+    for i, server in enumerate(servers):
+        server.start()
+        config['server'][server.ip] = dict(server_setup, name=f"{server_setup['name']}{i}", ports={'data': server.results.get(timeout=60)})
+
+    outfile = os.path.join(out_dir, f'bench_converter_{n_servers}')
+    config['session'].update(outfile=outfile, loglevel='ERROR', serializer=codec, sharded=sharded)
+
+    converter = IrradConverter(name='BenchConverter')
+    converter.start()
+
+    start = time.time()
+    while not os.path.isfile(pid_file) and time.time() - start < 30:
+        time.sleep(0.1)
+
+    ports = load_yaml(pid_file)['ports']
+
+    context = zmq.Context()
+    cmd_req = context.socket(zmq.REQ)
+    cmd_req.connect(f"tcp://127.0.0.1:{ports['cmd']}")
+
+    sub = context.socket(zmq.SUB)
+    sub.setsockopt(zmq.RCVHWM, 0)
+    sub.setsockopt(zmq.SUBSCRIBE, b'')
+    sub.connect(f"tcp://127.0.0.1:{ports['data']}")
+
+    cmd_req.send_json({'target': 'interpreter', 'cmd': 'start', 'data': config})
+    cmd_req.recv_json()
+
+    # Let the converter connect to the servers; PUB drops messages until subscriptions arrived
+    time.sleep(2)
+
+    latencies = []
+    last_output = None
+
+    def recv():
+        nonlocal last_output
+        # Outputs stop once all servers finished and the converter is idle
+        while sub.poll(timeout=2000) or any(server.is_alive() for server in servers):
+            if sub.poll(timeout=0):
+                msg = Serializer.loads(sub.recv())
+                last_output = time.time()
+                latencies.append(last_output - msg['meta']['timestamp'])
+
+    recv_thread = threading.Thread(target=recv)
+
+    cpu_start, start = _cpu_time(converter.pid), time.time()
+
+    start_event.set()
+    recv_thread.start()
+
+    sent = {kind: 0 for kind in rates}
+    for server in servers:
+        for kind, n in server.results.get(timeout=duration + 60).items():
+            sent[kind] += n
+        server.join()
+
+    recv_thread.join()
+
+    elapsed = (last_output or time.time()) - start
+    cpu = (_cpu_time(converter.pid) - cpu_start) / elapsed
+
+    cmd_req.send_json({'target': 'interpreter', 'cmd': 'shutdown'})
+    cmd_req.recv_json()
+    converter.join()
+
+    sub.close()
+    cmd_req.close()
+    context.term()
+
+    stored = dict.fromkeys(TABLES, 0)
+    with tb.open_file(outfile + '.h5') as out_file:
+        for server_config in config['server'].values():
+            for kind, table in TABLES.items():
+                if kind in rates:
+                    stored[kind] += out_file.get_node(f"/{server_config['name']}/{table}").nrows
+
+    return {'sent': sent, 'stored': stored, 'duration': elapsed, 'latencies': np.array(latencies), 'cpu': cpu}
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--servers', type=int, nargs='+', default=[1, 2, 4], help='Numbers of simulated servers')
+    parser.add_argument('--duration', type=float, default=10, help='Duration of publishing in seconds')
+    parser.add_argument('--rate', nargs='*', default=[], metavar='TYPE=HZ', help=f"Packets per second and server, default: {' '.join(f'{k}={v}' for k, v in RATES.items())}")
+    parser.add_argument('--hwm', type=int, default=1000, help='High-water mark of the publishers of the simulated servers')
+    parser.add_argument('--codec', choices=list(CODECS), default='msgpack' if 'msgpack' in CODECS else 'json')
+    parser.add_argument('--sharded', action='store_true', help='Interpret the data of each server in a worker process')
+    args = parser.parse_args()
+
+    rates = dict(RATES)
+    for rate in args.rate:
+        kind, hz = rate.split('=')
+        if kind not in RATES:
+            parser.error(f"Unknown packet type '{kind}', choose from {', '.join(RATES)}")
+        rates[kind] = float(hz)
+    rates = {kind: hz for kind, hz in rates.items() if hz > 0}
+
+    print(f"Codec: {args.codec}, {'sharded' if args.sharded else 'single process'}, rates per server: {' '.join(f'{k}={v:g}' for k, v in rates.items())}")
+    print(f"{'servers':>7} | {'offered [pkt/s]':>15} | {'sustained [pkt/s]':>17} | {'dropped':>8} | "
+          f"{'latency p50 [ms]':>16} | {'p90 [ms]':>8} | {'p99 [ms]':>8} | {'CPU [%]':>7}")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+
+        for n_servers in args.servers:
+
+            res = run(n_servers=n_servers, rates=rates, duration=args.duration, hwm=args.hwm, codec=args.codec, sharded=args.sharded, out_dir=tmp_dir)
+
+            n_sent = sum(res['sent'][kind] for kind in TABLES if kind in rates)
+            n_stored = sum(res['stored'].values())
+            p50, p90, p99 = np.percentile(res['latencies'], (50, 90, 99)) * 1e3 if len(res['latencies']) else (np.nan,) * 3
+
+            print(f"{n_servers:>7} | {sum(res['sent'].values()) / args.duration:>15.0f} | {n_stored / res['duration']:>17.0f} | "
+                  f"{n_sent - n_stored:>8} | {p50:>16.2f} | {p90:>8.2f} | {p99:>8.2f} | {res['cpu'] * 100:>7.1f}")
+
+
+if __name__ == '__main__':
+    main()
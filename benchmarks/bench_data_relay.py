@@ -0,0 +1,131 @@
+"""
+Benchmark of forwarding data from the internal publishers of a DAQProcess to its external data publisher.
+Compares the former relay, which decoded and re-encoded every message while polling with a 1 ms timeout,
+to the ZMQ proxy of DAQProcess.send_data which forwards the frames as they are.
+
+Usage: python benchmarks/bench_data_relay.py [--n-msgs N] [--codec {json,msgpack}]
+"""
+import time
+import argparse
+import threading
+import numpy as np
+import zmq
+
+from irrad_control.processes.daq import DAQProcess
+from irrad_control.utils.serializer import Serializer, CODECS
+
+
+class BenchDAQProcess(DAQProcess):
+
+    def legacy_send_data(self):
+        """Relay as implemented before forwarding via ZMQ proxy"""
+
+        internal_data_sub = self.context.socket(zmq.SUB)
+        internal_data_sub.bind(self._internal_sub_addr)
+        internal_data_sub.setsockopt(zmq.SUBSCRIBE, b'')
+
+        while not self.stop_flags['__send__'].is_set():
+
+            if not internal_data_sub.poll(timeout=1, flags=zmq.POLLIN):
+                continue
+
+            data = self.serializer.loads(internal_data_sub.recv(zmq.NOBLOCK))
+            self.sockets['data'].send(self.serializer.dumps(data))
+
+        internal_data_sub.close()
+
+    def clean_up(self):
+        pass
+
+
+def raw_data_packet(channels=('Left', 'Right', 'Up', 'Down', 'Sum', 'BLM')):
+    return {'meta': {'timestamp': time.time(), 'name': '192.168.1.2', 'type': 'raw_data'},
+            'data': {ch: float(v) for ch, v in zip(channels, np.random.uniform(0, 5, len(channels)))}}
+
+
+def run(relay, codec, n_msgs, interval=None):
+    """
+    Publish *n_msgs* raw data packets internally and receive them on the external data port
+
+    Returns
+    -------
+    tuple
+        Number of received messages, duration in seconds between first sent and last received message, latencies in seconds
+    """
+    proc = BenchDAQProcess(name='bench', hwm=n_msgs + 1)
+    proc._setup_zmq()
+    proc.setup = {'session': {'serializer': codec}}
+    proc._setup_serializer()
+
+    relay_thread = threading.Thread(target=proc.send_data if relay == 'proxy' else proc.legacy_send_data)
+    relay_thread.start()
+
+    sub = proc.context.socket(zmq.SUB)
+    sub.setsockopt(zmq.RCVHWM, n_msgs + 1)
+    sub.setsockopt(zmq.SUBSCRIBE, b'')
+    sub.connect(proc._tcp_addr(proc.ports['data'], ip='127.0.0.1'))
+
+    pub = proc.create_internal_data_pub()
+
+    # Let connections settle; PUB drops messages until subscriptions arrived
+    time.sleep(0.5)
+
+    packet = raw_data_packet()
+    latencies = []
+    received = 0
+
+    def recv():
+        nonlocal received
+        while received < n_msgs and sub.poll(timeout=1000):
+            msg = Serializer.loads(sub.recv())
+            latencies.append(time.perf_counter() - msg['meta']['sent'])
+            received += 1
+
+    recv_thread = threading.Thread(target=recv)
+    recv_thread.start()
+
+    start = time.perf_counter()
+    for _ in range(n_msgs):
+        packet['meta']['sent'] = time.perf_counter()
+        pub.send(proc.serializer.dumps(packet))
+        if interval is not None:
+            time.sleep(interval)
+
+    recv_thread.join()
+    duration = time.perf_counter() - start
+
+    proc.shutdown()
+    relay_thread.join()
+    pub.close()
+    sub.close()
+    for sock in proc.sockets.values():
+        sock.close()
+    proc.context.term()
+
+    return received, duration, np.array(latencies)
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--n-msgs', type=int, default=50000, help='Number of messages of the throughput benchmark')
+    parser.add_argument('--n-latency', type=int, default=2000, help='Number of messages of the latency benchmark')
+    parser.add_argument('--codec', choices=list(CODECS), default='msgpack' if 'msgpack' in CODECS else 'json')
+    args = parser.parse_args()
+
+    print(f"Codec: {args.codec}")
+    print(f"{'relay':>8} | {'throughput [msg/s]':>18} | {'received':>9} | {'latency p50 [us]':>16} | {'latency p99 [us]':>16}")
+
+    for relay in ('legacy', 'proxy'):
+
+        received, duration, _ = run(relay=relay, codec=args.codec, n_msgs=args.n_msgs)
+
+        # Latency at a moderate rate of 1 kHz, without queueing
+        _, _, latencies = run(relay=relay, codec=args.codec, n_msgs=args.n_latency, interval=1e-3)
+
+        print(f"{relay:>8} | {received / duration:>18.0f} | {received / args.n_msgs:>9.1%} | "
+              f"{np.median(latencies) * 1e6:>16.1f} | {np.percentile(latencies, 99) * 1e6:>16.1f}")
+
+
+if __name__ == '__main__':
+    main()
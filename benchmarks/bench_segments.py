@@ -0,0 +1,128 @@
+"""
+Benchmark of segmented output files. The raw and beam data of the test fixtures is written to a single output
+file and to segments of several sizes, as the converter does in segmented mode: segments are rolled once they
+contain the given number of rows and synced to disk when closed. Reports the write overhead of segmenting as
+well as the duration of consolidating the segments, including recovery with a truncated last segment.
+
+Usage: python benchmarks/bench_segments.py [--n-rows N] [--fixture FIXTURE] [--segment-rows N [N ...]]
+"""
+import os
+import time
+import argparse
+import tempfile
+import tables as tb
+
+import irrad_control.utils.segments as segments
+from irrad_control.utils.table_buffer import TableBuffer
+from bench_storage import load_tables
+
+
+FILTERS = tb.Filters(complib='blosc:lz4', complevel=5, shuffle=True)
+
+
+def write(tables, out_path, segment_rows=None, chunk_size=4096):
+    """
+    Write *tables* chunk by chunk to *out_path* or, if *segment_rows* is given, to segments of *segment_rows* rows
+    in the segment directory of *out_path*
+
+    Returns
+    -------
+    float
+        Write duration in seconds
+    """
+
+    n_rows = len(next(iter(tables.values())))
+    seg_dir = segments.segment_dir(out_path)
+
+    start = time.perf_counter()
+
+    if segment_rows is None:
+        out_file = tb.open_file(out_path + '.h5', 'w')
+    else:
+        os.makedirs(seg_dir)
+        out_file = tb.open_file(segments.segment_path(seg_dir, 0), 'w')
+
+    buffers = {}
+    for node, data in tables.items():
+        where, name = os.path.split(node)
+        if where not in out_file:
+            out_file.create_group('/', where.strip('/'))
+        buffers[node] = TableBuffer(table=out_file.create_table(where, description=data.dtype, name=name, filters=FILTERS,
+                                                                expectedrows=segment_rows or n_rows),
+                                    size=chunk_size)
+
+    n_segment, seg_start = 0, 0
+
+    for i in range(0, n_rows, chunk_size):
+
+        for node, data in tables.items():
+            buffers[node].append(data[i:i + chunk_size])
+
+        # Roll segment
+        if segment_rows is not None and i + chunk_size - seg_start >= segment_rows:
+            for buffer in buffers.values():
+                buffer.flush()
+            n_segment, seg_start = n_segment + 1, i + chunk_size
+            new_segment = segments.create_segment(path=segments.segment_path(seg_dir, n_segment), template=out_file)
+            for buffer in buffers.values():
+                buffer.table = new_segment.get_node(buffer.table._v_pathname)
+            out_file.close()
+            segments.fsync_file(segments.segment_path(seg_dir, n_segment - 1))
+            out_file = new_segment
+
+    for buffer in buffers.values():
+        buffer.flush()
+
+    out_file.close()
+
+    return time.perf_counter() - start
+
+
+def consolidate(out_path):
+    """Consolidate the segments of *out_path* and return the duration in seconds and number of segments"""
+
+    start = time.perf_counter()
+
+    n_segments = segments.consolidate_segments(seg_dir=segments.segment_dir(out_path), out_file=out_path + '.h5')
+
+    return time.perf_counter() - start, n_segments
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--n-rows', type=int, default=1000000, help='Number of rows per table')
+    parser.add_argument('--fixture', default='test_irrad_w_corr', help='Name of the fixture in tests/fixtures')
+    parser.add_argument('--segment-rows', type=int, nargs='+', default=[500000, 100000, 20000], help='Number of rows per segment')
+    args = parser.parse_args()
+
+    tables = load_tables(fixture=args.fixture, n_rows=args.n_rows)
+    n_bytes = sum(data.nbytes for data in tables.values())
+
+    print(f"Tables: {', '.join(tables)} with {args.n_rows} rows each; {n_bytes / 1e6:.1f} MB uncompressed")
+    print(f"{'segment rows':>12} | {'segments':>8} | {'write [MB/s]':>12} | {'consolidate [s]':>15} | {'recover [s]':>11}")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+
+        write_duration = write(tables=tables, out_path=os.path.join(tmp_dir, 'single'))
+        print(f"{'single file':>12} | {1:>8} | {n_bytes / 1e6 / write_duration:>12.1f} | {'-':>15} | {'-':>11}")
+
+        for segment_rows in args.segment_rows:
+
+            out_path = os.path.join(tmp_dir, f'segmented_{segment_rows}')
+
+            write_duration = write(tables=tables, out_path=out_path, segment_rows=segment_rows)
+            consolidate_duration, n_segments = consolidate(out_path=out_path)
+
+            # Recovery after a crash: the last segment is truncated
+            last_segment = segments.segment_path(segments.segment_dir(out_path), n_segments - 1)
+            with open(last_segment, 'r+b') as seg:
+                seg.truncate(os.path.getsize(last_segment) // 2)
+            recover_duration, _ = consolidate(out_path=out_path)
+
+            print(f"{segment_rows:>12} | {n_segments:>8} | {n_bytes / 1e6 / write_duration:>12.1f} | "
+                  f"{consolidate_duration:>15.2f} | {recover_duration:>11.2f}")
+
+
+if __name__ == '__main__':
+    main()
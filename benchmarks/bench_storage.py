@@ -0,0 +1,118 @@
+"""
+Benchmark of the storage settings of the converter output tables. The raw and beam data of the test fixtures
+is written to an output file per compression setting, in chunks as the converter does, see TableBuffer.
+Reports write and read throughput as well as the resulting file size.
+
+Usage: python benchmarks/bench_storage.py [--n-rows N] [--fixture FIXTURE] [--duration HOURS]
+"""
+import os
+import time
+import argparse
+import tempfile
+import numpy as np
+import tables as tb
+
+from irrad_control.utils.table_buffer import TableBuffer
+
+
+FIXTURES = os.path.join(os.path.dirname(__file__), '../tests/fixtures')
+
+# Compression settings as selectable in the session setup: (complib, complevel)
+SETTINGS = [(None, 0), ('blosc:lz4', 1), ('blosc:lz4', 5), ('blosc:zstd', 1), ('blosc:zstd', 5), ('zlib', 5)]
+
+
+def load_tables(fixture, n_rows):
+    """Load the Raw and Beam tables of all servers of *fixture*, repeated up to *n_rows* rows with ascending timestamps"""
+
+    tables = {}
+
+    with tb.open_file(os.path.join(FIXTURES, fixture + '.h5')) as in_file:
+        for group in in_file.root:
+            for name in ('Raw', 'Beam'):
+                if name in group:
+                    data = group[name].read()
+                    reps = int(np.ceil(n_rows / len(data)))
+                    tiled = np.tile(data, reps)[:n_rows]
+                    duration = data['timestamp'][-1] - data['timestamp'][0]
+                    tiled['timestamp'] += np.repeat(np.arange(reps) * duration, len(data))[:n_rows]
+                    tables[f'/{group._v_name}/{name}'] = tiled
+
+    return tables
+
+
+def run(tables, complib, complevel, expectedrows, chunk_size=4096):
+    """
+    Write *tables* to a file with the given compression, then read them back
+
+    Returns
+    -------
+    tuple
+        Write duration, read duration in seconds and file size in bytes
+    """
+
+    filters = tb.Filters(complib=complib, complevel=complevel, shuffle=True) if complib else None
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+
+        out_path = os.path.join(tmp_dir, 'bench_storage.h5')
+
+        start = time.perf_counter()
+
+        with tb.open_file(out_path, 'w') as out_file:
+            for node, data in tables.items():
+                where, name = os.path.split(node)
+                if where not in out_file:
+                    out_file.create_group('/', where.strip('/'))
+                table = TableBuffer(table=out_file.create_table(where, description=data.dtype, name=name, filters=filters, expectedrows=expectedrows),
+                                    size=chunk_size)
+                # Rows arrive one by one during an irradiation
+                for i in range(0, len(data), chunk_size):
+                    table.append(data[i:i + chunk_size])
+                table.flush()
+
+        write_duration = time.perf_counter() - start
+
+        file_size = os.path.getsize(out_path)
+
+        start = time.perf_counter()
+
+        with tb.open_file(out_path) as in_file:
+            for node in tables:
+                in_file.get_node(node).read()
+
+        read_duration = time.perf_counter() - start
+
+    return write_duration, read_duration, file_size
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--n-rows', type=int, default=1000000, help='Number of rows per table')
+    parser.add_argument('--fixture', default='test_irrad_w_corr', help='Name of the fixture in tests/fixtures')
+    parser.add_argument('--duration', type=float, default=None, help='Planned duration in hours at 100 sps to estimate expected rows; default: number of rows')
+    args = parser.parse_args()
+
+    tables = load_tables(fixture=args.fixture, n_rows=args.n_rows)
+    n_bytes = sum(data.nbytes for data in tables.values())
+    expectedrows = args.n_rows if args.duration is None else int(100 * args.duration * 3600)
+
+    print(f"Tables: {', '.join(tables)} with {args.n_rows} rows each; {n_bytes / 1e6:.1f} MB uncompressed")
+    print(f"{'compression':>14} | {'write [MB/s]':>12} | {'read [MB/s]':>11} | {'file size [MB]':>14} | {'ratio':>6}")
+
+    for complib, complevel in SETTINGS:
+
+        label = 'none' if complib is None else f'{complib}:{complevel}'
+
+        try:
+            write_duration, read_duration, file_size = run(tables=tables, complib=complib, complevel=complevel, expectedrows=expectedrows)
+        except ValueError as e:
+            print(f"{label:>14} | not available: {e}")
+            continue
+
+        print(f"{label:>14} | {n_bytes / 1e6 / write_duration:>12.1f} | {n_bytes / 1e6 / read_duration:>11.1f} | "
+              f"{file_size / 1e6:>14.1f} | {n_bytes / file_size:>6.2f}")
+
+
+if __name__ == '__main__':
+    main()
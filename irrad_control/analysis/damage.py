@@ -1,8 +1,28 @@
 import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
 from irrad_control.analysis import plotting, fluence, formulas
+from irrad_control.analysis.utils import IrradDataset
+
+
+def _generate_fluence_map_part(session_basename, server, bins):
+    """Generate the fluence map of a part file of a multipart irradiation; executed in a worker process"""
+
+    with IrradDataset(data_file=session_basename + '.h5', config_file=session_basename + '.yaml') as data_part:
+        return fluence.generate_fluence_map(beam_data=data_part[server]['Beam'],
+                                            scan_data=data_part[server]['Scan'],
+                                            irrad_data=data_part[server]['Irrad'],
+                                            bins=bins)
 
 
-def main(data, config=None):
+def main(data, config=None, n_jobs=1):
+    """
+    Damage analysis of an irradiation. For a multipart irradiation, *config* is None and *data* yields the parts,
+    whose fluence maps are generated by *n_jobs* worker processes in parallel and added up in order of the parts.
+    Otherwise, the fluence map is generated with *n_jobs* threads, see *fluence.generate_fluence_map*.
+    If *n_jobs* is None, all CPUs are used.
+    """
 
     figs = []
     bins = (100, 100)
@@ -18,41 +38,56 @@ def main(data, config=None):
         server = None  # Only allow files with exactly one server for multipart to avoid adding unrelated fluence maps
         ion_name = None
 
-        # Loop over generator and get partial data files
-        for nfile, data_part, config_part, session_basename in data:
+        # Part files are processed in worker processes, which open the files themselves
+        executor = None if n_jobs == 1 else ProcessPoolExecutor(max_workers=n_jobs, mp_context=multiprocessing.get_context('spawn'))
+        fluence_map_parts = []
 
-            logging.info(f"Generating multipart damage distributions from file {session_basename} (file number {nfile+1})")
+        try:
 
-            if len(config_part['server']) != 1:
-                raise ValueError(f"Multipart damage analysis only supports input files containing data from 1 server; found {len(len(config_part['server']))}")
-            
-            server_config, = config_part['server'].values()
-            
-            # Only allow one fixed server for multipart
-            if server is None:
-                server = server_config['name']
-                ion_name = server_config['daq']['ion']
-                irrad_data=data_part[server]['Irrad']
-
-            if server not in data_part:
-                raise KeyError(f"Server '{server}' not present in file {session_basename}!")
-
-            # Initialize damage and error maps
-            if nfile == 0:
-
-                results['primary'], errors['primary'], bin_centers['x'], bin_centers['y'] = fluence.generate_fluence_map(beam_data=data_part[server]['Beam'],
-                                                                                                                         scan_data=data_part[server]['Scan'],
-                                                                                                                         irrad_data=data_part[server]['Irrad'],
-                                                                                                                         bins=bins)
-            else:
+            # Loop over generator and get partial data files
+            for nfile, data_part, config_part, session_basename in data:
+
+                logging.info(f"Generating multipart damage distributions from file {session_basename} (file number {nfile+1})")
+
+                if len(config_part['server']) != 1:
+                    raise ValueError(f"Multipart damage analysis only supports input files containing data from 1 server; found {len(len(config_part['server']))}")
+                
+                server_config, = config_part['server'].values()
+                
+                # Only allow one fixed server for multipart
+                if server is None:
+                    server = server_config['name']
+                    ion_name = server_config['daq']['ion']
+                    irrad_data=data_part[server]['Irrad'][:]  # Keep in memory; used after the file is closed
+
+                if server not in data_part:
+                    raise KeyError(f"Server '{server}' not present in file {session_basename}!")
+
+                if executor is None:
+                    fluence_map_parts.append(fluence.generate_fluence_map(beam_data=data_part[server]['Beam'],
+                                                                          scan_data=data_part[server]['Scan'],
+                                                                          irrad_data=data_part[server]['Irrad'],
+                                                                          bins=bins))
+                else:
+                    fluence_map_parts.append(executor.submit(_generate_fluence_map_part, session_basename, server, bins))
+
+            for fluence_map_part in fluence_map_parts:
+
+                fluence_map_part, fluence_map_part_error, bin_centers['x'], bin_centers['y'] = fluence_map_part if executor is None else fluence_map_part.result()
+
+                # Initialize damage and error maps
+                if results['primary'] is None:
+                    results['primary'], errors['primary'] = fluence_map_part, fluence_map_part_error
+                else:
+                    # Add to overall map
+                    results['primary'] += fluence_map_part
+                    errors['primary'] = (errors['primary']**2 + fluence_map_part_error**2)**.5
+
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
 
-                fluence_map_part, fluence_map_part_error, _, _ = fluence.generate_fluence_map(beam_data=data_part[server]['Beam'],
-                                                                                              scan_data=data_part[server]['Scan'],
-                                                                                              irrad_data=data_part[server]['Irrad'],
-                                                                                              bins=bins)
-                # Add to overall map
-                results['primary'] += fluence_map_part
-                errors['primary'] = (errors['primary']**2 + fluence_map_part_error**2)**.5
+        if results['primary'] is not None:
 
             # Generate eqivalent fluence map as well as TID map
             if server_config['daq']['kappa'] is None:
@@ -76,7 +111,8 @@ def main(data, config=None):
         results['primary'], errors['primary'], bin_centers['x'], bin_centers['y'] = fluence.generate_fluence_map(beam_data=data[server]['Beam'],
                                                                                                                scan_data=data[server]['Scan'],
                                                                                                                irrad_data=irrad_data,
-                                                                                                               bins=bins)
+                                                                                                               bins=bins,
+                                                                                                               n_threads=n_jobs)
         # Generate eqivalent fluence map as well as TID map
         if config['daq']['kappa'] is None:
             del results['neq']
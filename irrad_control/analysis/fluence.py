@@ -2,38 +2,37 @@
 This script contains the functions used for analysis of fluence distribution
 """
 
+import os
 import logging
 import numpy as np
-from numba import njit  # Make analysis go brrrrr
+from numba import njit, prange, get_num_threads  # Make analysis go brrrrr
 from tqdm import tqdm  # Show progress
+from scipy.signal import fftconvolve
 
 # Package imports
 from irrad_control.analysis.constants import elementary_charge
+from irrad_control.analysis.utils import IrradTable
+
+
+# Engines which apply the beam profile to the fluence map, see *generate_fluence_map*
+FLUENCE_MAP_ENGINES = ('kernel', 'convolution')
 
 
 # This is the main function
-def generate_fluence_map(beam_data, scan_data, irrad_data, bins=(100, 100)):
+def _init_fluence_map(scan_data, irrad_data, bins, engine='kernel'):
     """
-    Generates a two-dimensional fluence map of the entire scan area from irrad_control output data.
-    
-    Parameters
-    ----------
-    beam_data : np.array, pytables.Table
-        Beam data of irradiation
-    scan_data : np.array, pytables.Table
-        Scan data of irradiation
-    irrad_data : np.array, pytables.Table
-        General data about the irradiation
-    bins : tuple, optional
-        Binning of the generated fluence map, by default (100, 100)
-        CAUTION: the binning is numpy shape, therefore bins are (Y, X)
+    Log the parameters of the irradiation and create the fluence map of the scan area, see *generate_fluence_map*.
+    For the convolution engine, the maps hold point charges and are padded by the size of the beam profile on each side.
 
     Returns
     -------
-    tuple: (np.ndarray, np.ndarray, np.ndarray, np.ndarray)
-        Tuple containing fluence map, fluence map error, bin_centers_x, bin_centers_y
+    tuple: (np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray, tuple, tuple)
+        Tuple containing fluence map, fluence map error, bin_edges_x, bin_centers_x, bin_centers_y, beam sigma and scan area start
     """
 
+    if engine not in FLUENCE_MAP_ENGINES:
+        raise ValueError(f"Unknown fluence map engine '{engine}'; must be one of {', '.join(FLUENCE_MAP_ENGINES)}")
+
     total_scans = np.max(scan_data['scan']) + 1
     n_rows = irrad_data['n_rows'][0]
     total_rows = total_scans * n_rows
@@ -59,29 +58,27 @@ def generate_fluence_map(beam_data, scan_data, irrad_data, bins=(100, 100)):
     map_bin_centers_x = 0.5 * (map_bin_edges_x[:-1] + map_bin_edges_x[1:])
 
     logging.info(f"Initializing fluence map of ({map_bin_edges_x[-1]:.2f}x{map_bin_edges_y[-1]:.2f}) mm² scan area in {bins[1]}x{bins[0]} bins")
-    
-    # Row bin times
-    row_bin_transit_times = np.zeros_like(map_bin_centers_x)
 
-    # Index that keeps track how far we have advanced trough the beam data
-    current_row_idx = 0
+    if engine == 'convolution':
+        fluence_map = np.pad(fluence_map, ((_gauss_1d_kernel_size(bin_centers=map_bin_centers_y, sigma=beam_sigma[1]),) * 2,
+                                           (_gauss_1d_kernel_size(bin_centers=map_bin_centers_x, sigma=beam_sigma[0]),) * 2))
+        fluence_map_error = np.zeros_like(fluence_map)
+
+    return fluence_map, fluence_map_error, map_bin_edges_x, map_bin_centers_x, map_bin_centers_y, beam_sigma, scan_area_start
 
-    # Loop over scanned rows
-    for row_data in tqdm(scan_data, desc='Generating fluence distribution', unit='rows'):
-
-        current_row_idx = _process_row(row_data=row_data,
-                                       beam_data=beam_data,
-                                       fluence_map=fluence_map,
-                                       fluence_map_error=fluence_map_error,
-                                       row_bin_transit_times=row_bin_transit_times,
-                                       map_bin_edges_x=map_bin_edges_x,
-                                       map_bin_centers_x=map_bin_centers_x,
-                                       map_bin_centers_y=map_bin_centers_y,
-                                       beam_sigma=beam_sigma,
-                                       scan_y_offset=scan_area_start[-1],
-                                       current_row_idx=current_row_idx,
-                                       scan_area_start_x=irrad_data['scan_area_start_x'][0],
-                                       scan_area_stop_x=irrad_data['scan_area_stop_x'][0])
+
+def _finalize_fluence_map(fluence_map, fluence_map_error, map_bin_centers_x, map_bin_centers_y, beam_sigma, engine='kernel'):
+    """
+    Convolve the maps of point charges of the convolution engine with the beam profile, take the square root of the
+    squared error map and scale both maps from ions / mm² to ions / cm²
+    """
+
+    if engine == 'convolution':
+        fluence_map, fluence_map_error = (convolve_gauss_2d(map_2d=charge_map,
+                                                            bin_centers_x=map_bin_centers_x,
+                                                            bin_centers_y=map_bin_centers_y,
+                                                            sigma_x=beam_sigma[0],
+                                                            sigma_y=beam_sigma[1]) for charge_map in (fluence_map, fluence_map_error))
 
     logging.info(f"Finished generating fluence distribution.")
     
@@ -92,9 +89,301 @@ def generate_fluence_map(beam_data, scan_data, irrad_data, bins=(100, 100)):
     fluence_map *= 100
     fluence_map_error *= 100
 
+    return fluence_map, fluence_map_error
+
+
+def generate_fluence_map(beam_data, scan_data, irrad_data, bins=(100, 100), n_threads=1, engine='kernel'):
+    """
+    Generates a two-dimensional fluence map of the entire scan area from irrad_control output data.
+    Lazily loaded beam data is processed in chunks, see *generate_fluence_map_chunked*.
+    With multiple threads, the scanned rows are split into blocks which are processed in parallel, see *_process_rows_parallel*.
+    The beam profile is applied per beam position by default, see *apply_gauss_2d_kernel_row*. The convolution engine instead
+    deposits point charges on the map grid and convolves them with the beam profile once, see *convolve_gauss_2d*, which is
+    much faster for fine binning at the cost of interpolating positions which are not on the grid.
+    
+    Parameters
+    ----------
+    beam_data : np.array, IrradTable
+        Beam data of irradiation
+    scan_data : np.array, pytables.Table
+        Scan data of irradiation
+    irrad_data : np.array, pytables.Table
+        General data about the irradiation
+    bins : tuple, optional
+        Binning of the generated fluence map, by default (100, 100)
+        CAUTION: the binning is numpy shape, therefore bins are (Y, X)
+    n_threads : int, optional
+        Number of threads to process the scanned rows with, by default 1. If None, all threads available to numba are used
+    engine : str, optional
+        Engine which applies the beam profile, one of FLUENCE_MAP_ENGINES, by default 'kernel'
+
+    Returns
+    -------
+    tuple: (np.ndarray, np.ndarray, np.ndarray, np.ndarray)
+        Tuple containing fluence map, fluence map error, bin_centers_x, bin_centers_y
+    """
+
+    if isinstance(beam_data, IrradTable):
+        return generate_fluence_map_chunked(beam_data=beam_data, scan_data=scan_data, irrad_data=irrad_data, bins=bins, n_threads=n_threads, engine=engine)
+
+    n_threads = get_num_threads() if n_threads is None else n_threads
+
+    # Rows are processed by compiled functions which require numpy arrays
+    beam_data, scan_data = np.asarray(beam_data), np.asarray(scan_data)
+
+    fluence_map, fluence_map_error, map_bin_edges_x, map_bin_centers_x, map_bin_centers_y, beam_sigma, scan_area_start = _init_fluence_map(scan_data=scan_data,
+                                                                                                                                           irrad_data=irrad_data,
+                                                                                                                                           bins=bins,
+                                                                                                                                           engine=engine)
+
+    # Bin transit times per scan speed and acceleration and beam profiles at the bin centers; shared by all rows
+    row_table_indices, bin_transit_times, cum_transit_times = _calc_transit_time_tables(scan_data=scan_data, map_bin_edges_x=map_bin_edges_x)
+    map_profiles_x = gauss_1d_profiles(bin_centers=map_bin_centers_x, sigma=beam_sigma[0])
+
+    # Index that keeps track how far we have advanced trough the beam data
+    current_row_idx = 0
+
+    if n_threads > 1:
+
+        logging.info(f"Generating fluence distribution of {len(scan_data)} rows with {n_threads} threads")
+
+        _process_rows_parallel(scan_data=scan_data,
+                               beam_data=beam_data,
+                               fluence_map=fluence_map,
+                               fluence_map_error=fluence_map_error,
+                               row_table_indices=row_table_indices,
+                               bin_transit_times=bin_transit_times,
+                               cum_transit_times=cum_transit_times,
+                               map_bin_edges_x=map_bin_edges_x,
+                               map_bin_centers_x=map_bin_centers_x,
+                               map_bin_centers_y=map_bin_centers_y,
+                               map_profiles_x=map_profiles_x,
+                               beam_sigma=beam_sigma,
+                               scan_y_offset=scan_area_start[-1],
+                               current_row_idx=current_row_idx,
+                               scan_area_start_x=irrad_data['scan_area_start_x'][0],
+                               scan_area_stop_x=irrad_data['scan_area_stop_x'][0],
+                               n_threads=n_threads,
+                               convolve=engine == 'convolution')
+
+    else:
+
+        # Loop over scanned rows
+        for i, row_data in enumerate(tqdm(scan_data, desc='Generating fluence distribution', unit='rows')):
+
+            current_row_idx = _process_row(row_data=row_data,
+                                           beam_data=beam_data,
+                                           fluence_map=fluence_map,
+                                           fluence_map_error=fluence_map_error,
+                                           row_bin_transit_times=bin_transit_times[row_table_indices[i]],
+                                           row_cum_transit_times=cum_transit_times[row_table_indices[i]],
+                                           map_bin_edges_x=map_bin_edges_x,
+                                           map_bin_centers_x=map_bin_centers_x,
+                                           map_bin_centers_y=map_bin_centers_y,
+                                           map_profiles_x=map_profiles_x,
+                                           beam_sigma=beam_sigma,
+                                           scan_y_offset=scan_area_start[-1],
+                                           current_row_idx=current_row_idx,
+                                           scan_area_start_x=irrad_data['scan_area_start_x'][0],
+                                           scan_area_stop_x=irrad_data['scan_area_stop_x'][0],
+                                           convolve=engine == 'convolution')
+
+    fluence_map, fluence_map_error = _finalize_fluence_map(fluence_map=fluence_map,
+                                                           fluence_map_error=fluence_map_error,
+                                                           map_bin_centers_x=map_bin_centers_x,
+                                                           map_bin_centers_y=map_bin_centers_y,
+                                                           beam_sigma=beam_sigma,
+                                                           engine=engine)
+
+    return fluence_map, fluence_map_error, map_bin_centers_x, map_bin_centers_y
+
+
+def generate_fluence_map_chunked(beam_data, scan_data, irrad_data, bins=(100, 100), rows_per_chunk=100, checkpoint_file=None, n_threads=1, engine='kernel'):
+    """
+    Streaming variant of *generate_fluence_map* which reads the beam data from the output file in chunks of
+    *rows_per_chunk* scanned rows, using the time index of the beam data. Peak memory is bounded by the beam data
+    of one chunk instead of the entire session. The result is identical to *generate_fluence_map*.
+
+    Parameters
+    ----------
+    beam_data : IrradTable, pytables.Table
+        Beam data of irradiation
+    scan_data : np.array, pytables.Table
+        Scan data of irradiation
+    irrad_data : np.array, pytables.Table
+        General data about the irradiation
+    bins : tuple, optional
+        Binning of the generated fluence map, by default (100, 100)
+        CAUTION: the binning is numpy shape, therefore bins are (Y, X)
+    rows_per_chunk : int, optional
+        Number of scanned rows whose beam data is read at once, by default 100
+    checkpoint_file : str, optional
+        Path of a file to which the partial maps are saved after each chunk, by default None. If the file exists,
+        generation resumes from the saved partial maps
+    n_threads : int, optional
+        Number of threads to process the scanned rows of each chunk with, by default 1. If None, all threads available to numba are used
+    engine : str, optional
+        Engine which applies the beam profile, see *generate_fluence_map*, by default 'kernel'
+
+    Returns
+    -------
+    tuple: (np.ndarray, np.ndarray, np.ndarray, np.ndarray)
+        Tuple containing fluence map, fluence map error, bin_centers_x, bin_centers_y
+    """
+
+    if not isinstance(beam_data, IrradTable):
+        beam_data = IrradTable(table=beam_data)
+
+    scan_data = np.asarray(scan_data)
+    n_threads = get_num_threads() if n_threads is None else n_threads
+
+    fluence_map, fluence_map_error, map_bin_edges_x, map_bin_centers_x, map_bin_centers_y, beam_sigma, scan_area_start = _init_fluence_map(scan_data=scan_data,
+                                                                                                                                           irrad_data=irrad_data,
+                                                                                                                                           bins=bins,
+                                                                                                                                           engine=engine)
+
+    # Bin transit times per scan speed and acceleration and beam profiles at the bin centers; shared by all rows
+    row_table_indices, bin_transit_times, cum_transit_times = _calc_transit_time_tables(scan_data=scan_data, map_bin_edges_x=map_bin_edges_x)
+    map_profiles_x = gauss_1d_profiles(bin_centers=map_bin_centers_x, sigma=beam_sigma[0])
+
+    # Number of processed scanned rows and index up to which the beam data has been processed; None before the first row
+    n_processed_rows, beam_idx = 0, None
+
+    if checkpoint_file is not None and os.path.isfile(checkpoint_file):
+        with np.load(checkpoint_file) as checkpoint:
+            fluence_map[:], fluence_map_error[:] = checkpoint['fluence_map'], checkpoint['fluence_map_error']
+            n_processed_rows, beam_idx = int(checkpoint['n_processed_rows']), int(checkpoint['beam_idx'])
+        logging.info(f"Resuming fluence distribution after {n_processed_rows} rows from checkpoint {checkpoint_file}")
+
+    with tqdm(total=len(scan_data), initial=n_processed_rows, desc='Generating fluence distribution', unit='rows') as pbar:
+
+        for chunk_start in range(n_processed_rows, len(scan_data), rows_per_chunk):
+
+            chunk_scan_data = scan_data[chunk_start:chunk_start + rows_per_chunk]
+
+            # Beam data up to the end of the last row of this chunk
+            _, beam_stop = beam_data.window_rows(t_stop=chunk_scan_data['row_stop_timestamp'][-1])
+
+            if beam_idx is None:
+                # Beam data before the first row is not processed; keep the preceding entry, as if it was processed
+                beam_start, _ = beam_data.window_rows(t_start=chunk_scan_data['row_start_timestamp'][0])
+                chunk_offset, current_row_idx = max(beam_start - 1, 0), 0
+            else:
+                # Keep the preceding entry, which marks earlier beam data as processed, see *_process_row*
+                chunk_offset = max(beam_idx - 1, 0)
+                current_row_idx = beam_idx - chunk_offset
+
+            beam_chunk = beam_data.read(start=chunk_offset, stop=beam_stop)
+
+            if n_threads > 1:
+
+                current_row_idx = _process_rows_parallel(scan_data=chunk_scan_data,
+                                                         beam_data=beam_chunk,
+                                                         fluence_map=fluence_map,
+                                                         fluence_map_error=fluence_map_error,
+                                                         row_table_indices=row_table_indices[chunk_start:chunk_start + len(chunk_scan_data)],
+                                                         bin_transit_times=bin_transit_times,
+                                                         cum_transit_times=cum_transit_times,
+                                                         map_bin_edges_x=map_bin_edges_x,
+                                                         map_bin_centers_x=map_bin_centers_x,
+                                                         map_bin_centers_y=map_bin_centers_y,
+                                                         map_profiles_x=map_profiles_x,
+                                                         beam_sigma=beam_sigma,
+                                                         scan_y_offset=scan_area_start[-1],
+                                                         current_row_idx=current_row_idx,
+                                                         scan_area_start_x=irrad_data['scan_area_start_x'][0],
+                                                         scan_area_stop_x=irrad_data['scan_area_stop_x'][0],
+                                                         n_threads=n_threads,
+                                                         convolve=engine == 'convolution')
+                pbar.update(len(chunk_scan_data))
+
+            else:
+
+                for i, row_data in enumerate(chunk_scan_data, start=chunk_start):
+
+                    current_row_idx = _process_row(row_data=row_data,
+                                                   beam_data=beam_chunk,
+                                                   fluence_map=fluence_map,
+                                                   fluence_map_error=fluence_map_error,
+                                                   row_bin_transit_times=bin_transit_times[row_table_indices[i]],
+                                                   row_cum_transit_times=cum_transit_times[row_table_indices[i]],
+                                                   map_bin_edges_x=map_bin_edges_x,
+                                                   map_bin_centers_x=map_bin_centers_x,
+                                                   map_bin_centers_y=map_bin_centers_y,
+                                                   map_profiles_x=map_profiles_x,
+                                                   beam_sigma=beam_sigma,
+                                                   scan_y_offset=scan_area_start[-1],
+                                                   current_row_idx=current_row_idx,
+                                                   scan_area_start_x=irrad_data['scan_area_start_x'][0],
+                                                   scan_area_stop_x=irrad_data['scan_area_stop_x'][0],
+                                                   convolve=engine == 'convolution')
+                    pbar.update()
+
+            n_processed_rows, beam_idx = chunk_start + len(chunk_scan_data), chunk_offset + current_row_idx
+
+            if checkpoint_file is not None:
+                # Replace the previous checkpoint only once the new one is complete
+                with open(checkpoint_file + '.tmp', 'wb') as checkpoint:
+                    np.savez(checkpoint, fluence_map=fluence_map, fluence_map_error=fluence_map_error, n_processed_rows=n_processed_rows, beam_idx=beam_idx)
+                os.replace(checkpoint_file + '.tmp', checkpoint_file)
+
+    fluence_map, fluence_map_error = _finalize_fluence_map(fluence_map=fluence_map,
+                                                           fluence_map_error=fluence_map_error,
+                                                           map_bin_centers_x=map_bin_centers_x,
+                                                           map_bin_centers_y=map_bin_centers_y,
+                                                           beam_sigma=beam_sigma,
+                                                           engine=engine)
+
     return fluence_map, fluence_map_error, map_bin_centers_x, map_bin_centers_y
 
 
+def _process_rows_parallel(scan_data, beam_data, fluence_map, fluence_map_error, row_table_indices, bin_transit_times, cum_transit_times, map_bin_edges_x, map_bin_centers_x, map_bin_centers_y, map_profiles_x, beam_sigma, scan_y_offset, current_row_idx, scan_area_start_x, scan_area_stop_x, n_threads, convolve=False):
+    """
+    Process the scanned rows in *n_threads* blocks of consecutive rows in parallel. Contributions of rows to the fluence map are
+    additive: each block accumulates into private maps, which are added to *fluence_map* and *fluence_map_error* in order of the blocks.
+    The index of the beam data from which each row is processed is determined beforehand, see *_calc_row_beam_indices*.
+    See *_process_row* and *_process_row_blocks* for the parameters.
+
+    Returns
+    -------
+    int
+        Index up to which beam data has been processed, as returned by *_process_row* for the last row
+    """
+
+    # Exceptions can not be raised from within the parallel blocks; check rows beforehand, see *_process_row_scan*
+    if not np.all((np.abs(scan_data['row_start_x'] - scan_area_start_x) < 0.5) | (np.abs(scan_data['row_start_x'] - scan_area_stop_x) < 0.5)):
+        raise ValueError('Row started at neither edge of scan area')
+
+    row_beam_indices = _calc_row_beam_indices(scan_data=scan_data, beam_timestamps=beam_data['timestamp'], current_row_idx=current_row_idx)
+
+    # Private maps per block
+    block_maps = np.zeros(shape=(2, n_threads) + fluence_map.shape)
+
+    _process_row_blocks(scan_data=scan_data,
+                        beam_data=beam_data,
+                        row_beam_indices=row_beam_indices,
+                        block_fluence_maps=block_maps[0],
+                        block_fluence_map_errors=block_maps[1],
+                        row_table_indices=row_table_indices,
+                        bin_transit_times=bin_transit_times,
+                        cum_transit_times=cum_transit_times,
+                        map_bin_edges_x=map_bin_edges_x,
+                        map_bin_centers_x=map_bin_centers_x,
+                        map_bin_centers_y=map_bin_centers_y,
+                        map_profiles_x=map_profiles_x,
+                        beam_sigma=beam_sigma,
+                        scan_y_offset=scan_y_offset,
+                        scan_area_start_x=scan_area_start_x,
+                        scan_area_stop_x=scan_area_stop_x,
+                        convolve=convolve)
+
+    for block_map, block_map_error in zip(*block_maps):
+        fluence_map += block_map
+        fluence_map_error += block_map_error
+
+    return row_beam_indices[-1]
+
+
 def extract_dut_map(fluence_map, map_bin_centers_x, map_bin_centers_y, irrad_data=None, dut_rectangle=None, center_symm=False):
     """
     Extracts the DUT region from the fluence map.
@@ -167,7 +456,7 @@ def extract_dut_map(fluence_map, map_bin_centers_x, map_bin_centers_y, irrad_dat
     return fluence_map[y_min_idx:y_max_idx, x_min_idx:x_max_idx], map_bin_centers_x[x_min_idx:x_max_idx], map_bin_centers_y[y_min_idx:y_max_idx]
 
 
-@njit
+@njit(cache=True)
 def gauss_2d_pdf(x, y, mu_x, mu_y, sigma_x, sigma_y, amplitude, normalized=False):
     """
     2D normal distribution PDF according to
@@ -206,7 +495,7 @@ def gauss_2d_pdf(x, y, mu_x, mu_y, sigma_x, sigma_y, amplitude, normalized=False
     return norm_amplitude * np.exp(exponent)
 
 
-@njit
+@njit(cache=True)
 def gauss_2d_volume(amplitude, sigma_x, sigma_y):
     """
     Volume under 2D Gaussian distribution according to
@@ -229,7 +518,7 @@ def gauss_2d_volume(amplitude, sigma_x, sigma_y):
     return 2 * np.pi * amplitude * sigma_x * sigma_y
 
 
-@njit
+@njit(cache=True)
 def gauss_2d_norm(amplitude, sigma_x, sigma_y):
     """
     Calculate normalized amplitude to satisfy integral(gauss_2D_pdf) == 1
@@ -251,11 +540,40 @@ def gauss_2d_norm(amplitude, sigma_x, sigma_y):
     return amplitude / (2 * np.pi * sigma_x * sigma_y)
 
 
-@njit
+@njit(cache=True)
+def gauss_1d_profile(bin_centers, mu, sigma, skip_sigmas=6):
+    """
+    Unnormalized 1D Gaussian exp(-0.5 * ((x - mu) / sigma)^2) along *bin_centers*, clipped to the bins which are at most
+    *skip_sigmas* sigmas away from *mu*. The 2D Gaussian of *gauss_2d_pdf* is the outer product of the profiles in y and x dimension.
+
+    Parameters
+    ----------
+    bin_centers : np.ndarray
+        Bin centers in ascending order
+    mu : float
+        Mean of distribution
+    sigma : float
+        Standard deviation of distribution
+    skip_sigmas: float, int
+        Bins which are more than this amount of sigmas away from *mu* are not part of the profile
+
+    Returns
+    -------
+    tuple
+        Start and stop index of the clipped bins in *bin_centers* and the profile in these bins
+    """
+    start = np.searchsorted(bin_centers, mu - skip_sigmas * sigma, side='left')
+    stop = np.searchsorted(bin_centers, mu + skip_sigmas * sigma, side='right')
+
+    return start, stop, np.exp(-0.5 * np.square((bin_centers[start:stop] - mu) / sigma))
+
+
+@njit(cache=True)
 def apply_gauss_2d_kernel(map_2d, map_2d_error, amplitude, amplitude_error, bin_centers_x, bin_centers_y, mu_x, mu_y, sigma_x, sigma_y, normalized, skip_sigmas=6):
     """
     Applies a 2D Gaussian kernel on *map_2d* and *map_2d_error*, along given bin centers in x and y dimension. See *gauss_2d_pdf* function
-    for more info.
+    for more info. The kernel is separable: it is the outer product of the 1D profiles in x and y dimension, see *gauss_1d_profile*,
+    and only applied to the sub-rectangle of the maps within *skip_sigmas*.
 
     Parameters
     ----------
@@ -268,9 +586,9 @@ def apply_gauss_2d_kernel(map_2d, map_2d_error, amplitude, amplitude_error, bin_
     amplitude_error : float
         Amplitude of error distribution; must be normalized for correct results e.g. integral(gauss_2D_pdf) == 1
     bin_centers_x : np.ndarray
-        [description]
+        Bin centers of *map_2d* in first dimension in ascending order
     bin_centers_y : np.ndarray
-        [description]
+        Bin centers of *map_2d* in second dimension in ascending order
     mu_x : float
         Mean of distribution in first dimension
     mu_y : float
@@ -285,54 +603,297 @@ def apply_gauss_2d_kernel(map_2d, map_2d_error, amplitude, amplitude_error, bin_
         Skip calculation if point on *map_2d* is more tha this amountof sigmas away in respective dimension
         Decreasing this increases performance at the cost of accuracy. Minimum value is 3
     """
+    apply_gauss_2d_kernel_row(map_2d=map_2d,
+                              map_2d_error=map_2d_error,
+                              amplitudes=np.array([amplitude]),
+                              amplitude_errors=np.array([amplitude_error]),
+                              bin_centers_x=bin_centers_x,
+                              bin_centers_y=bin_centers_y,
+                              mus_x=np.array([mu_x]),
+                              mu_y=mu_y,
+                              sigma_x=sigma_x,
+                              sigma_y=sigma_y,
+                              normalized=normalized,
+                              skip_sigmas=skip_sigmas)
+
+
+@njit(cache=True)
+def apply_gauss_2d_kernel_row(map_2d, map_2d_error, amplitudes, amplitude_errors, bin_centers_x, bin_centers_y, mus_x, mu_y, sigma_x, sigma_y, normalized, skip_sigmas=6):
+    """
+    Applies the 2D Gaussian kernels of multiple beam positions along a row, e.g. at common *mu_y*, on *map_2d* and *map_2d_error*.
+    Equivalent to calling *apply_gauss_2d_kernel* for each position: the y profile is computed once, the x profiles are summed,
+    weighted with their amplitudes, and the outer product of both is added to the affected sub-rectangle of the maps at once.
+
+    Parameters
+    ----------
+    map_2d : np.ndarray
+        Input map to apply kernels to which satisfies len(map_2d.shape)==2
+    map_2d_error : np.ndarray
+        Input error map to apply kernels to which satisfies len(map_2d.shape)==2
+    amplitudes : np.ndarray
+        Amplitudes of distributions, one per position in *mus_x*
+    amplitude_errors : np.ndarray
+        Amplitudes of error distributions, one per position in *mus_x*
+    bin_centers_x : np.ndarray
+        Bin centers of *map_2d* in first dimension in ascending order
+    bin_centers_y : np.ndarray
+        Bin centers of *map_2d* in second dimension in ascending order
+    mus_x : np.ndarray
+        Means of distributions in first dimension
+    mu_y : float
+        Mean of distributions in second dimension
+    sigma_x : float
+        Standard deviation in first dimension
+    sigma_y : float
+        Standard deviation in second dimension
+    normalized : bool, optional
+        Whether to normaliz amplitudes, by default False
+    skip_sigmas: float, int
+        Skip calculation if point on *map_2d* is more tha this amountof sigmas away in respective dimension
+        Decreasing this increases performance at the cost of accuracy. Minimum value is 3
+    """
     # Check
     if skip_sigmas < 3:
         raise ValueError("Minimum of skip_sigmas is 3 to maintain reasonable accuracy")
 
-    error_amplitude_squared = amplitude_error ** 2
-    
-    # Loop over y indices
-    for j in range(map_2d.shape[0]):
-        
-        # Extract current y coordinate
-        y_coord = bin_centers_y[j]
-        
-        # Check y coordinate
-        if abs(y_coord - mu_y) > skip_sigmas * sigma_y:
+    # Sum of the x profiles, weighted with the (squared error) amplitudes
+    x_profile_sum = np.zeros(shape=bin_centers_x.shape[0])
+    x_profile_sum_error = np.zeros(shape=bin_centers_x.shape[0])
+    x_start, x_stop = bin_centers_x.shape[0], 0
+
+    for i in range(mus_x.shape[0]):
+
+        start, stop, x_profile = gauss_1d_profile(bin_centers=bin_centers_x, mu=mus_x[i], sigma=sigma_x, skip_sigmas=skip_sigmas)
+
+        if start == stop:
             continue
-        
-        # Loop over x indices
-        for i in range(map_2d.shape[1]):
-
-            # Extract current x coordinate            
-            x_coord = bin_centers_x[i]
-
-            # Check x coordinate
-            if abs(x_coord - mu_x) > skip_sigmas * sigma_x:
-                continue
-            
-            # Apply Gaussian to map
-            map_2d[j, i] += gauss_2d_pdf(x=x_coord,
-                                         y=y_coord,
-                                         mu_x=mu_x,
-                                         mu_y=mu_y,
-                                         sigma_x=sigma_x,
-                                         sigma_y=sigma_y,
-                                         amplitude=amplitude,
-                                         normalized=normalized)
-
-            # Apply Gaussian to error map e.g. with squared amplitude
-            map_2d_error[j, i] += gauss_2d_pdf(x=x_coord,
-                                               y=y_coord,
-                                               mu_x=mu_x,
-                                               mu_y=mu_y,
-                                               sigma_x=sigma_x,
-                                               sigma_y=sigma_y,
-                                               amplitude=error_amplitude_squared,
-                                               normalized=normalized)
-
-
-@njit
+
+        x_profile_sum[start:stop] += amplitudes[i] * x_profile
+        x_profile_sum_error[start:stop] += amplitude_errors[i] ** 2 * x_profile
+
+        x_start, x_stop = min(x_start, start), max(x_stop, stop)
+
+    _apply_x_profile_sum(map_2d=map_2d,
+                         map_2d_error=map_2d_error,
+                         x_profile_sum=x_profile_sum,
+                         x_profile_sum_error=x_profile_sum_error,
+                         x_start=x_start,
+                         x_stop=x_stop,
+                         bin_centers_y=bin_centers_y,
+                         mu_y=mu_y,
+                         sigma_x=sigma_x,
+                         sigma_y=sigma_y,
+                         normalized=normalized,
+                         skip_sigmas=skip_sigmas)
+
+
+@njit(cache=True)
+def gauss_1d_profiles(bin_centers, sigma, skip_sigmas=6):
+    """
+    Precomputes the clipped 1D Gaussian profiles of *gauss_1d_profile* centered at each of the *bin_centers*
+
+    Parameters
+    ----------
+    bin_centers : np.ndarray
+        Bin centers in ascending order
+    sigma : float
+        Standard deviation of distribution
+    skip_sigmas: float, int
+        Bins which are more than this amount of sigmas away from the center are not part of the profile
+
+    Returns
+    -------
+    tuple: (np.ndarray, np.ndarray, np.ndarray)
+        Start and stop indices of the clipped bins per bin center and the profiles of shape (len(bin_centers), len(bin_centers)),
+        which are zero outside of the clipped bins
+    """
+    starts = np.empty(shape=bin_centers.shape[0], dtype=np.int64)
+    stops = np.empty(shape=bin_centers.shape[0], dtype=np.int64)
+    profiles = np.zeros(shape=(bin_centers.shape[0], bin_centers.shape[0]))
+
+    for i in range(bin_centers.shape[0]):
+        starts[i], stops[i], profiles[i, starts[i]:stops[i]] = gauss_1d_profile(bin_centers=bin_centers, mu=bin_centers[i], sigma=sigma, skip_sigmas=skip_sigmas)
+
+    return starts, stops, profiles
+
+
+@njit(cache=True)
+def apply_gauss_2d_kernel_bin_centers(map_2d, map_2d_error, amplitudes, amplitude_errors, profiles_x, bin_centers_y, mu_y, sigma_x, sigma_y, normalized, skip_sigmas=6):
+    """
+    Same as *apply_gauss_2d_kernel_row* for beam positions at each of the bin centers in x dimension, e.g. *amplitudes[i]* is
+    located at bin center i, using the x profiles precomputed by *gauss_1d_profiles* instead of evaluating them per row.
+
+    Parameters
+    ----------
+    map_2d : np.ndarray
+        Input map to apply kernels to which satisfies len(map_2d.shape)==2
+    map_2d_error : np.ndarray
+        Input error map to apply kernels to which satisfies len(map_2d.shape)==2
+    amplitudes : np.ndarray
+        Amplitudes of distributions, one per bin center in x dimension
+    amplitude_errors : np.ndarray
+        Amplitudes of error distributions, one per bin center in x dimension
+    profiles_x : tuple
+        Profiles in x dimension at each bin center with *sigma_x* and *skip_sigmas*, see *gauss_1d_profiles*
+    bin_centers_y : np.ndarray
+        Bin centers of *map_2d* in second dimension in ascending order
+    mu_y : float
+        Mean of distributions in second dimension
+    sigma_x : float
+        Standard deviation in first dimension
+    sigma_y : float
+        Standard deviation in second dimension
+    normalized : bool, optional
+        Whether to normaliz amplitudes, by default False
+    skip_sigmas: float, int
+        Skip calculation if point on *map_2d* is more tha this amountof sigmas away in respective dimension
+        Decreasing this increases performance at the cost of accuracy. Minimum value is 3
+    """
+    # Check
+    if skip_sigmas < 3:
+        raise ValueError("Minimum of skip_sigmas is 3 to maintain reasonable accuracy")
+
+    starts, stops, profiles = profiles_x
+
+    # Sum of the x profiles, weighted with the (squared error) amplitudes
+    x_profile_sum = np.zeros(shape=profiles.shape[1])
+    x_profile_sum_error = np.zeros(shape=profiles.shape[1])
+
+    for i in range(amplitudes.shape[0]):
+        x_profile_sum[starts[i]:stops[i]] += amplitudes[i] * profiles[i, starts[i]:stops[i]]
+        x_profile_sum_error[starts[i]:stops[i]] += amplitude_errors[i] ** 2 * profiles[i, starts[i]:stops[i]]
+
+    _apply_x_profile_sum(map_2d=map_2d,
+                         map_2d_error=map_2d_error,
+                         x_profile_sum=x_profile_sum,
+                         x_profile_sum_error=x_profile_sum_error,
+                         x_start=starts.min(),
+                         x_stop=stops.max(),
+                         bin_centers_y=bin_centers_y,
+                         mu_y=mu_y,
+                         sigma_x=sigma_x,
+                         sigma_y=sigma_y,
+                         normalized=normalized,
+                         skip_sigmas=skip_sigmas)
+
+
+@njit(cache=True)
+def _apply_x_profile_sum(map_2d, map_2d_error, x_profile_sum, x_profile_sum_error, x_start, x_stop, bin_centers_y, mu_y, sigma_x, sigma_y, normalized, skip_sigmas):
+    """
+    Add the outer product of the y profile at *mu_y* and the summed, amplitude-weighted x profiles of a row within *x_start* and
+    *x_stop* to the affected sub-rectangle of *map_2d* and *map_2d_error*. See *apply_gauss_2d_kernel_row* for the parameters.
+    """
+    y_start, y_stop, y_profile = gauss_1d_profile(bin_centers=bin_centers_y, mu=mu_y, sigma=sigma_y, skip_sigmas=skip_sigmas)
+
+    # Row or no position is on the map
+    if y_start == y_stop or x_start >= x_stop:
+        return
+
+    # Amplitude; normalize if needed to satisfy integral(gauss_2D_pdf) == 1
+    norm = 1.0 if normalized else gauss_2d_norm(amplitude=1.0, sigma_x=sigma_x, sigma_y=sigma_y)
+
+    # Apply outer product of profiles to the affected sub-rectangle
+    map_2d[y_start:y_stop, x_start:x_stop] += np.outer(norm * y_profile, x_profile_sum[x_start:x_stop])
+    map_2d_error[y_start:y_stop, x_start:x_stop] += np.outer(norm * y_profile, x_profile_sum_error[x_start:x_stop])
+
+
+@njit(cache=True)
+def deposit_point_charges_row(map_2d, map_2d_error, amplitudes, amplitude_errors, bin_centers_x, bin_centers_y, mus_x, mu_y):
+    """
+    Deposits point charges of multiple beam positions along a row, e.g. at common *mu_y*, on *map_2d* and *map_2d_error*, which are
+    convolved with the beam profile afterwards, see *convolve_gauss_2d*. Each charge is split linearly between the neighbouring bins
+    in each dimension. The maps extend beyond the bin centers by an equal number of bins on each side to hold charges outside the map.
+
+    Parameters
+    ----------
+    map_2d : np.ndarray
+        Padded map to deposit charges on which satisfies len(map_2d.shape)==2
+    map_2d_error : np.ndarray
+        Padded error map to deposit squared error charges on which satisfies len(map_2d.shape)==2
+    amplitudes : np.ndarray
+        Charges, one per position in *mus_x*
+    amplitude_errors : np.ndarray
+        Errors of charges, one per position in *mus_x*
+    bin_centers_x : np.ndarray
+        Equidistant bin centers of the unpadded map in first dimension in ascending order
+    bin_centers_y : np.ndarray
+        Equidistant bin centers of the unpadded map in second dimension in ascending order
+    mus_x : np.ndarray
+        Positions of charges in first dimension
+    mu_y : float
+        Position of charges in second dimension
+    """
+    pad_y = (map_2d.shape[0] - bin_centers_y.shape[0]) // 2
+    pad_x = (map_2d.shape[1] - bin_centers_x.shape[0]) // 2
+
+    # Fractional bin index on the padded map
+    pos_y = (mu_y - bin_centers_y[0]) / (bin_centers_y[1] - bin_centers_y[0]) + pad_y
+    j = int(np.floor(pos_y))
+
+    # Row is too far off the map to contribute
+    if j < 0 or j + 1 >= map_2d.shape[0]:
+        return
+
+    weights_y = (1 - (pos_y - j), pos_y - j)
+
+    for i in range(mus_x.shape[0]):
+
+        pos_x = (mus_x[i] - bin_centers_x[0]) / (bin_centers_x[1] - bin_centers_x[0]) + pad_x
+        k = int(np.floor(pos_x))
+
+        if k < 0 or k + 1 >= map_2d.shape[1]:
+            continue
+
+        weights_x = (1 - (pos_x - k), pos_x - k)
+
+        for dj in range(2):
+            for dk in range(2):
+                map_2d[j + dj, k + dk] += weights_y[dj] * weights_x[dk] * amplitudes[i]
+                map_2d_error[j + dj, k + dk] += weights_y[dj] * weights_x[dk] * amplitude_errors[i] ** 2
+
+
+def _gauss_1d_kernel_size(bin_centers, sigma, skip_sigmas=6):
+    """Number of bins by which the beam profile extends to each side, as used to pad maps of point charges"""
+    return int(np.ceil(skip_sigmas * sigma / (bin_centers[1] - bin_centers[0]))) + 1
+
+
+def convolve_gauss_2d(map_2d, bin_centers_x, bin_centers_y, sigma_x, sigma_y):
+    """
+    Convolves a padded map of point charges, see *deposit_point_charges_row*, with the normalized 2D Gaussian of *gauss_2d_pdf*,
+    sampled at the bin distances. The convolution is applied as two 1D FFT convolutions since the Gaussian is separable.
+
+    Parameters
+    ----------
+    map_2d : np.ndarray
+        Padded map of point charges
+    bin_centers_x : np.ndarray
+        Equidistant bin centers of the unpadded map in first dimension in ascending order
+    bin_centers_y : np.ndarray
+        Equidistant bin centers of the unpadded map in second dimension in ascending order
+    sigma_x : float
+        Standard deviation in first dimension
+    sigma_y : float
+        Standard deviation in second dimension
+
+    Returns
+    -------
+    np.ndarray
+        Convolved map of shape (len(bin_centers_y), len(bin_centers_x))
+    """
+    pad_y = (map_2d.shape[0] - bin_centers_y.shape[0]) // 2
+    pad_x = (map_2d.shape[1] - bin_centers_x.shape[0]) // 2
+
+    profile_x = np.exp(-0.5 * np.square(np.arange(-pad_x, pad_x + 1) * (bin_centers_x[1] - bin_centers_x[0]) / sigma_x))
+    profile_y = np.exp(-0.5 * np.square(np.arange(-pad_y, pad_y + 1) * (bin_centers_y[1] - bin_centers_y[0]) / sigma_y))
+
+    # Only bins of the unpadded map are fully covered by the profiles
+    convolved = fftconvolve(map_2d, profile_x[np.newaxis, :], mode='valid', axes=1)
+    convolved = fftconvolve(convolved, profile_y[:, np.newaxis], mode='valid', axes=0)
+
+    return gauss_2d_norm(amplitude=convolved, sigma_x=sigma_x, sigma_y=sigma_y)
+
+
+@njit(cache=True)
 def _calc_bin_transit_times(bin_transit_times, bin_edges, scan_speed, scan_accel):
     """
     Calculate the time it takes to transit each bin in scan direction and fill array
@@ -380,8 +941,36 @@ def _calc_bin_transit_times(bin_transit_times, bin_edges, scan_speed, scan_accel
         current_speed += scan_accel * bin_transit_times[i]
 
 
-@njit
-def _process_row_wait(row_data, wait_beam_data, fluence_map, fluence_map_error, map_bin_edges_x, map_bin_centers_x, map_bin_centers_y, beam_sigma, scan_y_offset, scan_area_start_x, scan_area_stop_x):
+def _calc_transit_time_tables(scan_data, map_bin_edges_x):
+    """
+    Calculate the bin transit times, see *_calc_bin_transit_times*, and their cumulative sums once per distinct combination of
+    scan speed and acceleration of the scanned rows instead of per row
+
+    Parameters
+    ----------
+    scan_data : numpy.ndarray
+        Structured numpy array containing data of the scanned rows
+    map_bin_edges_x : numpy.ndarray
+        Flat numpy array holding the bin edges of the fluence map in scan direction
+
+    Returns
+    -------
+    tuple: (np.ndarray, np.ndarray, np.ndarray)
+        Index of the table of each row, bin transit times and cumulative bin transit times per table
+    """
+
+    speed_accel, row_table_indices = np.unique(np.column_stack((scan_data['row_scan_speed'], scan_data['row_scan_accel'])), axis=0, return_inverse=True)
+
+    bin_transit_times = np.zeros(shape=(len(speed_accel), len(map_bin_edges_x) - 1))
+
+    for i, (scan_speed, scan_accel) in enumerate(speed_accel):
+        _calc_bin_transit_times(bin_transit_times=bin_transit_times[i], bin_edges=map_bin_edges_x, scan_speed=scan_speed, scan_accel=scan_accel)
+
+    return row_table_indices.reshape(-1), bin_transit_times, np.cumsum(bin_transit_times, axis=1)
+
+
+@njit(cache=True)
+def _process_row_wait(row_data, wait_beam_data, fluence_map, fluence_map_error, map_bin_edges_x, map_bin_centers_x, map_bin_centers_y, beam_sigma, scan_y_offset, scan_area_start_x, scan_area_stop_x, convolve=False):
     """
     Processes the times where the beam is waiting on the periphery of the scan area or switches rows.
     Always checks the wait time from previous row until current row.
@@ -412,6 +1001,9 @@ def _process_row_wait(row_data, wait_beam_data, fluence_map, fluence_map_error,
         X-value of the beginning of the scan area (left side)
     scan_area_stop_x : float
         X-value of the end of the scan area (right side)
+    convolve : bool, optional
+        Whether to deposit point charges on the padded maps which are convolved with the beam profile afterwards, by default False.
+        See *deposit_point_charges_row*
     """
 
     wait_mu_y = row_data['row_start_y'] - scan_y_offset
@@ -430,37 +1022,40 @@ def _process_row_wait(row_data, wait_beam_data, fluence_map, fluence_map_error,
     # Add variation to the uncertainty
     wait_ions_std = np.nanstd(wait_beam_data['beam_current'])
     
-    # Loop over currents and apply Gauss kernel at given position
-    for i in range(wait_beam_data.shape[0] - 1):
-
-        # Get beam current measurement
-        wait_current = wait_beam_data[i]['beam_current']
-        wait_current_error = wait_beam_data[i]['beam_current_error']
-
-        # Calculate how many seconds this current was present while waiting
-        wait_interval = wait_beam_data[i+1]['timestamp'] - wait_beam_data[i]['timestamp']
-
-        # Integrate over *wait_interval* to obtain number of ions induced
-        wait_ions = wait_current * wait_interval / elementary_charge
-        wait_ions_error = wait_current_error * wait_interval / elementary_charge
-        wait_ions_error = (wait_ions_error**2 + wait_ions_std**2)**.5
-
-        # Apply Gaussian kernel for ions
-        apply_gauss_2d_kernel(map_2d=fluence_map,
-                              map_2d_error=fluence_map_error,
-                              amplitude=wait_ions,
-                              amplitude_error=wait_ions_error,
-                              bin_centers_x=map_bin_centers_x,
-                              bin_centers_y=map_bin_centers_y,
-                              mu_x=wait_mu_x,
-                              mu_y=wait_mu_y,
-                              sigma_x=beam_sigma[0],
-                              sigma_y=beam_sigma[1],
-                              normalized=False)
-
-
-@njit
-def _process_row_scan(row_data, row_beam_data, fluence_map, fluence_map_error, row_bin_transit_times, map_bin_edges_x, map_bin_centers_x, map_bin_centers_y, beam_sigma, scan_y_offset, scan_area_start_x, scan_area_stop_x):
+    # Calculate how many seconds each current was present while waiting; the last measurement ends the wait
+    wait_intervals = wait_beam_data['timestamp'][1:] - wait_beam_data['timestamp'][:-1]
+
+    # Integrate over wait intervals to obtain number of ions induced
+    wait_ions = wait_beam_data['beam_current'][:-1] * wait_intervals / elementary_charge
+    wait_ions_error = wait_beam_data['beam_current_error'][:-1] * wait_intervals / elementary_charge
+    wait_ions_error = (wait_ions_error**2 + wait_ions_std**2)**.5
+
+    # Apply Gaussian kernels for ions; all at the same position
+    if convolve:
+        deposit_point_charges_row(map_2d=fluence_map,
+                                  map_2d_error=fluence_map_error,
+                                  amplitudes=wait_ions,
+                                  amplitude_errors=wait_ions_error,
+                                  bin_centers_x=map_bin_centers_x,
+                                  bin_centers_y=map_bin_centers_y,
+                                  mus_x=np.full(wait_ions.shape[0], wait_mu_x),
+                                  mu_y=wait_mu_y)
+    else:
+        apply_gauss_2d_kernel_row(map_2d=fluence_map,
+                                  map_2d_error=fluence_map_error,
+                                  amplitudes=wait_ions,
+                                  amplitude_errors=wait_ions_error,
+                                  bin_centers_x=map_bin_centers_x,
+                                  bin_centers_y=map_bin_centers_y,
+                                  mus_x=np.full(wait_ions.shape[0], wait_mu_x),
+                                  mu_y=wait_mu_y,
+                                  sigma_x=beam_sigma[0],
+                                  sigma_y=beam_sigma[1],
+                                  normalized=False)
+
+
+@njit(cache=True)
+def _process_row_scan(row_data, row_beam_data, fluence_map, fluence_map_error, row_bin_transit_times, row_cum_transit_times, map_bin_centers_x, map_bin_centers_y, map_profiles_x, beam_sigma, scan_y_offset, scan_area_start_x, scan_area_stop_x, convolve=False):
     """
     Processes the scanning of a single row.
 
@@ -475,13 +1070,15 @@ def _process_row_scan(row_data, row_beam_data, fluence_map, fluence_map_error, r
     fluence_map_error : numpy.ndarray
         Two-dimensional numpy.ndarray which holds the fluence error distribution and is updated for this row
     row_bin_transit_times : numpy.ndarray
-        Flat numpy array which is used to hold the bin transit times for this row
-    map_bin_edges_x : numpy.ndarray
-        Flat numpy array holding the bin edges of the *fluence_map* in scan direction
+        Flat numpy array holding the bin transit times for this row, see *_calc_transit_time_tables*
+    row_cum_transit_times : numpy.ndarray
+        Flat numpy array holding the cumulative bin transit times for this row
     map_bin_centers_x : numpy.ndarray
         Flat numpy array holding the bin centers of the *fluence_map* in scan direction
     map_bin_centers_y : numpy.ndarray
         Flat numpy array holding the bin centers of the *fluence_map* in row direction
+    map_profiles_x : tuple
+        Beam profiles in scan direction at each of the *map_bin_centers_x*, see *gauss_1d_profiles*
     beam_sigma : tuple, list, numpy.ndarray
         Iterable of beam sigmas with len(beam_sigma) == 2
     scan_y_offset : float
@@ -490,11 +1087,11 @@ def _process_row_scan(row_data, row_beam_data, fluence_map, fluence_map_error, r
         X-value of the beginning of the scan area (left side)
     scan_area_stop_x : float
         X-value of the end of the scan area (right side)
+    convolve : bool, optional
+        Whether to deposit point charges on the padded maps which are convolved with the beam profile afterwards, by default False.
+        See *deposit_point_charges_row*
     """
 
-    # Update row bin times
-    _calc_bin_transit_times(bin_transit_times=row_bin_transit_times, bin_edges=map_bin_edges_x, scan_speed=row_data['row_scan_speed'], scan_accel=row_data['row_scan_accel'])
-
     # Determine communication timing overhead; assume symmetric dead time at row start and end
     row_start_overhead = (row_data['row_stop_timestamp'] - row_data['row_start_timestamp'] - row_bin_transit_times.sum()) / 2.0
     
@@ -502,7 +1099,7 @@ def _process_row_scan(row_data, row_beam_data, fluence_map, fluence_map_error, r
     actual_row_start_timestamp = row_data['row_start_timestamp'] + row_start_overhead
 
     # Calculate the timstamps which correspond to being in the map_bin_centers_x 
-    row_bin_center_timestamps = actual_row_start_timestamp + np.cumsum(row_bin_transit_times) - row_bin_transit_times / 2.0
+    row_bin_center_timestamps = actual_row_start_timestamp + row_cum_transit_times - row_bin_transit_times / 2.0
     
     # Interpolate the beam current measurements at the bin center for this scan
     row_bin_center_currents = np.interp(row_bin_center_timestamps, row_beam_data['timestamp'], row_beam_data['beam_current'])
@@ -517,34 +1114,40 @@ def _process_row_scan(row_data, row_beam_data, fluence_map, fluence_map_error, r
 
     # Check if scan goes from left to right or vice versa to correctly fill bins with respective currents
     # Allow the position to be not exact; sometimes motorstage controller is a step off, allow a 1 mm window
-    # This row is scanned from left to right; bin centers are correct
+    # This row is scanned from left to right; ions are in order of the bin centers
     if scan_area_start_x - 0.5 < row_data['row_start_x'] < scan_area_start_x + 0.5:
-        x_bin_centers = map_bin_centers_x
-    # This row is scanned from right to left; bin centers need to be reversed to correctly reflect where the beam current is deposited
+        pass
+    # This row is scanned from right to left; due to symmetric bin transit times, we can reverse the ions to fill correctly
     elif scan_area_stop_x - 0.5 < row_data['row_start_x'] < scan_area_stop_x + 0.5:
-        x_bin_centers = map_bin_centers_x[::-1]
+        row_bin_center_ions, row_bin_center_ion_errors = row_bin_center_ions[::-1], row_bin_center_ion_errors[::-1]
     else:
         raise ValueError('Row started at neither edge of scan area')
 
-    # Loop over ions in bins; due to symmetric bin transit times, we can reverse the bin center position for right to left scans to fill correctly
-    for i in range(row_bin_center_ions.shape[0]):
-        
-        # Apply Gaussian kernel for ions
-        apply_gauss_2d_kernel(map_2d=fluence_map,
-                              map_2d_error=fluence_map_error,
-                              amplitude=row_bin_center_ions[i],
-                              amplitude_error=row_bin_center_ion_errors[i],
-                              bin_centers_x=map_bin_centers_x,
-                              bin_centers_y=map_bin_centers_y,
-                              mu_x=x_bin_centers[i],
-                              mu_y=mu_y,
-                              sigma_x=beam_sigma[0],
-                              sigma_y=beam_sigma[1],
-                              normalized=False)
-
-
-@njit
-def _process_row(row_data, beam_data, fluence_map, fluence_map_error, row_bin_transit_times, map_bin_edges_x, map_bin_centers_x, map_bin_centers_y, beam_sigma, scan_y_offset, current_row_idx, scan_area_start_x, scan_area_stop_x):
+    # Apply Gaussian kernels for ions in bins
+    if convolve:
+        deposit_point_charges_row(map_2d=fluence_map,
+                                  map_2d_error=fluence_map_error,
+                                  amplitudes=row_bin_center_ions,
+                                  amplitude_errors=row_bin_center_ion_errors,
+                                  bin_centers_x=map_bin_centers_x,
+                                  bin_centers_y=map_bin_centers_y,
+                                  mus_x=map_bin_centers_x,
+                                  mu_y=mu_y)
+    else:
+        apply_gauss_2d_kernel_bin_centers(map_2d=fluence_map,
+                                          map_2d_error=fluence_map_error,
+                                          amplitudes=row_bin_center_ions,
+                                          amplitude_errors=row_bin_center_ion_errors,
+                                          profiles_x=map_profiles_x,
+                                          bin_centers_y=map_bin_centers_y,
+                                          mu_y=mu_y,
+                                          sigma_x=beam_sigma[0],
+                                          sigma_y=beam_sigma[1],
+                                          normalized=False)
+
+
+@njit(cache=True)
+def _process_row(row_data, beam_data, fluence_map, fluence_map_error, row_bin_transit_times, row_cum_transit_times, map_bin_edges_x, map_bin_centers_x, map_bin_centers_y, map_profiles_x, beam_sigma, scan_y_offset, current_row_idx, scan_area_start_x, scan_area_stop_x, convolve=False):
     """
     Process the scanning and waiting / switching of a single row
 
@@ -559,13 +1162,17 @@ def _process_row(row_data, beam_data, fluence_map, fluence_map_error, row_bin_tr
     fluence_map_error : numpy.ndarray
         Two-dimensional numpy.ndarray which holds the fluence error distribution and is updated for this row
     row_bin_transit_times : numpy.ndarray
-        Flat numpy array which is used to hold the bin transit times for this row
+        Flat numpy array holding the bin transit times for this row, see *_calc_transit_time_tables*
+    row_cum_transit_times : numpy.ndarray
+        Flat numpy array holding the cumulative bin transit times for this row
     map_bin_edges_x : numpy.ndarray
         Flat numpy array holding the bin edges of the *fluence_map* in scan direction
     map_bin_centers_x : numpy.ndarray
         Flat numpy array holding the bin centers of the *fluence_map* in scan direction
     map_bin_centers_y : numpy.ndarray
         Flat numpy array holding the bin centers of the *fluence_map* in row direction
+    map_profiles_x : tuple
+        Beam profiles in scan direction at each of the *map_bin_centers_x*, see *gauss_1d_profiles*
     beam_sigma : tuple, list, numpy.ndarray
         Iterable of beam sigmas with len(beam_sigma) == 2
     scan_y_offset : float
@@ -577,6 +1184,9 @@ def _process_row(row_data, beam_data, fluence_map, fluence_map_error, row_bin_tr
         X-value of the beginning of the scan area (left side)
     scan_area_stop_x : float
         X-value of the end of the scan area (right side)
+    convolve : bool, optional
+        Whether to deposit point charges on the padded maps which are convolved with the beam profile afterwards, by default False.
+        See *deposit_point_charges_row*
 
     Returns
     -------
@@ -614,7 +1224,8 @@ def _process_row(row_data, beam_data, fluence_map, fluence_map_error, row_bin_tr
                             beam_sigma=beam_sigma,
                             scan_y_offset=scan_y_offset,
                             scan_area_start_x=scan_area_start_x,
-                            scan_area_stop_x=scan_area_stop_x)
+                            scan_area_stop_x=scan_area_stop_x,
+                            convolve=convolve)
 
     # Process the scan
     _process_row_scan(row_data=row_data,
@@ -622,13 +1233,87 @@ def _process_row(row_data, beam_data, fluence_map, fluence_map_error, row_bin_tr
                       fluence_map=fluence_map,
                       fluence_map_error=fluence_map_error,
                       row_bin_transit_times=row_bin_transit_times,
-                      map_bin_edges_x=map_bin_edges_x,
+                      row_cum_transit_times=row_cum_transit_times,
                       map_bin_centers_x=map_bin_centers_x,
                       map_bin_centers_y=map_bin_centers_y,
+                      map_profiles_x=map_profiles_x,
                       beam_sigma=beam_sigma,
                       scan_y_offset=scan_y_offset,
                       scan_area_start_x=scan_area_start_x,
-                      scan_area_stop_x=scan_area_stop_x)
+                      scan_area_stop_x=scan_area_stop_x,
+                      convolve=convolve)
     
     # Calculate index to return
     return current_row_idx + row_stop_idx
+
+
+@njit(cache=True)
+def _calc_row_beam_indices(scan_data, beam_timestamps, current_row_idx):
+    """
+    Calculate the index of the beam data from which each scanned row is processed, as returned by successive calls of *_process_row*
+
+    Parameters
+    ----------
+    scan_data : numpy.ndarray
+        Structured numpy array containing data of the scanned rows
+    beam_timestamps : numpy.ndarray
+        Timestamps of the beam data
+    current_row_idx : int
+        Index of the beam data from which the first row is processed
+
+    Returns
+    -------
+    numpy.ndarray
+        Indices of the beam data per row; the last entry is the index up to which beam data is processed by all rows
+    """
+    row_beam_indices = np.empty(shape=scan_data.shape[0] + 1, dtype=np.int64)
+    row_beam_indices[0] = current_row_idx
+
+    for i in range(scan_data.shape[0]):
+        row_beam_indices[i + 1] = row_beam_indices[i] + np.searchsorted(beam_timestamps[row_beam_indices[i]:], scan_data[i]['row_stop_timestamp'], side='right')
+
+    return row_beam_indices
+
+
+@njit(parallel=True, cache=True)
+def _process_row_blocks(scan_data, beam_data, row_beam_indices, block_fluence_maps, block_fluence_map_errors, row_table_indices, bin_transit_times, cum_transit_times, map_bin_edges_x, map_bin_centers_x, map_bin_centers_y, map_profiles_x, beam_sigma, scan_y_offset, scan_area_start_x, scan_area_stop_x, convolve=False):
+    """
+    Process blocks of consecutive scanned rows in parallel; each block fills its own fluence map. See *_process_row* for the parameters.
+
+    Parameters
+    ----------
+    row_beam_indices : numpy.ndarray
+        Index of the beam data from which each row is processed, see *_calc_row_beam_indices*
+    block_fluence_maps : numpy.ndarray
+        Three-dimensional numpy.ndarray which holds the fluence distribution per block
+    block_fluence_map_errors : numpy.ndarray
+        Three-dimensional numpy.ndarray which holds the fluence error distribution per block
+    row_table_indices : numpy.ndarray
+        Index of the transit time tables of each row, see *_calc_transit_time_tables*
+    bin_transit_times : numpy.ndarray
+        Bin transit times per table
+    cum_transit_times : numpy.ndarray
+        Cumulative bin transit times per table
+    """
+    n_blocks, n_rows = block_fluence_maps.shape[0], scan_data.shape[0]
+
+    for block in prange(n_blocks):
+
+        for i in range(block * n_rows // n_blocks, (block + 1) * n_rows // n_blocks):
+
+            _process_row(row_data=scan_data[i],
+                         beam_data=beam_data,
+                         fluence_map=block_fluence_maps[block],
+                         fluence_map_error=block_fluence_map_errors[block],
+                         row_bin_transit_times=bin_transit_times[row_table_indices[i]],
+                         row_cum_transit_times=cum_transit_times[row_table_indices[i]],
+                         map_bin_edges_x=map_bin_edges_x,
+                         map_bin_centers_x=map_bin_centers_x,
+                         map_bin_centers_y=map_bin_centers_y,
+                         map_profiles_x=map_profiles_x,
+                         beam_sigma=beam_sigma,
+                         scan_y_offset=scan_y_offset,
+                         current_row_idx=row_beam_indices[i],
+                         scan_area_start_x=scan_area_start_x,
+                         scan_area_stop_x=scan_area_stop_x,
+                         convolve=convolve)
@@ -124,13 +124,22 @@ def calibrated_beam_current(beam_monitor_sig, calibration_factor, full_scale_cur
 
 def rel_beam_position(sig_a, sig_b, plane):
 
-    try:
-        rel_pos = float(sig_a - sig_b) / float(sig_a + sig_b)
-    except ZeroDivisionError:
-        rel_pos = 0.0
+    if isinstance(sig_a, np.ndarray):
+        sig_sum = sig_a + sig_b
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rel_pos = np.where(sig_sum == 0, 0.0, (sig_a - sig_b) / sig_sum)
 
-    # If we don't have beam, sometimes results get large and cause problems with displaying the data, therefore limit
-    rel_pos = 1.0 if rel_pos > 1 else -1 if rel_pos < -1 else rel_pos
+        # If we don't have beam, sometimes results get large and cause problems with displaying the data, therefore limit
+        rel_pos = np.clip(rel_pos, -1, 1)
+
+    else:
+        try:
+            rel_pos = float(sig_a - sig_b) / float(sig_a + sig_b)
+        except ZeroDivisionError:
+            rel_pos = 0.0
+
+        # If we don't have beam, sometimes results get large and cause problems with displaying the data, therefore limit
+        rel_pos = 1.0 if rel_pos > 1 else -1 if rel_pos < -1 else rel_pos
 
     # Horizontally, if we are shifted to the left the graph should move to the left, therefore * -1
     rel_pos *= -100 if plane == 'h' else 100
@@ -2,6 +2,7 @@ import sys
 import os
 import logging
 import argparse
+from contextlib import closing
 from matplotlib.backends.backend_pdf import PdfPages
 from tqdm import tqdm
 
@@ -82,13 +83,17 @@ def input_files(infiles):
             logging.error(f"Input file(s) {file_name}.h5(.yaml) not found! Skipping.")
             continue
 
-        # Load data
-        data, config = load_irrad_data(data_file=session_data, config_file=session_config)
+        # Load data; entries are only read once they are needed by the analysis
+        data, config = load_irrad_data(data_file=session_data, config_file=session_config, lazy=True)
 
         # Make default output analysis file name
         session_basename = os.path.join(file_folder, session_name)
 
-        yield i, data, config, session_basename
+        # Close the file once it has been analysed, also if the analysis fails or stops early
+        try:
+            yield i, data, config, session_basename
+        finally:
+            data.close()
 
 def save_plots(plots, outfile):
     """
@@ -132,6 +137,9 @@ def main():
     for option_flag in OPTION_FLAGS:
         option_group.add_argument(f'--{option_flag}', required=False, action='store_true')
     
+    # Number of parallel jobs for the damage analysis
+    analyse_parser.add_argument('-j', '--jobs', required=False, type=int, default=1, help="Number of parallel jobs for the damage analysis; 0 uses all CPUs")
+
     # Actually parse the guy 
     parsed = vars(analyse_parser.parse_args(sys.argv[1:]))
 
@@ -158,7 +166,9 @@ def main():
         # Open PDF 
         with PdfPages(analysis_out_pdf) as out_pdf:
 
-            res = irrad_analysis.damage.main(data=input_files(infiles=parsed['infile']))
+            # Closing the generator closes the open input file if the analysis fails
+            with closing(input_files(infiles=parsed['infile'])) as data:
+                res = irrad_analysis.damage.main(data=data, n_jobs=parsed['jobs'] or None)
 
             save_plots(plots=res, outfile=out_pdf)
 
@@ -171,25 +181,29 @@ def main():
         else:
             analysis_out_pdf = None
         
-        # Loop over generator and do same analysis on each input file
-        for nfile, data, config, session_basename in input_files(infiles=parsed['infile']):
+        # Loop over generator and do same analysis on each input file; closing it closes the open input file if the analysis fails
+        with closing(input_files(infiles=parsed['infile'])) as files:
+            for nfile, data, config, session_basename in files:
+
+                actual_analysis_out_pdf = session_basename + f'_analysis_{analysis_suffix}.pdf' if analysis_out_pdf is None else analysis_out_pdf[nfile]
+
+                logging.info(f"Opening analysis output PDF {os.path.relpath(actual_analysis_out_pdf, os.getcwd())}")
+
+                with PdfPages(actual_analysis_out_pdf) as out_pdf:
 
-            actual_analysis_out_pdf = session_basename + f'_analysis_{analysis_suffix}.pdf' if analysis_out_pdf is None else analysis_out_pdf[nfile]
+                    # Loop over different irradiation server and perform analysis
+                    for _, content in config['server'].items():
 
-            logging.info(f"Opening analysis output PDF {os.path.relpath(actual_analysis_out_pdf, os.getcwd())}")
+                        # Loop over flags and perform analysis if flag is set
+                        for a_flag in ANALYSIS_FLAGS:
+                            if parsed[a_flag]:
 
-            with PdfPages(actual_analysis_out_pdf) as out_pdf:
+                                # Only the damage analysis runs in parallel
+                                kwargs = {'n_jobs': parsed['jobs'] or None} if a_flag == 'damage' else {}
 
-                # Loop over different irradiation server and perform analysis
-                for _, content in config['server'].items():
-                    
-                    # Loop over flags and perform analysis if flag is set
-                    for a_flag in ANALYSIS_FLAGS:
-                        if parsed[a_flag]:
-                            
-                            # Load submodule with same name as flag and call main analyis
-                            res = getattr(irrad_analysis, a_flag).main(data=data, config=content)
-                            save_plots(res, out_pdf)
+                                # Load submodule with same name as flag and call main analyis
+                                res = getattr(irrad_analysis, a_flag).main(data=data, config=content, **kwargs)
+                                save_plots(res, out_pdf)
 
 
 if __name__ == '__main__':
@@ -21,19 +21,19 @@ def create_beam_scan_mask(beam_data, scan_data):
     ndarray
         bool mask indicating where scanning occured in the beam data
     """
-    # Initially all false
-    beam_during_scan_mask = np.zeros_like(beam_data, dtype=bool)
+    beam_timestamps = beam_data['timestamp']
 
-    speed_up_idx = 0
-    
-    for idx_scan in range(scan_data.shape[0]):
-        current_beam_data = beam_data['timestamp'][speed_up_idx:]
-        idx_row_start = np.searchsorted(current_beam_data, scan_data[idx_scan]['row_start_timestamp']) + speed_up_idx
-        idx_row_stop = np.searchsorted(current_beam_data, scan_data[idx_scan]['row_stop_timestamp']) + speed_up_idx
-        beam_during_scan_mask[idx_row_start:idx_row_stop] = True
-        speed_up_idx = idx_row_stop
-    
-    return beam_during_scan_mask
+    # Search all rows at once; each row is searched from the end of the previous row on
+    idx_row_stop = np.maximum.accumulate(np.searchsorted(beam_timestamps, scan_data['row_stop_timestamp']))
+    idx_row_start = np.maximum(np.searchsorted(beam_timestamps, scan_data['row_start_timestamp']),
+                               np.concatenate(([0], idx_row_stop[:-1])))
+
+    # Mark the ranges of all rows
+    row_edges = np.zeros(shape=len(beam_timestamps) + 1, dtype=int)
+    np.add.at(row_edges, idx_row_start, 1)
+    np.add.at(row_edges, idx_row_stop, -1)
+
+    return np.cumsum(row_edges[:-1]) > 0
 
 
 def generate_scan_resolved_damage_map(scan_data, irrad_data, damage='row_primary_fluence'):
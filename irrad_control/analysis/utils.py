@@ -1,3 +1,4 @@
+import numpy as np
 import tables as tb
 import collections.abc
 
@@ -14,7 +15,285 @@ def update_dict(d, u):
     return d
 
 
-def load_irrad_data(data_file, config_file, specify_entries=None, subtract_raw_offset=True):
+class IrradTable(object):
+    """
+    Lazy access to a table of an irradiation file. Columns are read on first access and kept, row ranges are read
+    on demand via *read* or *iter_chunks* without keeping them. Any other indexing e.g. slicing reads the entire
+    table once. If an offset is given, it is subtracted from the read data on the fly. Rows of a time window are
+    read via *window*, which uses a coarse index of the timestamps, see *time_index*.
+
+    Parameters
+    ----------
+    table: tables.Table
+        Table to read from
+    offset: numpy.ndarray, None
+        Row of offsets which are subtracted from the respective columns, except the timestamp
+    """
+
+    # Bytes of rows which are read at once when building the time index
+    _index_read_size = 2**24
+
+    def __init__(self, table, offset=None):
+        self.table = table
+        self.offset = offset
+        self._columns = {}
+        self._data = None
+        self._time_index = None
+
+    @property
+    def dtype(self):
+        return self.table.dtype
+
+    @property
+    def shape(self):
+        return self.table.shape
+
+    def __len__(self):
+        return self.table.nrows
+
+    def _subtract_offset(self, data, field=None):
+        if self.offset is not None:
+            for dname in self.offset.dtype.names:
+                if dname == 'timestamp':
+                    continue
+                if field is None and dname in data.dtype.names:
+                    data[dname] -= self.offset[dname]
+                elif field == dname:
+                    data -= self.offset[dname]
+        return data
+
+    def read(self, start=None, stop=None, field=None):
+        """
+        Read rows from *start* to *stop* of the table or only of column *field*
+
+        Returns
+        -------
+        numpy.ndarray: structured array of rows or array of column values
+        """
+        return self._subtract_offset(self.table.read(start=start, stop=stop, field=field), field=field)
+
+    def iter_chunks(self, chunk_size=1000000, field=None):
+        """
+        Generator reading the table or only column *field* in chunks of *chunk_size* rows
+        """
+        for start in range(0, len(self), chunk_size):
+            yield self.read(start=start, stop=start + chunk_size, field=field)
+
+    def time_index(self):
+        """
+        Index of the minimum and maximum timestamp per block of rows, with blocks being the chunks of the table on
+        disk. Built by reading the timestamps once in chunks and kept for subsequent queries.
+
+        Returns
+        -------
+        tuple: (block_size, block_min, block_max)
+        """
+        if self._time_index is None:
+
+            block_size = self.table.chunkshape[0]
+            block_min, block_max = [], []
+
+            # Read as many blocks at once as fit into the read size
+            n_blocks = max(1, self._index_read_size // (block_size * self.table.rowsize))
+
+            for timestamps in self.iter_chunks(chunk_size=block_size * n_blocks, field='timestamp'):
+                for i in range(0, len(timestamps), block_size):
+                    block_min.append(timestamps[i:i + block_size].min())
+                    block_max.append(timestamps[i:i + block_size].max())
+
+            self._time_index = block_size, np.array(block_min), np.array(block_max)
+
+        return self._time_index
+
+    def _window_blocks(self, t_start=None, t_stop=None):
+        """Range of rows of the blocks which contain timestamps between *t_start* and *t_stop*"""
+
+        block_size, block_min, block_max = self.time_index()
+
+        candidates = np.ones(shape=len(block_min), dtype=bool)
+        if t_start is not None:
+            candidates &= block_max >= t_start
+        if t_stop is not None:
+            candidates &= block_min <= t_stop
+
+        blocks = np.flatnonzero(candidates)
+
+        if not len(blocks):
+            return 0, 0
+
+        return int(blocks[0]) * block_size, min(int(blocks[-1] + 1) * block_size, len(self))
+
+    def window_rows(self, t_start=None, t_stop=None):
+        """
+        Range of rows with timestamps from *t_start* to *t_stop*, both inclusive, for tables in order of time.
+        Only the timestamps of the first and last block of the window are read.
+
+        Returns
+        -------
+        tuple: (start, stop) to be used as table[start:stop]
+        """
+        start, stop = self._window_blocks(t_start=t_start, t_stop=t_stop)
+
+        if start == stop:
+            return start, stop
+
+        block_size = self.time_index()[0]
+
+        if t_start is not None:
+            start += int(np.searchsorted(self.read(start=start, stop=min(start + block_size, stop), field='timestamp'), t_start, side='left'))
+        if t_stop is not None:
+            last_block = max(stop - block_size, start)
+            stop = last_block + int(np.searchsorted(self.read(start=last_block, stop=stop, field='timestamp'), t_stop, side='right'))
+
+        return start, stop
+
+    def window(self, t_start=None, t_stop=None, field=None):
+        """
+        Read the rows with timestamps from *t_start* to *t_stop*, both inclusive, or only column *field* of them.
+        Only the blocks of rows containing the window are read.
+
+        Returns
+        -------
+        numpy.ndarray: structured array of rows or array of column values
+        """
+        start, stop = self._window_blocks(t_start=t_start, t_stop=t_stop)
+
+        data = self.read(start=start, stop=stop)
+
+        mask = np.ones(shape=len(data), dtype=bool)
+        if t_start is not None:
+            mask &= data['timestamp'] >= t_start
+        if t_stop is not None:
+            mask &= data['timestamp'] <= t_stop
+
+        return data[mask] if field is None else data[field][mask]
+
+    def load(self):
+        """Read the entire table once and keep it in memory"""
+        if self._data is None:
+            self._data = self.read()
+        return self._data
+
+    def __getitem__(self, item):
+        if isinstance(item, str):
+            if self._data is not None:
+                return self._data[item]
+            if item not in self._columns:
+                self._columns[item] = self.read(field=item)
+            return self._columns[item]
+        return self.load()[item]
+
+    def __iter__(self):
+        return iter(self.load())
+
+    def __array__(self, dtype=None, copy=None):
+        return self.load() if dtype is None else self.load().astype(dtype)
+
+
+class IrradGroup(collections.abc.Mapping):
+    """
+    Dict-like access to the nodes of a group of an irradiation file. Tables are accessed lazily via IrradTable,
+    arrays are small and read on access.
+
+    Parameters
+    ----------
+    group: tables.Group
+        Group of the irradiation file
+    offsets: dict, None
+        Offset row per table name, see IrradTable
+    """
+
+    def __init__(self, group, offsets=None):
+        self.group = group
+        self._offsets = offsets or {}
+        self._tables = {}
+
+    def __getitem__(self, item):
+
+        if item not in self.group:
+            raise KeyError(item)
+
+        node = self.group._f_get_child(item)
+
+        if isinstance(node, tb.Group):
+            return IrradGroup(group=node)
+
+        if isinstance(node, tb.Table):
+            if item not in self._tables:
+                self._tables[item] = IrradTable(table=node, offset=self._offsets.get(item))
+            return self._tables[item]
+
+        return node.read()
+
+    def __iter__(self):
+        return iter(self.group._v_children)
+
+    def __len__(self):
+        return len(self.group._v_children)
+
+
+class IrradDataset(collections.abc.Mapping):
+    """
+    Lazy alternative to *load_irrad_data* with the same nested dict-like access e.g. data[server_name]['Beam'],
+    which only reads data when accessed. Scripts only accessing e.g. beam and scan data do not read raw data at all.
+    The file stays open until *close* is called or the dataset is used as context manager.
+
+    Parameters
+    ----------
+    data_file: str
+        Path to the data file of respective irradiation
+    config_file: str
+        Path to the config file of respective irradiation
+    subtract_raw_offset: bool
+        Whether to subtract the offset from the raw data when reading it
+    """
+
+    def __init__(self, data_file, config_file, subtract_raw_offset=True):
+
+        self.config = load_yaml(config_file)
+
+        self.data_file = tb.open_file(data_file, 'r')
+
+        self._servers = {}
+
+        for server in self.config['server']:
+
+            server_name = self.config['server'][server]['name']
+
+            if server_name not in self.data_file.root:
+                continue
+
+            offsets = {}
+
+            # Offsets of raw data are subtracted per read
+            if subtract_raw_offset and all(e in self.data_file.root[server_name] for e in ('Raw', 'RawOffset')):
+                raw_offset = self.data_file.root[server_name]['RawOffset']
+                if raw_offset.nrows > 0:
+                    # Substract latest offset
+                    offsets['Raw'] = raw_offset.read(start=raw_offset.nrows - 1)[0]
+
+            self._servers[server_name] = IrradGroup(group=self.data_file.root[server_name], offsets=offsets)
+
+    def __getitem__(self, item):
+        return self._servers[item]
+
+    def __iter__(self):
+        return iter(self._servers)
+
+    def __len__(self):
+        return len(self._servers)
+
+    def close(self):
+        self.data_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def load_irrad_data(data_file, config_file, specify_entries=None, subtract_raw_offset=True, lazy=False):
     """
     Function that reads the output files of an irradiation and returns generated data and configuration
 
@@ -28,12 +307,18 @@ def load_irrad_data(data_file, config_file, specify_entries=None, subtract_raw_o
         Name or iterable of names of entries to load. I None, all entries are loaded
     subtract_raw_offset: bool
         Whether to subtract the offset from the raw data
+    lazy: bool
+        Whether to return an IrradDataset which only reads data on access instead of reading all entries
 
     Returns
     -------
     tuple: (data, config)
     """
 
+    if lazy:
+        dataset = IrradDataset(data_file=data_file, config_file=config_file, subtract_raw_offset=subtract_raw_offset)
+        return dataset, dataset.config
+
     # Container for loaded irrad data
     irrad_data = {}
 
@@ -84,3 +369,31 @@ def load_irrad_data(data_file, config_file, specify_entries=None, subtract_raw_o
                         irrad_data[server_name]['Raw'][dname] -= irrad_data[server_name]['RawOffset'][-1][dname]
 
     return irrad_data, irrad_config
+
+
+def window_hist(deltas, start=None, stop=None):
+    """
+    Function that reconstructs a histogram of a time window from the increments stored during an irradiation,
+    e.g. data[server_name]['Histogram']['BeamPosition']['deltas'] as loaded by load_irrad_data
+
+    Parameters
+    ----------
+    deltas: numpy.ndarray
+        Structured array of increments with fields 'timestamp', marking the end of each interval, and 'hist'
+    start: float, None
+        Timestamp of the start of the window. If None, the window starts with the irradiation
+    stop: float, None
+        Timestamp of the end of the window. If None, the window ends with the irradiation
+
+    Returns
+    -------
+    numpy.ndarray: histogram of the entries in the window, at the resolution of the stored intervals
+    """
+    mask = np.ones(shape=len(deltas), dtype=bool)
+
+    if start is not None:
+        mask &= deltas['timestamp'] > start
+    if stop is not None:
+        mask &= deltas['timestamp'] <= stop
+
+    return deltas['hist'][mask].sum(axis=0)
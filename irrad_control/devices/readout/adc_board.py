@@ -1,4 +1,5 @@
 import logging
+from time import time
 from pipyadc import ADS1256
 from pipyadc import ADS1256_definitions as ADS1256_defs
 from pipyadc import ADS1256_default_config as ADS1256_conf
@@ -84,5 +85,34 @@ class ADCBoard(object):
 
         return result
 
+    def read_channels_block(self, out):
+        """
+        Reads a block of samples of all channels into a preallocated array
+
+        Parameters
+        ----------
+        out : numpy.ndarray
+            Array of shape (n_samples, 1 + n_channels); column 0 is filled with the timestamp of each sample,
+            the other columns with the voltages of the channels in the order of *setup_channels*
+
+        Returns
+        -------
+        numpy.ndarray
+            *out*
+        """
+        if self._adc_channels:
+
+            for i in range(out.shape[0]):
+                out[i, 0] = time()
+                out[i, 1:] = self.adc.read_sequence(self._adc_channels)
+
+            # Convert digits to voltages for the entire block at once
+            out[:, 1:] *= self.adc.v_per_digit
+
+        else:
+            logging.warning("No input channels to read from are setup. Use 'setup_channels' method")
+
+        return out
+
     def shutdown(self):
         self.adc.stop()
\ No newline at end of file
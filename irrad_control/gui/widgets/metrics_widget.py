@@ -0,0 +1,56 @@
+from PyQt5 import QtWidgets, QtCore
+
+
+class MetricsWidget(QtWidgets.QWidget):
+    """
+    Widget displaying the latest metrics published by the DAQ processes: durations of the stages of the hot paths,
+    counters and peak values of gauges within the latest metrics interval, see irrad_control.utils.metrics
+    """
+
+    headers = ('Process', 'Metric', 'Count', 'Mean / ms', 'p50 / ms', 'p99 / ms', 'Max / ms')
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+
+        self.setLayout(QtWidgets.QVBoxLayout())
+
+        self.table = QtWidgets.QTableWidget()
+        self.table.setColumnCount(len(self.headers))
+        self.table.setHorizontalHeaderLabels(self.headers)
+        self.table.verticalHeader().setVisible(False)
+        self.table.horizontalHeader().setSectionResizeMode(QtWidgets.QHeaderView.Stretch)
+        self.table.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+
+        self.layout().addWidget(self.table)
+
+        # Row of each process and metric
+        self._rows = {}
+
+    def _set_row(self, process, metric, values):
+
+        if (process, metric) not in self._rows:
+            self._rows[(process, metric)] = self.table.rowCount()
+            self.table.insertRow(self.table.rowCount())
+
+        for col, val in enumerate((process, metric) + tuple(values)):
+            item = QtWidgets.QTableWidgetItem(val)
+            item.setTextAlignment(QtCore.Qt.AlignCenter)
+            self.table.setItem(self._rows[(process, metric)], col, item)
+
+    def update_metrics(self, process, metrics):
+        """
+        Display the *metrics* snapshot of *process*, see irrad_control.utils.metrics.Metrics.snapshot
+
+        Parameters
+        ----------
+        process : str
+            Name of the process which published the metrics
+        metrics : dict
+            Snapshot of the metrics
+        """
+
+        for stage, timing in metrics['timings'].items():
+            self._set_row(process, stage, [str(timing['count'])] + [format(timing[q] * 1e3, '.3f') for q in ('mean', 'p50', 'p99', 'max')])
+
+        for name, value in list(metrics['counters'].items()) + list(metrics['gauges'].items()):
+            self._set_row(process, name, [str(value)] + ['-'] * 4)
@@ -8,6 +8,7 @@ from collections import defaultdict
 # Package imports
 import irrad_control.devices.readout as ro
 from irrad_control.utils.logger import log_levels
+from irrad_control.utils.serializer import CODECS
 from irrad_control.utils.worker import QtWorker
 from irrad_control.gui.utils import check_unique_input, fill_combobox_items, remove_widget, get_host_ip
 from irrad_control.devices import DEVICES_CONFIG
@@ -169,7 +170,85 @@ class SessionSetup(BaseSetupWidget):
         # Add to layout
         self.add_widget(widget=[label_logging, combo_logging])
 
+        # Label and combobox to set the encoding of data streams
+        label_serializer = QtWidgets.QLabel('Data encoding:')
+        label_serializer.setToolTip('Encoding of data and events sent between processes. Binary encoding needs less CPU and bandwidth')
+        combo_serializer = NoWheelQComboBox()
+        combo_serializer.addItems(list(CODECS))
+        combo_serializer.setCurrentIndex(combo_serializer.findText('msgpack' if 'msgpack' in CODECS else 'json'))
+
+        # Add to layout
+        self.add_widget(widget=[label_serializer, combo_serializer])
+
+        # Label and widgets to set the compression of the output file
+        label_compression = QtWidgets.QLabel('Compression:')
+        label_compression.setToolTip('Compression library and level of the output file. Compressed files are smaller and faster to read')
+        combo_compression = NoWheelQComboBox()
+        combo_compression.addItems(['none', 'blosc:lz4', 'blosc:zstd', 'zlib'])
+        combo_compression.setCurrentIndex(combo_compression.findText('blosc:lz4'))
+        spx_complevel = QtWidgets.QSpinBox()
+        spx_complevel.setRange(1, 9)
+        spx_complevel.setValue(5)
+        spx_complevel.setPrefix('Level ')
+        combo_compression.currentTextChanged.connect(lambda t: spx_complevel.setEnabled(t != 'none'))
+
+        # Add to layout
+        self.add_widget(widget=[label_compression, combo_compression, spx_complevel])
+
+        # Label and spinbox for the planned duration which optimizes the layout of the output file
+        label_duration = QtWidgets.QLabel('Planned duration:')
+        label_duration.setToolTip('Planned duration of the irradiation from which the size of the output tables is estimated')
+        spx_duration = QtWidgets.QDoubleSpinBox()
+        spx_duration.setRange(0.1, 24 * 14)
+        spx_duration.setValue(24)
+        spx_duration.setSuffix(' h')
+
+        # Add to layout
+        self.add_widget(widget=[label_duration, spx_duration])
+
+        # Label and spinbox for the interval after which the output is continued in a new segment file
+        label_segments = QtWidgets.QLabel('Output segments:')
+        label_segments.setToolTip('Write the output in segment files which are synced to disk and consolidated on shutdown. '
+                                  'After a crash, only data of the current segment is lost')
+        spx_segments = QtWidgets.QSpinBox()
+        spx_segments.setRange(0, 24 * 60)
+        spx_segments.setValue(0)
+        spx_segments.setSpecialValueText('off')
+        spx_segments.setPrefix('every ')
+        spx_segments.setSuffix(' min')
+
+        # Add to layout
+        self.add_widget(widget=[label_segments, spx_segments])
+
+        # Label and spinbox for the interval after which the increments of the histograms are stored
+        label_hist = QtWidgets.QLabel('Histogram increments:')
+        label_hist.setToolTip('Store the increments of the beam position and SEE histograms per interval, '
+                              'from which the histograms of any time window can be reconstructed')
+        spx_hist = QtWidgets.QSpinBox()
+        spx_hist.setRange(0, 3600)
+        spx_hist.setValue(60)
+        spx_hist.setSpecialValueText('off')
+        spx_hist.setPrefix('every ')
+        spx_hist.setSuffix(' s')
+
+        # Add to layout
+        self.add_widget(widget=[label_hist, spx_hist])
+
+        # Checkbox to interpret the data of each server in its own process
+        checkbox_sharded = QtWidgets.QCheckBox('Interpret each server in its own process')
+        checkbox_sharded.setToolTip('Distributes data interpretation of multiple servers on multiple CPU cores. Data is still written to one output file')
+
+        # Add to layout
+        self.add_widget(widget=checkbox_sharded)
+
         self.widgets['logging_combo'] = combo_logging
+        self.widgets['serializer_combo'] = combo_serializer
+        self.widgets['sharded_checkbox'] = checkbox_sharded
+        self.widgets['compression_combo'] = combo_compression
+        self.widgets['complevel_spx'] = spx_complevel
+        self.widgets['duration_spx'] = spx_duration
+        self.widgets['segments_spx'] = spx_segments
+        self.widgets['hist_spx'] = spx_hist
         self.widgets['folder_edit'] = edit_folder
         self.widgets['outfile_edit'] = edit_out_file
 
@@ -185,6 +264,13 @@ class SessionSetup(BaseSetupWidget):
 
     def setup(self):
         return {'loglevel': self.widgets['logging_combo'].currentText(),
+                'serializer': self.widgets['serializer_combo'].currentText(),
+                'sharded': self.widgets['sharded_checkbox'].isChecked(),
+                'storage': {'complib': None if self.widgets['compression_combo'].currentText() == 'none' else self.widgets['compression_combo'].currentText(),
+                            'complevel': self.widgets['complevel_spx'].value(),
+                            'duration': self.widgets['duration_spx'].value(),
+                            'segment_interval': self.widgets['segments_spx'].value() or None,
+                            'hist_interval': self.widgets['hist_spx'].value() or None},
                 'outfolder': self.widgets['folder_edit'].text(),
                 'outfile': os.path.join(self.widgets['folder_edit'].text(),
                                         self.widgets['outfile_edit'].text() or self.widgets['outfile_edit'].placeholderText())
@@ -819,6 +905,17 @@ class ReadoutDeviceSetup(BaseSetupWidget):
         # Add to layout
         self.add_widget(widget=[label_sps, combo_srate])
 
+        # Block acquisition related widgets
+        label_block = QtWidgets.QLabel('Samples per block:')
+        label_block.setToolTip("Number of samples per channel which are acquired and sent at once. Needed for high sampling rates; 1 sends every sample individually")
+        spx_block = QtWidgets.QSpinBox()
+        spx_block.setRange(1, 1000)
+        spx_block.setValue(1)
+        self.widgets['block_spx'] = spx_block
+
+        # Add to layout
+        self.add_widget(widget=[label_block, spx_block])
+
         # R/O full-scale
         label_scale_str = 'R/O {} scale I_FS:'.format(self.device.split('_')[-1])
         label_scale = QtWidgets.QLabel(label_scale_str)
@@ -1017,6 +1114,7 @@ class ReadoutDeviceSetup(BaseSetupWidget):
 
         readout['device'] = self.device
         readout['sampling_rate'] = float(self.widgets['srate_combo'].currentText())
+        readout['block_size'] = self.widgets['block_spx'].value()
         readout['channels'] = [e.text() for e in self.widgets['channel_edits'] if e.text()]
         readout['types'] = [c.currentText() for i, c in enumerate(self.widgets['type_combos']) if self.widgets['channel_edits'][i].text()]
         readout['ch_numbers'] = [i if self.widgets['ref_combos'][i].currentText() == 'GND'
@@ -15,12 +15,23 @@ def _load_irrad_control_process(proc):
         logging.error(f"'irrad_control --{proc}' not available: {e.msg}!")
 
 
-def _run_irrad_control_process(proc):
+def _run_irrad_control_process(proc, **run_kwargs):
     actual_proc = _load_irrad_control_process(proc=proc)
     if actual_proc is None:
         logging.error(f"'irrad_control --{proc}' not available!")
         return
-    actual_proc.run()
+    actual_proc.run(**run_kwargs)
+
+
+def _consolidate_segments(seg_dir):
+    from irrad_control.utils.segments import consolidate_segments
+    out_file = seg_dir.rstrip('/').rsplit('_segments', 1)[0] + '.h5'
+    try:
+        n_segments = consolidate_segments(seg_dir=seg_dir, out_file=out_file)
+    except ValueError as e:
+        logging.error(f"Consolidating segments failed: {e}")
+        return
+    logging.info(f"Consolidated {n_segments} segment(s) of {seg_dir} into {out_file}")
 
 
 def main():
@@ -36,17 +47,26 @@ def main():
     process_group.add_argument('--server', required=False, action='store_true')
     process_group.add_argument('--converter', required=False, action='store_true')
     process_group.add_argument('--version', required=False, action='store_true')  # Get irrad_control version
+
+    # Consolidate the segments of an output file, e.g. after the converter crashed
+    process_group.add_argument('--consolidate', required=False, metavar='SEGMENT_DIR')
+
+    # Run server or converter on an asyncio event loop instead of individual threads
+    process_parser.add_argument('--asyncio', required=False, action='store_true')
     
     # Actually parse the guy 
     parsed = vars(process_parser.parse_args(sys.argv[1:]))
 
     # Default is to launch the GUI
-    if all(not val for _, val in parsed.items()):
+    if all(not val for key, val in parsed.items() if key != 'asyncio'):
         parsed['gui'] = True
 
     if parsed['version']:
         print(f'irrad_control {irrad_control.__version__}')
 
+    elif parsed['consolidate']:
+        _consolidate_segments(seg_dir=parsed['consolidate'])
+
     elif parsed['gui']:
         _run_irrad_control_process(proc='gui')
     
@@ -54,10 +74,10 @@ def main():
         _run_irrad_control_process(proc='monitor')
 
     elif parsed['converter']:
-        _run_irrad_control_process(proc='converter')
+        _run_irrad_control_process(proc='converter', asynchronous=parsed['asyncio'])
 
     elif parsed['server']:
-        _run_irrad_control_process(proc='server')
+        _run_irrad_control_process(proc='server', asynchronous=parsed['asyncio'])
 
 
 if __name__ == '__main__':
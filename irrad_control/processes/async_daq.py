@@ -0,0 +1,257 @@
+import zmq
+import zmq.asyncio
+import asyncio
+import logging
+from time import perf_counter
+from concurrent.futures import ThreadPoolExecutor
+from irrad_control.processes.daq import DAQProcess
+
+
+class AsyncDAQProcess(DAQProcess):
+    """
+    Variant of DAQProcess in which receiving commands, data and events as well as data acquisition run as coroutines
+    on a single asyncio event loop instead of individual threads. Blocking device reads are offloaded to an executor.
+    Forwarding of internal data to the data publisher still runs in a thread, in which the ZMQ proxy releases the GIL.
+    Subclasses implement the same *handle_cmd*, *handle_data* and *handle_event* methods as for DAQProcess.
+    """
+
+    def __init__(self, *args, **kwargs):
+
+        # Call init of super class
+        super(AsyncDAQProcess, self).__init__(*args, **kwargs)
+
+        # Attributes which are set once the event loop runs, see *_run_loop*
+        self._loop = None
+        self._loop_stop = None
+        self._tasks = []
+
+        # Executor to which blocking data acquisition calls are offloaded
+        self._executor = None
+
+    def _setup_zmq(self):
+        """ Setup the zmq context instance and allocate needed sockets """
+
+        super(AsyncDAQProcess, self)._setup_zmq()
+
+        # Asyncio context sharing the sockets of the regular context
+        self._async_context = zmq.asyncio.Context.shadow(self.context)
+
+        # Commands are awaited in the event loop; replies are sent in the same thread via the same socket
+        self.sockets['cmd'] = zmq.asyncio.Socket.from_socket(self.sockets['cmd'])
+
+    def launch_task(self, coro):
+        """Schedule the coroutine *coro* on the event loop and log exceptions once it is done"""
+
+        task = self._loop.create_task(coro)
+        task.add_done_callback(self._task_done)
+
+        # Add to instance tasks
+        self._tasks.append(task)
+
+    def _task_done(self, task):
+
+        self._tasks.remove(task)
+
+        if not task.cancelled() and task.exception() is not None:
+            logging.error("A {} exception occurred in task '{}': {}".format(type(task.exception()).__name__,
+                                                                          task.get_coro().__qualname__,
+                                                                          repr(task.exception())))
+
+    def _launch_threads(self):
+        """Launch this instances tasks and threads. Must be called within the event loop"""
+
+        # Start data sending thread
+        self.launch_thread(target=self.send_data)
+
+        # Start metrics publishing thread
+        self.launch_thread(target=self.send_metrics)
+
+        # Start command receiver task
+        self.launch_task(self._recv_cmd())
+
+        # If there is data
+        if len(self.daq_streams) > 0:
+            self.recv_data()
+
+        # If there are events
+        if len(self.event_streams) > 0:
+            self.recv_event()
+
+    async def _recv_cmd(self):
+        """Receive commands at self.sockets['cmd'] and handle them sequentially"""
+
+        while not self.stop_flags['__recv__'].is_set():
+
+            cmd_dict = await self.sockets['cmd'].recv_json()
+
+            logging.debug("Receiving command")
+
+            self._handle_cmd_dict(cmd_dict=cmd_dict)
+
+    def _recv_from_stream(self, kind, stream, callback, pub_results=False, max_batch_size=None):
+        """
+        Method which receives data from specific streams in a task on the event loop and calls a callback as well
+        as publishes results internally, see DAQProcess._recv_from_stream
+        """
+
+        if stream:
+
+            logging.info(f'Start receiving {kind}')
+
+            external_sub = self._async_context.socket(zmq.SUB)
+
+            for s in stream:
+                external_sub.connect(s)
+
+            external_sub.setsockopt(zmq.SUBSCRIBE, b'')  # specify bytes for Py3
+
+            internal_pub = self.create_internal_data_pub() if pub_results else None
+
+            self.launch_task(self._recv_stream(kind=kind,
+                                               external_sub=external_sub,
+                                               internal_pub=internal_pub,
+                                               callback=callback,
+                                               max_batch_size=max_batch_size))
+
+        else:
+            logging.error("No streams to connect to. Add streams via '_add_stream'-method")
+
+    async def _recv_stream(self, kind, external_sub, internal_pub, callback, max_batch_size=None):
+
+        try:
+
+            while not self.stop_flags['__recv__'].is_set():
+
+                frames = await external_sub.recv_multipart(copy=False)
+
+                # A single bad message must not stop receiving
+                try:
+
+                    start = perf_counter()
+
+                    # Get data
+                    data = self.serializer.loads_frames(frames)
+
+                    # Drain packets which already queued up, without waiting for new ones
+                    if max_batch_size is not None:
+                        data = [data]
+                        while len(data) < max_batch_size and external_sub.getsockopt(zmq.EVENTS) & zmq.POLLIN:
+                            data.append(self.serializer.loads_frames(await external_sub.recv_multipart(copy=False)))
+
+                    decoded = perf_counter()
+
+                    # Callback for data
+                    result = callback(data)
+
+                    handled = perf_counter()
+
+                    # Publish data
+                    if internal_pub is not None:
+                        for res in result:
+                            self.send_internal(internal_pub, [self.serializer.dumps(res)])
+
+                    self._record_recv_metrics(kind=kind, data=data, batched=max_batch_size is not None, timestamps=(start, decoded, handled, perf_counter()))
+
+                except Exception:
+                    logging.exception(f"Handling {kind} failed")
+
+        finally:
+            external_sub.close()
+            if internal_pub is not None:
+                internal_pub.close()
+
+    def _add_loop_socket(self, sock, handler):
+        """Call *handler* in a task on the event loop each time the regular socket *sock* is readable, see DAQProcess._add_loop_socket"""
+        self.launch_task(self._handle_socket(sock=sock, handler=handler))
+
+    async def _handle_socket(self, sock, handler):
+
+        # Shadow of *sock* which allows to await it becoming readable
+        async_sock = zmq.asyncio.Socket.from_socket(sock)
+
+        while not self.stop_flags['__recv__'].is_set():
+
+            await async_sock.poll(flags=zmq.POLLIN)
+
+            while sock.getsockopt(zmq.EVENTS) & zmq.POLLIN:
+                self._call_loop_handler(handler)
+
+    def launch_daq(self, daq_func):
+        """Launch data acquisition which repeatedly calls *daq_func* in the executor, see *_daq*"""
+        self.launch_task(self._daq(daq_func=daq_func))
+
+    async def _daq(self, daq_func):
+        """
+        Does data acquisition by awaiting the blocking *daq_func* in the executor and putting the results into the
+        outgoing queue
+        """
+
+        internal_data_pub = self.create_internal_data_pub()
+
+        try:
+
+            # Acquire data if not stop signal is set
+            while not self.stop_flags['__send__'].is_set():
+
+                meta, data = await self._loop.run_in_executor(self._executor, daq_func)
+
+                start = perf_counter()
+
+                # Put data into outgoing queue
+                self.send_internal(internal_data_pub, [self.serializer.dumps({'meta': meta, 'data': data})])
+
+                self.metrics.record('daq_publish', perf_counter() - start)
+
+        finally:
+            internal_data_pub.close()
+
+    async def _watch(self):
+        """Check the remaining threads once per second"""
+        while not self.stop_flags['__watch__'].is_set():
+            await asyncio.sleep(1.0)
+            self._check_threads()
+
+    def shutdown(self, signum=None, frame=None):
+
+        super(AsyncDAQProcess, self).shutdown(signum=signum, frame=frame)
+
+        # Stop the event loop; may be called from a signal handler or another thread
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop_stop.set)
+
+    async def _run_loop(self):
+
+        self._loop = asyncio.get_running_loop()
+        self._loop_stop = asyncio.Event()
+        self._executor = ThreadPoolExecutor(thread_name_prefix=self.pname)
+
+        # Launch tasks and threads of the process
+        self._launch_threads()
+
+        self.launch_task(self._watch())
+
+        # BLOCKING until shutdown
+        await self._loop_stop.wait()
+
+        # Cancel remaining tasks, e.g. waiting for incoming data
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+        for sock in self._stream_sockets:
+            sock.close()
+
+        # Blocking device reads which are in progress return on their own
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def run(self):
+        """ Main process function"""
+
+        # Setup everything
+        self._setup()
+
+        # Run the event loop of the process; BLOCKING
+        asyncio.run(self._run_loop())
+
+        # Close everything
+        self._close()
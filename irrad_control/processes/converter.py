@@ -1,9 +1,14 @@
+import os
+import zmq
+import math
+import shutil
 import logging
 import numpy as np
 import tables as tb
-from time import time
+from time import time, perf_counter
+from zmq.log import handlers
 from threading import Event
-from collections import defaultdict
+from collections import defaultdict, deque
 from uncertainties import ufloat, unumpy
 
 # Package imports
@@ -11,9 +16,77 @@ import irrad_control.analysis as analysis
 from irrad_control.devices import DEVICES_CONFIG
 import irrad_control.devices.readout as ro
 from irrad_control.processes.daq import DAQProcess
+from irrad_control.processes.async_daq import AsyncDAQProcess
 from irrad_control.ions import get_ions
 from irrad_control.utils.events import create_irrad_events
 from irrad_control.utils.utils import duration_str_from_secs
+from irrad_control.utils.ring_buffer import RingBuffer
+from irrad_control.utils.running_stats import SlidingWindowStats
+from irrad_control.utils.serializer import Serializer
+from irrad_control.utils.table_buffer import TableBuffer, TableWriter
+import irrad_control.utils.segments as segments
+
+
+class ReadoutPlan(object):
+    """
+    Lookup of a server's readout setup which is compiled once, instead of searching the readout setup on every sample.
+    Holds channel indices, full-scale currents and channel-role masks. Whenever the readout setup changes, e.g. a
+    full-scale current, a new plan has to be created.
+
+    Parameters
+    ----------
+    readout_setup : dict
+        Readout setup of a server as in server_setup['readout']
+    """
+
+    full_scale_voltage = 5.0
+
+    def __init__(self, readout_setup):
+
+        self.channels = list(readout_setup['channels'])
+        self.types = list(readout_setup['types'])
+        self.n_channels = len(self.channels)
+
+        # Index of each channel
+        self.ch_idx = {ch: i for i, ch in enumerate(self.channels)}
+
+        # Index and name of the first channel of each readout type
+        self.type_idx = {rt: self.types.index(rt) for rt in ro.RO_TYPES if rt in self.types}
+        self.type_ch = {rt: self.channels[idx] for rt, idx in self.type_idx.items()}
+
+        # SEM foils present
+        self.sem_foils = [rt for rt in self.type_idx if 'sem' in rt and 'sum' not in rt]
+        self.n_foils = len(self.sem_foils)
+        self.sem_h = all(rt in self.type_idx for rt in ('sem_left', 'sem_right'))
+        self.sem_v = all(rt in self.type_idx for rt in ('sem_up', 'sem_down'))
+
+        # Full-scale current of each readout type and of each channel in A
+        self.type_ifs = {rt: self._get_full_scale_current(readout_setup=readout_setup, ch_idx=idx) for rt, idx in self.type_idx.items()}
+        self.ifs = np.array([self.type_ifs[rt] for rt in self.types], dtype=np.float64)
+
+        # Channel roles; all channels except NTCs have an offset and carry a current
+        self.offset_mask = np.array([rt != 'ntc' for rt in self.types], dtype=bool)
+        self.offset_idx = np.flatnonzero(self.offset_mask)
+        self.offset_channels = [self.channels[idx] for idx in self.offset_idx]
+        self.sum_idx = self.type_idx.get('sem_sum', -1)
+
+        # Channel on which the NTC voltages of the DAQBoard are cycled
+        self.ntc_group_idx = readout_setup['ch_groups'].index('ntc') if 'ntc' in readout_setup else None
+
+        # Raw data can be interpreted in batches if beam current and positions can be derived
+        self.batchable = 'sem_sum' in self.type_idx and self.sem_h and self.sem_v
+
+    @staticmethod
+    def _get_full_scale_current(readout_setup, ch_idx):
+        """Get a channels full scale current wrt the readout device"""
+
+        if readout_setup['device'] == ro.RO_DEVICES.DAQBoard:
+            ch_group = readout_setup['ch_groups'][ch_idx]
+            i_full_scale = readout_setup['ro_group_scales'][ch_group]
+        else:
+            i_full_scale = readout_setup['ro_scales'][ch_idx]
+
+        return i_full_scale * analysis.constants.nano  # nA
 
 
 class IrradConverter(DAQProcess):
@@ -27,11 +100,31 @@ class IrradConverter(DAQProcess):
         # Attributes controlling converter behaviour
         self._data_flush_interval = 1.0
         self._last_data_flush = None
+        self._write_buffer_size = 4096  # Rows per table which are appended at once; set via setup['session']['write_buffer_size']
+        self._writer = None  # Writes to output file in a dedicated thread if setup['session']['writer_thread']
+        self._filters = None  # Compression of output tables; set via setup['session']['storage'], see *_setup_storage*
+        self._table_history = {'Scan': 10000}  # Number of latest rows kept per table which is read back, see *_interpret_scan_data*
+        self._segment_interval = None  # Minutes after which the output is continued in a new segment; set via setup['session']['storage']
+        self._segment = None  # Number and start time of the current segment
+        self._hist_snapshots = {}  # Latest histograms of the workers in sharded mode
+        self._hist_interval = 60  # Seconds after which the increments of the histograms are stored; set via setup['session']['storage']
+        self._last_hist_delta = None
+        self._hist_baselines = defaultdict(dict)  # Histograms at the time of the latest stored increments
         self._n_offset_samples = 100
         self._beam_correction_threshold = 0.02
-        self._shifted_beam_array_length = 10000  # Allow to cover for very slow scans ~O(1000s) at default rate
-        self._beam_unstable_time_window = 10  # Check the last 10 seconds of beam for stability
-        self._beam_unstable_std_ratio = 5e-2  # Consider beam unstable once it fluctuates by 5% around its mean or the std is 5% of the I_FS
+        self._beam_history_length = 10000  # Allow to cover for very slow scans ~O(1000s) at default rate; set via setup['session']['beam_history_length']
+        # Parameters of events evaluated on sliding windows of beam data; overwrite per event via setup['session']['events']
+        # BeamJitter: check the last 10 seconds of beam; unstable once it fluctuates by 5% around its mean or the std is 5% of the I_FS
+        self._event_params = {'BeamJitter': {'window': 10, 'std_ratio': 5e-2}}
+        self._max_batch_size = 100  # Interpret up to 100 queued raw data packets at once; 1 disables batch interpretation
+        self._worker_timeout = 30  # Seconds to wait for workers to start up and shut down in sharded mode
+        self._worker_reply_timeout = 2  # Seconds to wait for a worker to confirm a command; below the command timeout of the GUI
+
+        # Sharded mode, see *_start_workers*: worker process and command socket per server and socket receiving storage rows
+        self._workers = {}
+        self._worker_cmds = {}
+        self._storage_pull = None
+        self._worker_metrics = deque()  # Metrics of the workers, published along the own metrics, see *_publish_metrics*
 
         self.dtypes = analysis.dtype.IrradDtypes()
         self.hists = analysis.dtype.IrradHists()
@@ -43,10 +136,28 @@ class IrradConverter(DAQProcess):
         # Call init of super class
         super(IrradConverter, self).__init__(name=name)
 
+    def _open_output_file(self):
+        """Open only one output file and organize its data in groups; in segmented mode, open the first segment"""
+
+        if self._segment_interval:
+            seg_dir = segments.segment_dir(self.setup['session']['outfile'])
+            os.makedirs(seg_dir, exist_ok=True)
+            self._segment = (0, time())
+            logging.info(f"Writing output in segments of {self._segment_interval} min to {seg_dir}")
+            return tb.open_file(segments.segment_path(seg_dir, 0), 'w')
+
+        return tb.open_file(self.setup['session']['outfile'] + '.h5', 'w')
+
     def _setup_daq(self):
 
-        # Open only one output file and organize its data in groups
-        self.output_table = tb.open_file(self.setup['session']['outfile'] + '.h5', 'w')
+        self._setup_storage()
+
+        self.output_table = self._open_output_file()
+
+        # Rows are buffered and appended in chunks, optionally in a dedicated thread
+        self._write_buffer_size = self.setup['session'].get('write_buffer_size', self._write_buffer_size)
+        if self.setup['session'].get('writer_thread', False):
+            self._writer = TableWriter()
 
         # General setup; servers
         self.server = list(self.setup['server'].keys())
@@ -72,17 +183,22 @@ class IrradConverter(DAQProcess):
 
         # Create various containers
         self._ntc_temps = defaultdict(dict)
-        self._lookups = defaultdict(dict)
+        self._readout_plans = {}
         self._raw_offsets = {}
         self._row_fluence_hist = {}
         self._dtimes = defaultdict(dict)
         self._daq_params = defaultdict(dict)
 
-        # Beam current over time array
-        self._beam_currents = defaultdict(lambda: np.zeros(shape=self._shifted_beam_array_length,
-                                                                   dtype=self.dtypes.generic_dtype(names=['timestamp', 'beam', 'beam_err'],
-                                                                                                   dtypes=['<f8', '<f4', '<f4'])))
-        self._beam_idxs = defaultdict(lambda: 0)
+        # Beam current over time
+        self._beam_history_length = self.setup['session'].get('beam_history_length', self._beam_history_length)
+        self._beam_currents = defaultdict(lambda: RingBuffer(size=self._beam_history_length,
+                                                             dtype=self.dtypes.generic_dtype(names=['timestamp', 'beam', 'beam_err'],
+                                                                                             dtypes=['<f8', '<f4', '<f4'])))
+
+        # Event parameters and running beam statistics for these events
+        for event, params in self.setup['session'].get('events', {}).items():
+            self._event_params.setdefault(event, {}).update(params)
+        self._beam_jitter_stats = defaultdict(lambda: SlidingWindowStats(window=self._event_params['BeamJitter']['window']))
 
         # R/O setup per server
         self.readout_setup = {}
@@ -97,7 +213,7 @@ class IrradConverter(DAQProcess):
         else:
             return hist_name.capitalize()
 
-    def _create_data_entry(self, server, dname, location):
+    def _create_data_entry(self, server, dname, location, rate=None):
 
         try:
             dtype = self.dtypes[dname]
@@ -106,15 +222,79 @@ class IrradConverter(DAQProcess):
             dtype = self.dtypes.generic_dtype(names=names, dtypes=['<f8']+['<f4']*(len(names)-1))
 
         # Create and store tables
-        self.data_tables[server][dname] = self.output_table.create_table(location,
-                                                                         description=dtype,
-                                                                         name=dname.capitalize())
+        self.data_tables[server][dname] = self._create_table(location,
+                                                             description=dtype,
+                                                             name=dname.capitalize(),
+                                                             rate=rate)
         # Create arrays
         self.data_arrays[server][dname] = np.zeros(shape=1, dtype=dtype)
 
         # Create data flags
         self.data_flags[server][dname] = False
 
+    def _setup_storage(self):
+        """
+        Setup the compression filters of the output tables from setup['session']['storage'], which may contain:
+
+            'complib': compression library e.g. 'blosc:lz4', 'blosc:zstd' or 'zlib'; None for no compression
+            'complevel': compression level from 0 to 9
+            'duration': planned duration of the irradiation in hours from which the expected rows are estimated
+            'tables': dict of keyword arguments of tables.File.create_table per table name e.g. {'Raw': {'chunkshape': 8192}}
+            'segment_interval': minutes after which the output is continued in a new segment file; None for one file
+            'hist_interval': seconds after which the increments of the histograms are stored; None to only store the final histograms
+
+        In segmented mode, each segment is a complete output file which is synced to disk once closed. A crash only
+        affects the current segment. On shutdown, the segments are consolidated into one output file.
+        """
+
+        storage_setup = self.setup['session'].get('storage', {})
+
+        self._segment_interval = storage_setup.get('segment_interval')
+
+        self._hist_interval = storage_setup.get('hist_interval', self._hist_interval)
+        self._last_hist_delta = time()
+
+        self._filters = None
+
+        if storage_setup.get('complib') and storage_setup.get('complevel', 0) > 0:
+            try:
+                self._filters = tb.Filters(complib=storage_setup['complib'], complevel=storage_setup['complevel'], shuffle=True)
+            except ValueError as e:
+                logging.warning(f"Output data is not compressed: {e}")
+
+    def _create_table(self, where, description, name, rate=None, size=None):
+        """
+        Create a table in the output file to which rows are appended via a TableBuffer
+
+        Parameters
+        ----------
+        where : str
+            Location of the table
+        description : numpy.dtype
+            Description of the table
+        name : str
+            Name of the table
+        rate : float, optional
+            Expected number of rows per second, used to estimate the expected number of rows, by default None
+        size : int, optional
+            Number of rows which are buffered before appending, by default None which is self._write_buffer_size
+        """
+
+        storage_setup = self.setup['session'].get('storage', {})
+
+        table_kwargs = {'filters': self._filters}
+
+        # Chunk shape is optimized for the expected size of the table
+        if rate and storage_setup.get('duration'):
+            table_kwargs['expectedrows'] = int(rate * storage_setup['duration'] * 3600)
+
+        table_kwargs.update(storage_setup.get('tables', {}).get(name, {}))
+
+        return TableBuffer(table=self.output_table.create_table(where, description=description, name=name, **table_kwargs),
+                           size=size or self._write_buffer_size,
+                           writer=self._writer,
+                           history=self._table_history.get(name))
+
     def _add_server_data(self, server, server_setup):
         """Adds a group to the ouptut table for respective server"""
 
@@ -134,28 +314,20 @@ class IrradConverter(DAQProcess):
             if 'ntc' in server_setup['readout']:
                 has_ntc_daq_board_ro = True
 
-            # Fill lookup dicts
-            self._lookups[server]['ro_type_idx'] = {rt: server_setup['readout']['types'].index(rt) for rt in ro.RO_TYPES
-                                                    if rt in server_setup['readout']['types']}
-
-            self._lookups[server]['sem_foils'] = [ch for ch in self._lookups[server]['ro_type_idx'] if 'sem' in ch and 'sum' not in ch]
-            self._lookups[server]['sem_h'] = all(x in self._lookups[server]['ro_type_idx'] for x in ('sem_left', 'sem_right'))
-            self._lookups[server]['sem_v'] = all(x in self._lookups[server]['ro_type_idx'] for x in ('sem_up', 'sem_down'))
-            self._lookups[server]['offset_ch'] = set([ch for ch in self._lookups[server]['ro_type_idx'] if 'ntc' not in ch])
-            self._lookups[server]['full_scale_voltage'] = 5.0
-
-            # Full scale currents
-            self._lookups[server]['full_scale_current'] = {}
-            self._update_ifs_values(server=server)
+            # Compile lookups of the readout setup
+            self._readout_plans[server] = ReadoutPlan(readout_setup=self.readout_setup[server])
 
             self._raw_offsets[server] = defaultdict(list)
 
             # Internal variable to hold the row fluence histogram for each server
             self._row_fluence_hist[server] = None
 
-            # Create needed tables and arrays
+            # Create needed tables and arrays; raw, beam and SEE data are stored for every sample
             for dname in ('Raw', 'RawOffset', 'Beam', 'See', 'Damage', 'Scan', 'Irrad', 'Result'):
-                self._create_data_entry(server=server, dname=dname.lower(), location=f"/{server_setup['name']}")
+                self._create_data_entry(server=server,
+                                        dname=dname.lower(),
+                                        location=f"/{server_setup['name']}",
+                                        rate=server_setup['readout'].get('sampling_rate') if dname in ('Raw', 'Beam', 'See') else None)
 
             # Create histogram group and entries
             self.output_table.create_group('/{}'.format(server_setup['name']), 'Histogram')
@@ -177,6 +349,15 @@ class IrradConverter(DAQProcess):
                 self.output_table.create_array('/{}/Histogram/{}'.format(server_setup['name'], table_name), 'centers', centers)
                 self.output_table.create_array('/{}/Histogram/{}'.format(server_setup['name'], table_name), 'unit', np.array([self.hists[actual_hist_type]['unit']]))
 
+                # Table of the increments of the histogram per interval, see *_store_hist_deltas*
+                if self._hist_interval:
+                    self._hist_baselines[server][hist_name] = hist.copy()
+                    self.data_tables[server][f'{hist_name}_deltas'] = self._create_table('/{}/Histogram/{}'.format(server_setup['name'], table_name),
+                                                                                          description=np.dtype([('timestamp', '<f8'), ('hist', hist.dtype, hist.shape)]),
+                                                                                          name='deltas',
+                                                                                          rate=1. / self._hist_interval,
+                                                                                          size=1)
+
         # We have temperature data
         if has_ntc_daq_board_ro or 'ArduinoNTCReadout' in server_setup['devices']:
 
@@ -191,13 +372,10 @@ class IrradConverter(DAQProcess):
                 dname = 'temp_daq_board'
                 node_name = 'DAQBoard'
 
-                # Channel on which the NTC voltages are cycled
-                self._lookups[server]['ntc_group_idx'] = self.readout_setup[server]['ch_groups'].index('ntc')
-
                 # Create and store tables
-                self.data_tables[server][dname] = self.output_table.create_table('/{}/Temperature'.format(server_setup['name']),
-                                                                                 description=dtype,
-                                                                                 name=node_name)
+                self.data_tables[server][dname] = self._create_table('/{}/Temperature'.format(server_setup['name']),
+                                                                     description=dtype,
+                                                                     name=node_name)
                 # Create arrays
                 self.data_arrays[server][dname] = np.zeros(shape=1, dtype=dtype)
 
@@ -211,9 +389,9 @@ class IrradConverter(DAQProcess):
                 node_name = 'ArduinoNTCReadout'
 
                 # Create and store tables
-                self.data_tables[server][dname] = self.output_table.create_table('/{}/Temperature'.format(server_setup['name']),
-                                                                                 description=dtype,
-                                                                                 name=node_name)
+                self.data_tables[server][dname] = self._create_table('/{}/Temperature'.format(server_setup['name']),
+                                                                     description=dtype,
+                                                                     name=node_name)
                 # Create arrays
                 self.data_arrays[server][dname] = np.zeros(shape=1, dtype=dtype)
 
@@ -234,9 +412,9 @@ class IrradConverter(DAQProcess):
                 node_name = ms
 
                 # Create and store tables
-                self.data_tables[server][dname] = self.output_table.create_table('/{}/Motorstage'.format(server_setup['name']),
-                                                                                 description=dtype,
-                                                                                 name=node_name)
+                self.data_tables[server][dname] = self._create_table('/{}/Motorstage'.format(server_setup['name']),
+                                                                     description=dtype,
+                                                                     name=node_name)
                 # Create arrays
                 self.data_arrays[server][dname] = np.zeros(shape=1, dtype=dtype)
 
@@ -251,9 +429,9 @@ class IrradConverter(DAQProcess):
             node_name = 'RadMonitor'
 
             # Create and store tables
-            self.data_tables[server][dname] = self.output_table.create_table('/{}'.format(server_setup['name']),
-                                                                                description=dtype,
-                                                                                name=node_name)
+            self.data_tables[server][dname] = self._create_table('/{}'.format(server_setup['name']),
+                                                                    description=dtype,
+                                                                    name=node_name)
             # Create arrays
             self.data_arrays[server][dname] = np.zeros(shape=1, dtype=dtype)
 
@@ -269,13 +447,7 @@ class IrradConverter(DAQProcess):
         self._daq_params[server]['kappa'] = (np.nan, np.nan) if daq_setup['kappa'] is None else (daq_setup['kappa']['nominal'], daq_setup['kappa']['sigma'])
         self._daq_params[server]['lambda'] = (np.nan, np.nan) if daq_setup['lambda'] is None else (daq_setup['lambda']['nominal'], daq_setup['lambda']['sigma'])
 
-    def _update_ifs_values(self, server):
-        for ro_ch, ro_idx in self._lookups[server]['ro_type_idx'].items():
-            self._lookups[server]['full_scale_current'][ro_ch] = self._get_full_scale_current(server=server,
-                                                                                              ch_idx=ro_idx,
-                                                                                              ro_device=self.readout_setup[server]['device'])
-            
-    def _calc_drate(self, server, meta):
+    def _calc_drate(self, server, meta, n_samples=1):
 
         # Check if we have incoming data timing stored
         if meta['type'] not in self._dtimes[server]:
@@ -284,7 +456,7 @@ class IrradConverter(DAQProcess):
 
         # Calc data rate
         now = time()
-        drate = 1. / (now - self._dtimes[server][meta['type']])
+        drate = n_samples / (now - self._dtimes[server][meta['type']])
         self._dtimes[server][meta['type']] = now
 
         # Write data rate to meta
@@ -307,17 +479,6 @@ class IrradConverter(DAQProcess):
             self.data_arrays[server]['rawoffset']['timestamp'] = time()
             self.data_flags[server]['rawoffset'] = True
 
-    def _get_full_scale_current(self, server, ch_idx, ro_device):
-        """Get a channels full scale current wrt the readout device"""
-
-        if ro_device == ro.RO_DEVICES.DAQBoard:
-            ch_group = self.readout_setup[server]['ch_groups'][ch_idx]
-            i_full_scale = self.readout_setup[server]['ro_group_scales'][ch_group]
-        else:
-            i_full_scale = self.readout_setup[server]['ro_scales'][ch_idx]
-
-        return i_full_scale * analysis.constants.nano  # nA
-
     def _calc_mean_and_error(self, data):
 
         # Calculate mean and error on mean
@@ -370,26 +531,18 @@ class IrradConverter(DAQProcess):
 
         return hist_data
 
-    def _shift_beam_currents(self, server):
+    def _record_beam_current(self, server):
         """
         Function that keeps track of beam evolution
 
         Parameters
         ----------
-        server : _type_
-            _description_
+        server : str
+            ip of server
         """
-
-        # Roll array w/o full copy; data drops out on the right
-        tmp_array = self._beam_currents[server][:-1]
-        self._beam_currents[server][1:] = tmp_array
-
-        self._beam_currents[server][0]['timestamp'] = self.data_arrays[server]['beam']['timestamp']
-        self._beam_currents[server][0]['beam'] = self.data_arrays[server]['beam']['beam_current']
-        self._beam_currents[server][0]['beam_err'] = self.data_arrays[server]['beam']['beam_current_error']
-        
-        if self._beam_idxs[server] < self._shifted_beam_array_length - 1:
-            self._beam_idxs[server] += 1
+        beam = self.data_arrays[server]['beam'][0]
+        self._beam_currents[server].append((beam['timestamp'], beam['beam_current'], beam['beam_current_error']))
+        self._beam_jitter_stats[server].update(timestamp=beam['timestamp'], value=beam['beam_current'])
 
     def _check_beam_unstable(self, server):
 
@@ -397,31 +550,22 @@ class IrradConverter(DAQProcess):
         if self.irrad_events[server].BeamOff.value.is_valid():
             return False
 
-        # Look at beam currents which already have been filled
-        tmp_beam = self._beam_currents[server][:self._beam_idxs[server]]
+        # Statistics of the beam over the latest window, kept up-to-date with every beam sample
+        std_ratio = self._event_params['BeamJitter']['std_ratio']
+        beam_std = self._beam_jitter_stats[server].std
+        beam_mean = self._beam_jitter_stats[server].mean
 
-        # Look at latest beam data up to self._beam_unstable_time_window seconds in the past
-        latest_ts = tmp_beam['timestamp'][0]
-
-        # Get index of relevant data; searchsorted needs ASCENDING order, therefore negate argumenst
-        check_win_idx = np.searchsorted(-tmp_beam['timestamp'], -(latest_ts - self._beam_unstable_time_window))
-
-        relevant_beam_data = tmp_beam[:check_win_idx]
-
-        beam_std = np.nanstd(relevant_beam_data['beam'])
-        beam_mean = np.nanmean(relevant_beam_data['beam'])
-
-        if beam_std >= self._beam_unstable_std_ratio * self._lookups[server]['full_scale_current']['sem_sum']:
+        if beam_std >= std_ratio * self._readout_plans[server].type_ifs['sem_sum']:
             return True
         
-        if beam_std / beam_mean >= self._beam_unstable_std_ratio:
+        if beam_mean != 0 and beam_std / beam_mean >= std_ratio:
             return True
 
         return False
 
     def _extract_scan_currents(self, server):
         """
-        Returns a view of the beam currents during scanning a row by searching the self._beam_currents[server] array.
+        Returns a view of the beam currents during scanning a row by querying the self._beam_currents[server] buffer.
 
         Parameters
         ----------
@@ -429,8 +573,8 @@ class IrradConverter(DAQProcess):
             ip of server
         """
         # Get timestamps of start and stop of current scan
-        start_ts = self.data_arrays[server]['scan']['row_start_timestamp']
-        stop_ts = self.data_arrays[server]['scan']['row_stop_timestamp']
+        start_ts = self.data_arrays[server]['scan']['row_start_timestamp'][0]
+        stop_ts = self.data_arrays[server]['scan']['row_stop_timestamp'][0]
 
         # Due to a fault in the scan behaviour where the scan stage does not correctly stop at the target position but a step before/behind
         # there is a bug where the next start timestamp gets send before this statement is checked. We need to catch this because
@@ -440,19 +584,11 @@ class IrradConverter(DAQProcess):
             scan_secs = scan_mm / self.data_arrays[server]['scan']['row_scan_speed'][0] + 2 * self.data_arrays[server]['scan']['row_scan_speed'][0] / self.data_arrays[server]['scan']['row_scan_accel'][0]
             start_ts = stop_ts - scan_secs
 
-        # Look at beam currents which already have been filled
-        tmp_beam = self._beam_currents[server][:self._beam_idxs[server]]
-
-        # Get indices of corresponding slice of beam currents
-        # Need to negate the search elements since searchsorted expects ASCENDING order of sorted array
-        start_idx = np.searchsorted(-tmp_beam['timestamp'], -stop_ts)[0]
-        stop_idx = np.searchsorted(-tmp_beam['timestamp'], -start_ts)[0]
-
-        relevant_currents = tmp_beam[start_idx:stop_idx]
+        relevant_currents = self._beam_currents[server].window(t_start=start_ts, t_stop=stop_ts)
 
         # If the array is still empty, take the last 10 measurements before the stop ts
         if relevant_currents.size == 0:
-            relevant_currents = tmp_beam[start_idx:][:10]
+            relevant_currents = self._beam_currents[server].last_before(t_stop=stop_ts, n=10)
 
         return relevant_currents
     
@@ -499,6 +635,8 @@ class IrradConverter(DAQProcess):
         raw_data = {'meta': {'timestamp': meta['timestamp'], 'name': server, 'type': 'raw'},
                     'data': {'voltage': {}, 'current': {}}}
 
+        plan = self._readout_plans[server]
+
         # Get timestamp from data for beam and raw arrays
         self.data_arrays[server]['raw']['timestamp'] = meta['timestamp']
 
@@ -507,24 +645,23 @@ class IrradConverter(DAQProcess):
             # Fill raw data structured array first
             self.data_arrays[server]['raw'][ch] = data[ch]
 
-            ch_idx = self.readout_setup[server]['channels'].index(ch)
-            ch_type = self.readout_setup[server]['types'][ch_idx]
+            ch_idx = plan.ch_idx[ch]
 
             # Subtract offset from data; initially offset is 0 for all ch
-            if ch_type in self._lookups[server]['offset_ch']:
+            if plan.offset_mask[ch_idx]:
                 data[ch] -= self.data_arrays[server]['rawoffset'][ch][0]
 
                 raw_data['data']['current'][ch] = analysis.formulas.v_sig_to_i_sig(v_sig=data[ch],
-                                                                                   full_scale_current=self._lookups[server]['full_scale_current'][ch_type],
-                                                                                   full_scale_voltage=self._lookups[server]['full_scale_voltage'])
+                                                                                   full_scale_current=plan.type_ifs[plan.types[ch_idx]],
+                                                                                   full_scale_voltage=plan.full_scale_voltage)
 
-                if 'sem_sum' in self._lookups[server]['ro_type_idx'] and self._lookups[server]['ro_type_idx']['sem_sum'] == ch_idx:
-                    raw_data['data']['current'][ch] *= len(self._lookups[server]['sem_foils'])
+                if ch_idx == plan.sum_idx:
+                    raw_data['data']['current'][ch] *= plan.n_foils
 
                     # Use 'sem_sum' voltage signal to determine whether the beam is off: off if smalle 1% of full scale voltage
                     self._check_irrad_event(server=server,
                                             event_name='BeamOff',
-                                            trigger_condition=lambda: data[ch] < 0.01 * self._lookups[server]['full_scale_voltage'])
+                                            trigger_condition=lambda: data[ch] < 0.01 * plan.full_scale_voltage)
 
             raw_data['data']['voltage'][ch] = data[ch]
 
@@ -538,16 +675,17 @@ class IrradConverter(DAQProcess):
         beam_data = {'meta': {'timestamp': meta['timestamp'], 'name': server, 'type': 'beam'},
                      'data': {'position': {}, 'current': {}, 'see': {}}}
 
+        plan = self._readout_plans[server]
+
         # Get timestamp from data for beam data arrays
         self.data_arrays[server]['beam']['timestamp'] = self.data_arrays[server]['see']['timestamp'] = meta['timestamp']
 
         ### Beam current ###
 
         # dname: beam_current
-        if 'sem_sum' in self._lookups[server]['ro_type_idx']:
-            sum_idx = self._lookups[server]['ro_type_idx']['sem_sum']
-            sum_ifs = self._lookups[server]['full_scale_current']['sem_sum']
-            sig = data[self.readout_setup[server]['channels'][sum_idx]]
+        if 'sem_sum' in plan.type_idx:
+            sum_ifs = plan.type_ifs['sem_sum']
+            sig = data[plan.type_ch['sem_sum']]
 
             # Error on beam current measurement: Delta I_FS / I_FS = sqrt(3%) = 1.73%
             beam_current = analysis.formulas.calibrated_beam_current(beam_monitor_sig=sig,
@@ -561,20 +699,19 @@ class IrradConverter(DAQProcess):
             # dname: see_total
             see_per_surface = analysis.formulas.v_sig_to_i_sig(v_sig=sig,
                                                                full_scale_current=sum_ifs,
-                                                               full_scale_voltage=self._lookups[server]['full_scale_voltage'])
+                                                               full_scale_voltage=plan.full_scale_voltage)
             
             # Number of SEM foils is amount of surfaces e.g. 4 foils is horizontal and vertical SEM e.g. 2 times foil entry & exit == 4 surfaces
-            self.data_arrays[server]['see']['see_total'] = beam_data['data']['see']['see_total'] = see_per_surface * len(self._lookups[server]['sem_foils'])
+            self.data_arrays[server]['see']['see_total'] = beam_data['data']['see']['see_total'] = see_per_surface * plan.n_foils
 
             # Actual SEY can only be calculated from a FC measurement, parallel to the beam monitor SEE current
             # Check if beam is not off and check for FC measurement
-            if not self.irrad_events[server].BeamOff.value.is_valid() and 'cup' in self._lookups[server]['ro_type_idx']:
+            if not self.irrad_events[server].BeamOff.value.is_valid() and 'cup' in plan.type_idx:
                 # Calculate sum SE yield
                 # dname: sey
-                fc_channel = self.readout_setup[server]['channels'][self._lookups[server]['ro_type_idx']['cup']]
-                fc_current = analysis.formulas.v_sig_to_i_sig(v_sig=self.data_arrays[server]['raw'][fc_channel][0],
-                                                              full_scale_current=self._lookups[server]['full_scale_current']['cup'],
-                                                              full_scale_voltage=self._lookups[server]['full_scale_voltage'])
+                fc_current = analysis.formulas.v_sig_to_i_sig(v_sig=self.data_arrays[server]['raw'][plan.type_ch['cup']][0],
+                                                              full_scale_current=plan.type_ifs['cup'],
+                                                              full_scale_voltage=plan.full_scale_voltage)
                 # gamma = I_SEE / I_ion * q_ion
                 sey = see_per_surface / fc_current * self._daq_params[server]['ion'].n_charge * 100  # %
                 
@@ -584,12 +721,10 @@ class IrradConverter(DAQProcess):
             logging.warning("Beam current cannot be calculated from calibration due to calibration signal of type 'sem_sum' missing")
 
         # dname: beam_loss
-        if 'blm' in self._lookups[server]['ro_type_idx']:
-            blm_idx = self._lookups[server]['ro_type_idx']['blm']
-            blm_ifs = self._lookups[server]['full_scale_current']['blm']
-            blm_current = analysis.formulas.v_sig_to_i_sig(v_sig=data[self.readout_setup[server]['channels'][blm_idx]],
-                                                            full_scale_current=blm_ifs,
-                                                            full_scale_voltage=self._lookups[server]['full_scale_voltage'])
+        if 'blm' in plan.type_idx:
+            blm_current = analysis.formulas.v_sig_to_i_sig(v_sig=data[plan.type_ch['blm']],
+                                                            full_scale_current=plan.type_ifs['blm'],
+                                                            full_scale_voltage=plan.full_scale_voltage)
 
             # Only add beam loss to data if we have BLM data
             self.data_arrays[server]['beam']['beam_loss'] = beam_data['data']['current']['beam_loss'] = blm_current
@@ -629,19 +764,17 @@ class IrradConverter(DAQProcess):
             self.data_arrays[server]['beam']['beam_loss'] = np.nan
 
         # dname: reconstructed_beam_current
-        n_foils = len(self._lookups[server]['sem_foils'])
+        n_foils = plan.n_foils
         if n_foils not in (2, 4):
             logging.warning(f"Reconstructed beam current must be derived from 2 or 4 foils (currently {n_foils})")
 
         else:
 
             recon_beam_current = 0
-            for sem_ch in self._lookups[server]['sem_foils']:
-                sem_ch_idx = self._lookups[server]['ro_type_idx'][sem_ch]
-                sem_ch_ifs = self._lookups[server]['full_scale_current'][sem_ch]
-                recon_beam_current += analysis.formulas.calibrated_beam_current(beam_monitor_sig=data[self.readout_setup[server]['channels'][sem_ch_idx]],
+            for sem_ch in plan.sem_foils:
+                recon_beam_current += analysis.formulas.calibrated_beam_current(beam_monitor_sig=data[plan.type_ch[sem_ch]],
                                                                                 calibration_factor=self._daq_params[server]['lambda'][0],
-                                                                                full_scale_current=sem_ch_ifs)
+                                                                                full_scale_current=plan.type_ifs[sem_ch])
             recon_beam_current /= n_foils
 
             self.data_arrays[server]['beam']['reconstructed_beam_current'] = beam_data['data']['current']['reconstructed_beam_current'] = recon_beam_current
@@ -649,17 +782,16 @@ class IrradConverter(DAQProcess):
         ### Beam positions ###
         # dname: horizontal_beam_position
         # Check if we have horizontal SEM data
-        if self._lookups[server]['sem_h']:
-            idx_L, idx_R = self._lookups[server]['ro_type_idx']['sem_left'], self._lookups[server]['ro_type_idx']['sem_right']
-            sig_L, sig_R = data[self.readout_setup[server]['channels'][idx_L]], data[self.readout_setup[server]['channels'][idx_R]]
+        if plan.sem_h:
+            sig_L, sig_R = data[plan.type_ch['sem_left']], data[plan.type_ch['sem_right']]
 
             # Scale voltage signal to current; signals can have different R/O scales
             sig_L = analysis.formulas.v_sig_to_i_sig(v_sig=sig_L,
-                                                     full_scale_current=self._lookups[server]['full_scale_current']['sem_left'],
-                                                     full_scale_voltage=self._lookups[server]['full_scale_voltage'])
+                                                     full_scale_current=plan.type_ifs['sem_left'],
+                                                     full_scale_voltage=plan.full_scale_voltage)
             sig_R = analysis.formulas.v_sig_to_i_sig(v_sig=sig_R,
-                                                     full_scale_current=self._lookups[server]['full_scale_current']['sem_right'],
-                                                     full_scale_voltage=self._lookups[server]['full_scale_voltage'])
+                                                     full_scale_current=plan.type_ifs['sem_right'],
+                                                     full_scale_voltage=plan.full_scale_voltage)
 
             # dname: see_horizontal
             self.data_arrays[server]['see']['see_horizontal'] = beam_data['data']['see']['see_horizontal'] = sig_L + sig_R
@@ -679,17 +811,16 @@ class IrradConverter(DAQProcess):
 
         # dname: vertical_beam_position
         # Check if we have vertical SEM data
-        if self._lookups[server]['sem_v']:
-            idx_U, idx_D = self._lookups[server]['ro_type_idx']['sem_up'], self._lookups[server]['ro_type_idx']['sem_down']
-            sig_U, sig_D = data[self.readout_setup[server]['channels'][idx_U]], data[self.readout_setup[server]['channels'][idx_D]]
+        if plan.sem_v:
+            sig_U, sig_D = data[plan.type_ch['sem_up']], data[plan.type_ch['sem_down']]
 
             # Scale voltage signal to current; signals can have different R/O scales
             sig_U = analysis.formulas.v_sig_to_i_sig(v_sig=sig_U,
-                                                     full_scale_current=self._lookups[server]['full_scale_current']['sem_up'],
-                                                     full_scale_voltage=self._lookups[server]['full_scale_voltage'])
+                                                     full_scale_current=plan.type_ifs['sem_up'],
+                                                     full_scale_voltage=plan.full_scale_voltage)
             sig_D = analysis.formulas.v_sig_to_i_sig(v_sig=sig_D,
-                                                     full_scale_current=self._lookups[server]['full_scale_current']['sem_down'],
-                                                     full_scale_voltage=self._lookups[server]['full_scale_voltage'])
+                                                     full_scale_current=plan.type_ifs['sem_down'],
+                                                     full_scale_voltage=plan.full_scale_voltage)
 
             # dname: see_vertical
             self.data_arrays[server]['see']['see_vertical'] = beam_data['data']['see']['see_vertical'] = sig_U + sig_D
@@ -706,7 +837,17 @@ class IrradConverter(DAQProcess):
         else:
             logging.warning("Vertical beam position can not be calculated!")
 
-        self._shift_beam_currents(server=server)
+        self._record_beam_current(server=server)
+
+        self._check_beam_events(server=server)
+        
+        # Append data to table within this interpretation cycle
+        self.data_flags[server]['beam'] = self.data_flags[server]['see'] = True
+
+        return beam_data
+
+    def _check_beam_events(self, server):
+        """Check beam-related events on the current content of self.data_arrays[server]['beam']"""
 
         # If beam leaves radius of 50% relative position, trigger BeamDrift event
         self._check_irrad_event(server=server,
@@ -722,12 +863,306 @@ class IrradConverter(DAQProcess):
         self._check_irrad_event(server=server,
                                 event_name='BeamJitter',
                                 trigger_condition=lambda s=server: self._check_beam_unstable(server=s))
-        
-        # Append data to table within this interpretation cycle
-        self.data_flags[server]['beam'] = self.data_flags[server]['see'] = True
-
-        return beam_data
     
+    def _batch_interpretable(self, server):
+        """
+        Whether raw data of *server* can be interpreted in batches. Requires the beam current and SEM signals needed
+        for the beam positions. Offset determination works sample-by-sample and therefore needs the regular path.
+        """
+        if server not in self._readout_plans or self.interaction_flags[server]['offset'].is_set():
+            return False
+
+        return self._readout_plans[server].batchable
+
+    def _interpret_raw_data_batch(self, server, raw_data_batch):
+        """
+        Vectorized interpretation of consecutive raw data packets of *server*, see self._interpret_raw_samples
+
+        Parameters
+        ----------
+        server : str
+            ip of server
+        raw_data_batch : list
+            list of raw data packets of *server* in order of arrival
+
+        Returns
+        -------
+        list
+            interpreted raw, beam and hist data for each packet, in the order of self.handle_data
+        """
+        channels = self._readout_plans[server].channels
+
+        timestamps = np.array([raw_data['meta']['timestamp'] for raw_data in raw_data_batch], dtype=np.float64)
+        voltages = np.array([[raw_data['data'][ch] for ch in channels] for raw_data in raw_data_batch], dtype=np.float64)
+
+        return self._interpret_raw_samples(server=server, timestamps=timestamps, voltages=voltages)
+
+    def _interpret_raw_data_block(self, server, meta, block):
+        """
+        Interpretation of a block of raw data samples as acquired by the block acquisition of the server. The block
+        is interpreted vectorized if possible; otherwise it is split into single raw data packets for self.handle_data
+
+        Parameters
+        ----------
+        server : str
+            ip of server
+        meta : dict
+            meta data of the block; 'columns' holds the names of the columns of *block*
+        block : numpy.ndarray
+            array of shape (n_samples, n_columns) holding the timestamps and voltages of all samples
+
+        Returns
+        -------
+        list
+            interpreted raw, beam and hist data for each sample, in the order of self.handle_data
+        """
+        columns = meta['columns']
+
+        if self._batch_interpretable(server=server):
+            voltages = block[:, [columns.index(ch) for ch in self._readout_plans[server].channels]]
+            return self._interpret_raw_samples(server=server, timestamps=block[:, columns.index('timestamp')], voltages=voltages)
+
+        interpreted_data = []
+        for sample in block.tolist():
+            sample = dict(zip(columns, sample))
+            interpreted_data.extend(self.handle_data({'meta': {'timestamp': sample.pop('timestamp'), 'name': server, 'type': 'raw_data'},
+                                                      'data': sample}))
+        return interpreted_data
+
+    def _interpret_raw_samples(self, server, timestamps, voltages):
+        """
+        Vectorized interpretation of consecutive raw data samples of *server*. Produces the same interpreted data,
+        events and table entries as passing each sample as raw data packet to self.handle_data; the signal conversion
+        is done on arrays of all samples while events are still checked sample-by-sample, in the original order.
+
+        Parameters
+        ----------
+        server : str
+            ip of server
+        timestamps : numpy.ndarray
+            timestamps of the samples
+        voltages : numpy.ndarray
+            array of shape (n_samples, n_channels) holding the voltages of the channels in the order of the readout plan
+
+        Returns
+        -------
+        list
+            interpreted raw, beam and hist data for each sample, in the order of self.handle_data
+        """
+        plan = self._readout_plans[server]
+        channels, ifs, fsv, n_foils = plan.channels, plan.type_ifs, plan.full_scale_voltage, plan.n_foils
+        lambda_n, lambda_s = self._daq_params[server]['lambda']
+
+        timestamp_col = timestamps.tolist()
+        n_samples = len(timestamp_col)
+
+        ### Raw data ###
+
+        raw_rows = np.zeros(shape=n_samples, dtype=self.data_arrays[server]['raw'].dtype)
+        raw_rows['timestamp'] = timestamps
+        for ch_idx, ch in enumerate(channels):
+            raw_rows[ch] = voltages[:, ch_idx]
+
+        # Subtract offset from data; initially offset is 0 for all ch
+        raw_offsets = self.data_arrays[server]['rawoffset'][0]
+        sig_matrix = voltages.copy()
+        sig_matrix[:, plan.offset_idx] -= [float(raw_offsets[ch]) for ch in plan.offset_channels]
+
+        current_matrix = analysis.formulas.v_sig_to_i_sig(v_sig=sig_matrix[:, plan.offset_idx],
+                                                          full_scale_current=plan.ifs[plan.offset_idx],
+                                                          full_scale_voltage=fsv)
+        current_matrix[:, plan.offset_channels.index(plan.type_ch['sem_sum'])] *= n_foils
+
+        # Offset-subtracted signals of the first channel of each readout type
+        sigs = {rt: sig_matrix[:, idx] for rt, idx in plan.type_idx.items()}
+
+        ### Beam data ###
+
+        beam_rows = np.repeat(self.data_arrays[server]['beam'], n_samples)
+        see_rows = np.repeat(self.data_arrays[server]['see'], n_samples)
+        beam_rows['timestamp'] = see_rows['timestamp'] = raw_rows['timestamp']
+
+        # dname: beam_current; error propagation identical to ufloat(lambda) * ufloat(I_FS, 1.73% I_FS) * signal
+        sum_sig, sum_ifs = sigs['sem_sum'], ifs['sem_sum']
+        beam_current = analysis.formulas.calibrated_beam_current(beam_monitor_sig=sum_sig, calibration_factor=lambda_n, full_scale_current=sum_ifs)
+        # Square and add the error components as Python floats; numpy's vectorized power rounds differently than the scalar one
+        beam_current_error_col = [math.sqrt(err_lambda ** 2 + err_ifs ** 2) for err_lambda, err_ifs in zip((sum_ifs * sum_sig * lambda_s).tolist(),
+                                                                                                            (lambda_n * sum_sig * (0.0173 * sum_ifs)).tolist())]
+        beam_rows['beam_current'] = beam_current
+        beam_rows['beam_current_error'] = beam_current_error_col
+        beam_current_col = beam_current.tolist()
+
+        # dname: see_total
+        see_per_surface = analysis.formulas.v_sig_to_i_sig(v_sig=sum_sig, full_scale_current=sum_ifs, full_scale_voltage=fsv)
+        see_total = see_per_surface * n_foils
+        see_rows['see_total'] = see_total
+
+        # dname: sey; only valid for samples for which BeamOff is not active, which is determined in the event loop below
+        has_cup = 'cup' in plan.type_idx
+        if has_cup:
+            # Use the stored single-precision raw data, just like the sample-by-sample interpretation
+            fc_current = analysis.formulas.v_sig_to_i_sig(v_sig=raw_rows[plan.type_ch['cup']].astype(np.float64), full_scale_current=ifs['cup'], full_scale_voltage=fsv)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                sey = see_per_surface / fc_current * self._daq_params[server]['ion'].n_charge * 100  # %
+
+        # dname: beam_loss
+        has_blm = 'blm' in plan.type_idx
+        if has_blm:
+            blm_current = analysis.formulas.v_sig_to_i_sig(v_sig=sigs['blm'], full_scale_current=ifs['blm'], full_scale_voltage=fsv)
+            beam_rows['beam_loss'] = blm_current
+
+            # Compare to the beam current as stored in the table
+            stored_beam_current = beam_rows['beam_current'].astype(np.float64)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                rel_beam_loss = blm_current / stored_beam_current
+            blm_valid = blm_current <= stored_beam_current
+            blm_corrected = blm_valid & (rel_beam_loss >= self._beam_correction_threshold)
+            extracted_current = stored_beam_current - blm_current
+
+            beam_rows['beam_current'][blm_corrected] = extracted_current[blm_corrected]
+            beam_rows['beam_current'][~blm_valid] = 0
+            beam_current_col = np.where(blm_corrected, extracted_current, beam_current).tolist()
+        else:
+            beam_rows['beam_loss'] = np.nan
+
+        # dname: reconstructed_beam_current
+        recon_beam_current = 0
+        for sem_ch in plan.sem_foils:
+            recon_beam_current = recon_beam_current + analysis.formulas.calibrated_beam_current(beam_monitor_sig=sigs[sem_ch],
+                                                                                                calibration_factor=lambda_n,
+                                                                                                full_scale_current=ifs[sem_ch])
+        recon_beam_current = recon_beam_current / n_foils
+        beam_rows['reconstructed_beam_current'] = recon_beam_current
+
+        ### Beam positions ###
+        see_planes, positions = {}, {}
+        for plane, (sem_a, sem_b) in (('h', ('sem_left', 'sem_right')), ('v', ('sem_up', 'sem_down'))):
+            sig_a = analysis.formulas.v_sig_to_i_sig(v_sig=sigs[sem_a], full_scale_current=ifs[sem_a], full_scale_voltage=fsv)
+            sig_b = analysis.formulas.v_sig_to_i_sig(v_sig=sigs[sem_b], full_scale_current=ifs[sem_b], full_scale_voltage=fsv)
+            see_planes[plane] = sig_a + sig_b
+            positions[plane] = analysis.formulas.rel_beam_position(sig_a=sig_a, sig_b=sig_b, plane=plane)
+
+        see_rows['see_horizontal'], see_rows['see_vertical'] = see_planes['h'], see_planes['v']
+        beam_rows['horizontal_beam_position'], beam_rows['vertical_beam_position'] = positions['h'], positions['v']
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            see_fracs = {plane: see_planes[plane] / see_total * 100 for plane in see_planes}
+
+        ### Events; need to be checked sample-by-sample ###
+        sey_idxs = []
+        beam_off_voltage = 0.01 * fsv
+        beam_off = self.irrad_events[server].BeamOff.value
+
+        for i in range(n_samples):
+
+            self.data_arrays[server]['raw'][0] = raw_rows[i]
+
+            # Use 'sem_sum' voltage signal to determine whether the beam is off: off if smalle 1% of full scale voltage
+            self._check_irrad_event(server=server,
+                                    event_name='BeamOff',
+                                    trigger_condition=lambda v=sum_sig[i]: v < beam_off_voltage)
+
+            # Forward the last valid SEY for samples in which it can not be calculated
+            if has_cup and not beam_off.is_valid():
+                see_rows['sey'][i] = sey[i]
+                sey_idxs.append(i)
+            elif i > 0:
+                see_rows['sey'][i] = see_rows['sey'][i - 1]
+
+            if has_blm and blm_valid[i]:
+                self._check_irrad_event(server=server,
+                                        event_name='BeamLoss',
+                                        trigger_condition=lambda r=rel_beam_loss[i]: r > self._beam_correction_threshold)
+
+                if blm_corrected[i]:
+                    logging.warning("Correcting extracted beam current from {:.2E} A to {:.2E} A".format(stored_beam_current[i],
+                                                                                                         extracted_current[i]))
+
+            self.data_arrays[server]['beam'][0] = beam_rows[i]
+            self.data_arrays[server]['see'][0] = see_rows[i]
+
+            self._record_beam_current(server=server)
+
+            self._check_beam_events(server=server)
+
+        ### Histograms ###
+        hist_idxs = {}
+        bp_hist = self.data_hists[server]['beam_position']
+        bp_h_idx = np.searchsorted(bp_hist['meta']['edges'][0], positions['h']) - 1
+        bp_v_idx = np.searchsorted(bp_hist['meta']['edges'][1], positions['v']) - 1
+        bp_valid = (bp_h_idx < bp_hist['hist'].shape[0]) & (bp_v_idx < bp_hist['hist'].shape[1])
+        np.add.at(bp_hist['hist'], (bp_h_idx[bp_valid], bp_v_idx[bp_valid]), 1)
+        hist_idxs['beam_position_idxs'] = (bp_valid, list(zip(bp_h_idx.tolist(), bp_v_idx.tolist())))
+
+        for plane, plane_name in (('h', 'horizontal'), ('v', 'vertical')):
+            see_hist = self.data_hists[server][f'see_{plane_name}']
+            see_idx = np.searchsorted(see_hist['meta']['edges'], see_fracs[plane]) - 1
+            see_valid = see_idx < see_hist['hist'].shape[0]
+            np.add.at(see_hist['hist'], see_idx[see_valid], 1)
+            hist_idxs[f'see_{plane_name}_idx'] = (see_valid, see_idx.tolist())
+
+        if sey_idxs:
+            sey_hist = self.data_hists[server]['sey']
+            sey_idx = np.full(n_samples, sey_hist['hist'].shape[0])
+            sey_idx[sey_idxs] = np.searchsorted(sey_hist['meta']['edges'], sey[sey_idxs]) - 1
+            sey_valid = sey_idx < sey_hist['hist'].shape[0]
+            np.add.at(sey_hist['hist'], sey_idx[sey_valid], 1)
+            hist_idxs['sey_idx'] = (sey_valid, sey_idx.tolist())
+
+        ### Interpreted data ###
+        interpreted_data = []
+
+        voltage_rows, current_rows = sig_matrix.tolist(), current_matrix.tolist()
+        beam_loss_col = blm_current.tolist() if has_blm else None
+        recon_col, see_total_col, sey_col = recon_beam_current.tolist(), see_total.tolist(), sey.tolist() if has_cup else None
+        position_cols = {plane: positions[plane].tolist() for plane in positions}
+        see_plane_cols = {plane: see_planes[plane].tolist() for plane in see_planes}
+        see_frac_cols = {plane: see_fracs[plane].tolist() for plane in see_fracs}
+        sey_idxs = set(sey_idxs)
+
+        for i, timestamp in enumerate(timestamp_col):
+
+            raw_data = {'meta': {'timestamp': timestamp, 'name': server, 'type': 'raw'},
+                        'data': {'voltage': dict(zip(channels, voltage_rows[i])),
+                                 'current': dict(zip(plan.offset_channels, current_rows[i]))}}
+
+            beam_data = {'meta': {'timestamp': timestamp, 'name': server, 'type': 'beam'},
+                         'data': {'position': {'h': position_cols['h'][i], 'v': position_cols['v'][i]},
+                                  'current': {'beam_current': beam_current_col[i], 'beam_current_error': beam_current_error_col[i]},
+                                  'see': {'see_total': see_total_col[i]}}}
+            if has_blm:
+                beam_data['data']['current']['beam_loss'] = beam_loss_col[i]
+            beam_data['data']['current']['reconstructed_beam_current'] = recon_col[i]
+            if i in sey_idxs:
+                beam_data['data']['see']['sey'] = sey_col[i]
+            beam_data['data']['see'].update({'see_horizontal': see_plane_cols['h'][i], 'frac_h': see_frac_cols['h'][i],
+                                             'see_vertical': see_plane_cols['v'][i], 'frac_v': see_frac_cols['v'][i]})
+
+            hist_data = {'meta': {'timestamp': timestamp, 'name': server, 'type': 'hist'},
+                         'data': {hist_key: idxs[i] for hist_key, (valid, idxs) in hist_idxs.items() if valid[i]}}
+
+            interpreted_data.extend([raw_data, beam_data, hist_data])
+
+        # Store entire batch at once
+        if self.interaction_flags[server]['write'].is_set():
+            for dname, rows in (('raw', raw_rows), ('beam', beam_rows), ('see', see_rows)):
+                self.data_tables[server][dname].append(rows)
+                self.data_flags[server][dname] = False
+            self.store_data(server)
+        else:
+            self.data_flags[server]['raw'] = self.data_flags[server]['beam'] = self.data_flags[server]['see'] = True
+            logging.debug("Data of {} is not being recorded...".format(self.setup['server'][server]['name']))
+
+        # Calc and add data rate to interpreted meta data, averaged over the batch
+        for data_type in ('raw', 'beam', 'hist'):
+            metas = [in_data['meta'] for in_data in interpreted_data if in_data['meta']['type'] == data_type]
+            self._calc_drate(server=server, meta=metas[-1], n_samples=n_samples)
+            if 'data_rate' in metas[-1]:
+                for meta in metas:
+                    meta['data_rate'] = metas[-1]['data_rate']
+
+        return interpreted_data
+
     def _check_irrad_event(self, server, event_name, trigger_condition):
         """
         Checks whether an event condition is fulfilled and the correspending event flag has the correct state
@@ -764,7 +1199,7 @@ class IrradConverter(DAQProcess):
             actual_irrad_event.active = tc
             event_dict = {'server': server}
             event_dict.update(self.irrad_events[server].to_dict(event_name))
-            self.sockets['event'].send_json(event_dict)
+            self.sockets['event'].send(self.serializer.dumps(event_dict))
 
         # Store event data if an event changed state from active to inactive or vice-versa
         if triggered_but_inactive or untriggered_but_active:
@@ -950,7 +1385,8 @@ class IrradConverter(DAQProcess):
     def _interpret_daq_board_ntc_data(self, server, data, meta):
 
         # Get NTC channel voltage
-        ntc_voltage = data[self.readout_setup[server]['channels'][self._lookups[server]['ntc_group_idx']]]
+        plan = self._readout_plans[server]
+        ntc_voltage = data[plan.channels[plan.ntc_group_idx]]
         ntc_temp = analysis.formulas.get_ntc_temp(ntc_voltage=ntc_voltage, ref_voltage=ro.DAQ_BOARD_CONFIG['common']['voltages']['2V5p'])
         ntc_ch_name = self.readout_setup[server]['ntc'][str(meta['ntc_ch'])]
 
@@ -1072,6 +1508,10 @@ class IrradConverter(DAQProcess):
         # Retrieve server IP , meta data and actual data from raw data dict
         server, meta_data, data = raw_data['meta']['name'], raw_data['meta'], raw_data['data']
 
+        # Blocks of raw data are stored and rated sample-by-sample
+        if meta_data['type'] == 'raw_data_block':
+            return self._interpret_raw_data_block(server=server, meta=meta_data, block=data)
+
         if meta_data['type'] == 'raw_data':
 
             ### Raw data ###
@@ -1136,10 +1576,59 @@ class IrradConverter(DAQProcess):
 
         return interpreted_data
 
+    def handle_data_batch(self, raw_data_batch):
+        """
+        Interpretation of multiple data packets at once. Consecutive raw data packets of a server are interpreted
+        vectorized, see self._interpret_raw_data_batch; all other packets are passed to self.handle_data.
+
+        Parameters
+        ----------
+        raw_data_batch : list
+            list of data packets in order of arrival
+
+        Returns
+        -------
+        list
+            interpreted data of all packets
+        """
+
+        # Make list of interpreted result data
+        interpreted_data = []
+
+        # Consecutive raw data packets of the same server
+        raw_data_run = []
+
+        def interpret_run():
+            if len(raw_data_run) > 1 and self._batch_interpretable(server=raw_data_run[0]['meta']['name']):
+                interpreted_data.extend(self._interpret_raw_data_batch(server=raw_data_run[0]['meta']['name'], raw_data_batch=raw_data_run))
+            else:
+                for raw_data in raw_data_run:
+                    interpreted_data.extend(self.handle_data(raw_data))
+            raw_data_run.clear()
+
+        for raw_data in raw_data_batch:
+
+            meta_data = raw_data['meta']
+
+            # NTC readout of the IrradDAQBoard is interpreted along the raw data and breaks up the run
+            if meta_data['type'] == 'raw_data' and 'ntc_ch' not in meta_data:
+                if raw_data_run and raw_data_run[0]['meta']['name'] != meta_data['name']:
+                    interpret_run()
+                raw_data_run.append(raw_data)
+            else:
+                interpret_run()
+                interpreted_data.extend(self.handle_data(raw_data))
+
+        interpret_run()
+
+        return interpreted_data
+
     def store_data(self, server):
         """Method which appends current data to table files. If tables are longer then self._max_buf_len,
         flush the buffer to hard drive"""
 
+        start = perf_counter()
+
         # Store data that is not always available
         for storable_data, store_status in self.data_flags[server].items():
 
@@ -1147,12 +1636,139 @@ class IrradConverter(DAQProcess):
                 self.data_tables[server][storable_data].append(self.data_arrays[server][storable_data])
                 self.data_flags[server][storable_data] = False
 
-        # Flush data to hard drive in fixed interval
-        if self._last_data_flush is None or time() - self._last_data_flush >= self._data_flush_interval:
+        self._flush_output()
+
+        self.metrics.record('store', perf_counter() - start)
+
+    def _flush_output(self, force=False):
+        """Append buffered rows and flush data to hard drive in fixed interval"""
+        if force or self._last_data_flush is None or time() - self._last_data_flush >= self._data_flush_interval:
             logging.debug("Flushing data to hard disk...")
-            self.output_table.flush()
+            for server in self.data_tables:
+                self._flush_tables(server=server)
+            self._write(self._flush_file)
             self._last_data_flush = time()
 
+            if not force:
+                self._checkpoint()
+
+    def _checkpoint(self):
+        """
+        Store the increments of the histograms once the histogram interval elapsed and continue the output in a new
+        segment once the current segment is older than the segment interval
+        """
+        if self._hist_interval and time() - self._last_hist_delta >= self._hist_interval:
+            self._store_hist_deltas()
+
+        if self._segment_interval and time() - self._segment[1] >= self._segment_interval * 60:
+            self._roll_segment()
+
+    def _roll_segment(self):
+        """
+        Close the current segment including snapshots of the histograms, sync it to disk and continue writing
+        to a new segment of the same layout
+        """
+
+        for server in self.data_tables:
+            self._flush_tables(server=server)
+
+        # The file is accessed from this thread only while the writer is idle
+        if self._writer is not None:
+            self._writer.wait()
+
+        seg_dir = segments.segment_dir(self.setup['session']['outfile'])
+        n_segment = self._segment[0] + 1
+
+        new_segment = segments.create_segment(path=segments.segment_path(seg_dir, n_segment), template=self.output_table)
+
+        for tables in self.data_tables.values():
+            for table in tables.values():
+                table.table = new_segment.get_node(table.table._v_pathname)
+
+        self._store_histograms()
+        self.output_table.close()
+        segments.fsync_file(self.output_table.filename)
+
+        self.output_table = new_segment
+        self._segment = (n_segment, time())
+
+        logging.info(f"Continuing output in segment {self.output_table.filename}")
+
+    def _store_hist_deltas(self):
+        """
+        Append the increments of the histograms since the last call to the deltas table of each histogram. Rows are
+        timestamped with the end of the interval; intervals without entries are not stored. The histogram of any
+        time window is the sum of the increments within it, see analysis.utils.window_hist
+        """
+
+        timestamp = time()
+
+        for server, baselines in self._hist_baselines.items():
+
+            # Increments of workers are stored by the workers
+            if server in self._workers:
+                continue
+
+            for hist_name, baseline in baselines.items():
+
+                hist = self.data_hists[server][hist_name]['hist']
+
+                if np.array_equal(hist, baseline):
+                    continue
+
+                deltas = self.data_tables[server][f'{hist_name}_deltas']
+
+                row = np.zeros(shape=1, dtype=deltas.dtype)
+                row['timestamp'] = timestamp
+                row['hist'] = hist - baseline
+
+                deltas.append(row)
+
+                baseline[:] = hist
+
+        self._last_hist_delta = timestamp
+
+    def _store_histograms(self):
+        """Write the current histograms of all servers to the output file"""
+
+        for server, server_setup in self.setup['server'].items():
+
+            for hist_name in self.data_hists[server]:
+
+                where = '/{}/Histogram/{}'.format(server_setup['name'], self._generate_hist_table_name(hist_name=hist_name))
+
+                # Histograms of workers are pushed by the workers
+                hist = self._hist_snapshots.get(where) if server in self._workers else self.data_hists[server][hist_name]['hist']
+
+                if hist is not None:
+                    self.output_table.create_array(where, 'hist', hist)
+
+    def _flush_tables(self, server):
+        """Append the buffered rows of all tables of *server*"""
+        for table in self.data_tables[server].values():
+            table.flush()
+
+    def _flush_file(self):
+        """Flush the output file to hard drive and record the duration"""
+        start = perf_counter()
+        self.output_table.flush()
+        self.metrics.record('output_flush', perf_counter() - start)
+
+    def _write(self, func, *args):
+        """Call *func* with *args* in the writer thread if any, else immediately"""
+        if self._writer is None:
+            func(*args)
+        else:
+            self._writer.submit(func, *args)
+            self.metrics.gauge('writer_queue', self._writer.pending)
+
+    def recv_data(self):
+        """Receives raw data; queued packets are interpreted in batches of up to self._max_batch_size"""
+        if self._max_batch_size > 1:
+            self._recv_from_stream(kind='data', stream=self.daq_streams, callback=self.handle_data_batch, pub_results=True, max_batch_size=self._max_batch_size)
+        else:
+            super(IrradConverter, self).recv_data()
+
     def _start_interpreter(self, setup):
         """Sets up the interpreter process"""
 
@@ -1162,11 +1778,215 @@ class IrradConverter(DAQProcess):
         # Setup logging
         self._setup_logging()
 
+        self._setup_serializer()
+
+        # Interpret the data of each server in its own process
+        if self.setup['session'].get('sharded', False):
+            self._start_workers()
+            return
+
         self._setup_daq()
 
         self.add_daq_stream(daq_stream=[self._tcp_addr(port=self.setup['server'][server]['ports']['data'], ip=server) for server in self.server])
 
-        self.launch_thread(target=self.recv_data)
+        self.recv_data()
+
+    def _start_workers(self):
+        """
+        Start one IrradConverterWorker process per server which interprets the data of its server and keeps the state
+        of its server. Interpreted data, events and logs of the workers are relayed via the sockets of this process.
+        This process is the only one writing to the output file; rows to store are pushed by the workers.
+        """
+
+        logging.info(f"Interpreting data of {len(self.setup['server'])} server(s) in individual processes")
+
+        self._storage_pull = self.context.socket(zmq.PULL)
+        storage_addr = self._tcp_addr(port=self._storage_pull.bind_to_random_port('tcp://127.0.0.1'), ip='127.0.0.1')
+
+        relay_addrs = {kind: self._relay_stream(kind=kind) for kind in ('data', 'event', 'log', 'metrics')}
+
+        # Start workers before opening the output file; forked workers must not inherit an open HDF5 file
+        for server in self.setup['server']:
+
+            self._worker_cmds[server] = self.context.socket(zmq.PUSH)
+            self._worker_cmds[server].setsockopt(zmq.LINGER, 0)
+            cmd_addr = self._tcp_addr(port=self._worker_cmds[server].bind_to_random_port('tcp://127.0.0.1'), ip='127.0.0.1')
+
+            self._workers[server] = IrradConverterWorker(server=server,
+                                                         setup=self.setup,
+                                                         cmd_addr=cmd_addr,
+                                                         storage_addr=storage_addr,
+                                                         relay_addrs=relay_addrs)
+            self._workers[server].start()
+
+        # Create the layout of the output file for all servers
+        self._setup_daq()
+
+        # Workers report once they are set up; store what they push meanwhile
+        ready = set()
+        start = time()
+        while len(ready) < len(self._workers) and time() - start < self._worker_timeout:
+            if self._storage_pull.poll(timeout=100):
+                meta = self._handle_storage()
+                if meta['type'] == 'ready':
+                    ready.add(meta['name'])
+
+        if len(ready) < len(self._workers):
+            logging.error("Worker(s) of server(s) {} not ready".format(', '.join(self.setup['server'][s]['name'] for s in self._workers if s not in ready)))
+
+        self._add_loop_socket(sock=self._storage_pull, handler=self._handle_storage)
+
+    def _relay_stream(self, kind):
+        """
+        Bind a subscriber to which workers publish their *kind* stream and forward its messages unchanged. Data is
+        forwarded via *send_data*, events and logs via the respective socket of this process. Metrics are published
+        along the metrics of this process, see *_publish_metrics*.
+
+        Parameters
+        ----------
+        kind : str
+            Kind of stream to relay, one of 'data', 'event', 'log', 'metrics'
+
+        Returns
+        -------
+        str
+            Address of the relay to which workers connect
+        """
+
+        relay_sub = self.context.socket(zmq.SUB)
+        relay_addr = self._tcp_addr(port=relay_sub.bind_to_random_port('tcp://127.0.0.1'), ip='127.0.0.1')
+        relay_sub.setsockopt(zmq.SUBSCRIBE, b'')
+
+        if kind == 'data':
+            relay_pub = self.create_internal_data_pub()
+            self._stream_sockets.append(relay_pub)
+
+            def relay():
+                self.send_internal(relay_pub, relay_sub.recv_multipart(copy=False), copy=False)
+
+        # The metrics socket is used by the thread of *send_metrics*
+        elif kind == 'metrics':
+            def relay():
+                self._worker_metrics.append(relay_sub.recv_multipart())
+
+        else:
+            def relay():
+                self.sockets[kind].send_multipart(relay_sub.recv_multipart(copy=False), copy=False)
+
+        self._stream_sockets.append(relay_sub)
+        self._add_loop_socket(sock=relay_sub, handler=relay)
+
+        return relay_addr
+
+    def _handle_storage(self):
+        """
+        Receive a message of a worker at self._storage_pull and write it to the output file, see IrradConverterWorker.
+        Messages of type 'rows' and 'array' are written, 'ready' and 'reply' are returned to the caller
+
+        Returns
+        -------
+        dict
+            Meta data of the message
+        """
+
+        frames = self._storage_pull.recv_multipart(copy=False)
+
+        meta = Serializer.loads(bytes(frames[0]))['meta']
+
+        if meta['type'] == 'rows':
+            start = perf_counter()
+            self._write(self._append_rows, meta['node'], frames[1])
+            self._flush_output()
+            self.metrics.record('store', perf_counter() - start)
+
+        elif meta['type'] == 'array':
+            self._write(self._create_array, meta['node'], meta['name'], Serializer.loads_frames(frames)['data'])
+
+        return meta
+
+    def _append_rows(self, node, buffer):
+        table = self.output_table.get_node(node)
+        table.append(np.frombuffer(buffer, dtype=table.dtype))
+
+    def _create_array(self, where, name, obj):
+
+        # Histograms are written once a segment or the output file is closed, see *_store_histograms*
+        if name == 'hist':
+            self._hist_snapshots[where] = obj
+
+        # Arrays of the layout already exist
+        elif f"{where}/{name}" not in self.output_table:
+            self.output_table.create_array(where, name, obj)
+
+    def _publish_metrics(self):
+        """Publish the own metrics and those of the workers which were received meanwhile"""
+
+        super(IrradConverter, self)._publish_metrics()
+
+        while self._worker_metrics:
+            self.sockets['metrics'].send_multipart(self._worker_metrics.popleft())
+
+    def _forward_cmd(self, cmd, data):
+        """Forward a command concerning the state of a single server to the worker of that server"""
+
+        if cmd == 'zero_offset':
+            server = data
+        elif cmd == 'record_data':
+            server = data[0]
+        else:
+            server = data['server']
+
+        self._worker_cmds[server].send_json({'target': 'interpreter', 'cmd': cmd, 'data': data})
+
+        return server
+
+    def _wait_for_worker_reply(self, server, cmd):
+        """
+        Wait for the reply of the worker of *server* to *cmd* and store the rows it pushes meanwhile
+
+        Parameters
+        ----------
+        server : str
+            IP of the server whose worker handles *cmd*
+        cmd : str
+            Command to which the worker replies
+
+        Returns
+        -------
+        dict, None
+            Reply of the worker, see IrradConverterWorker._send_reply, or None if it did not reply in time
+        """
+
+        start = time()
+        while time() - start < self._worker_reply_timeout:
+            if self._storage_pull.poll(timeout=100):
+                meta = self._handle_storage()
+                if meta['type'] == 'reply' and meta['name'] == server and meta['reply']['reply'] == cmd:
+                    return meta['reply']
+
+    def _stop_workers(self):
+        """Shut down the workers and store the rows they push until they have exited"""
+
+        for worker in self._workers.values():
+            worker.terminate()
+
+        start = time()
+        while any(worker.is_alive() for worker in self._workers.values()) and time() - start < self._worker_timeout:
+            if self._storage_pull.poll(timeout=100):
+                self._handle_storage()
+
+        # Rows which were pushed right before a worker exited
+        while self._storage_pull.poll(timeout=100):
+            self._handle_storage()
+
+        for server, worker in self._workers.items():
+            if worker.is_alive():
+                logging.error(f"Worker of server {self.setup['server'][server]['name']} did not shut down, killing it")
+                worker.kill()
+            worker.join()
+            self._worker_cmds[server].close()
+
+        self._storage_pull.close()
 
     def handle_cmd(self, target, cmd, data=None):
         """Handle all commands. After every command a reply must be send."""
@@ -1181,6 +2001,26 @@ class IrradConverter(DAQProcess):
             elif cmd == 'shutdown':
                 self.shutdown()
 
+            # In sharded mode, each worker writes the profile of its own process to the session folder
+            elif cmd in ('profile_start', 'profile_stop'):
+                for worker_cmd in self._worker_cmds.values():
+                    worker_cmd.send_json({'target': target, 'cmd': cmd, 'data': data})
+                self._handle_profile_cmd(target=target, cmd=cmd, data=data)
+
+            # In sharded mode, the state of each server is kept by its worker; reply with the state confirmed by the worker
+            elif self._workers and cmd in ('zero_offset', 'record_data', 'update_group_ifs', 'toggle_event'):
+                server = self._forward_cmd(cmd=cmd, data=data)
+
+                if cmd == 'record_data':
+                    reply = self._wait_for_worker_reply(server=server, cmd=cmd)
+
+                    if reply is None:
+                        msg = f"Worker of server {self.setup['server'][server]['name']} did not confirm '{cmd}'"
+                        logging.error(msg)
+                        self._send_reply(reply=cmd, sender=target, _type='ERROR', data=msg)
+                    else:
+                        self._send_reply(reply=cmd, sender=target, _type=reply['type'], data=reply['data'])
+
             elif cmd == 'zero_offset':
                 self.interaction_flags[data]['offset'].set()
 
@@ -1192,12 +2032,16 @@ class IrradConverter(DAQProcess):
                 else:
                     self.interaction_flags[server]['write'].clear()
 
+                # Rows recorded so far are written before recording is toggled
+                self._flush_tables(server=server)
+
                 self._send_reply(reply=cmd, sender=target, _type='STANDARD', data=[server, self.interaction_flags[server]['write'].is_set()])
 
             elif cmd == 'update_group_ifs':
                 server, ifs, group = data['server'], data['ifs'], data['group']
                 self.readout_setup[server]['ro_group_scales'][group] = ifs
-                self._update_ifs_values(server=server)
+                # Swap in a new plan; interpretation which is in progress keeps using the previous one
+                self._readout_plans[server] = ReadoutPlan(readout_setup=self.readout_setup[server])
                 self._store_event_parameters(server=server, event=cmd, parameters={'group': group, 'ifs': ifs, 'unit': 'nA'})
             
             elif cmd == 'toggle_event':
@@ -1209,21 +2053,56 @@ class IrradConverter(DAQProcess):
         # User info
         logging.info('Closing output file {}'.format(self.output_table.filename))
 
-        for server, server_setup in self.setup['server'].items():
+        if self._hist_interval:
+            self._store_hist_deltas()
 
+        for server in self.setup['server']:
             self.store_data(server=server)
 
-            # Store histograms
-            for hist_name in self.data_hists[server]:
-                table_name = self._generate_hist_table_name(hist_name=hist_name)
-                self.output_table.create_array('/{}/Histogram/{}'.format(server_setup['name'], table_name), 'hist', self.data_hists[server][hist_name]['hist'])
+        # Append remaining rows and wait until everything is written
+        self._flush_output(force=True)
+
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+        # Store histograms
+        self._store_histograms()
 
         self.output_table.flush()
 
         self.output_table.close()
 
+        if self._segment_interval:
+            segments.fsync_file(self.output_table.filename)
+            self._consolidate_segments()
+
+    def _consolidate_segments(self):
+        """Merge the segments into one output file; segments are only removed if merging succeeded"""
+
+        seg_dir = segments.segment_dir(self.setup['session']['outfile'])
+        out_file = self.setup['session']['outfile'] + '.h5'
+
+        logging.info(f"Consolidating segments of {seg_dir} into {out_file}")
+
+        start = time()
+
+        try:
+            n_segments = segments.consolidate_segments(seg_dir=seg_dir, out_file=out_file)
+        except Exception as e:
+            logging.error(f"Consolidating segments failed, segments are kept: {repr(e)}")
+            return
+
+        shutil.rmtree(seg_dir)
+
+        logging.info(f"Consolidated {n_segments} segment(s) in {time() - start:.1f} s")
+
     def clean_up(self):
 
+        # Workers push their remaining data on shutdown
+        if self._workers:
+            self._stop_workers()
+
         # Close opened data files; AttributeError if DAQ hasn't started
         try:
             self._close_tables()
@@ -1231,9 +2110,186 @@ class IrradConverter(DAQProcess):
             pass
 
 
-def run(blocking=True):
+class _ShardTable(object):
+    """
+    Stand-in of a tables.Table in a worker process which pushes appended rows to the converter writing the output
+    file. Rows can only be read back via the history of a TableBuffer.
+    """
+
+    def __init__(self, shard_file, node, dtype):
+
+        self._shard_file = shard_file
+        self.node = node
+        self.dtype = np.dtype(dtype)
+
+    def append(self, rows):
+        self._shard_file.push(meta={'type': 'rows', 'node': self.node}, array=np.ascontiguousarray(rows, dtype=self.dtype))
+
+
+class _ShardFile(object):
+    """
+    Stand-in of the tables.File in a worker process. Groups and tables are created by the converter writing the
+    output file; tables and arrays created here push their content to it, see IrradConverter._handle_storage.
+
+    Parameters
+    ----------
+    sock : zmq.Socket
+        PUSH socket connected to the storage socket of the converter
+    serializer : Serializer
+        Serializer of the worker
+    filename : str
+        Name of the output file
+    """
+
+    root = '/'
+
+    def __init__(self, sock, serializer, filename):
+        self._sock = sock
+        self._serializer = serializer
+        self.filename = filename
+
+    def __contains__(self, node):
+        return False
+
+    def push(self, meta, array):
+        self._sock.send_multipart(self._serializer.dumps_array(meta=meta, array=array))
+
+    def create_group(self, where, name):
+        pass
+
+    def create_table(self, where, description, name, **kwargs):
+        return _ShardTable(shard_file=self, node=f"{where.rstrip('/')}/{name}", dtype=description)
+
+    def create_array(self, where, name, obj):
+        self.push(meta={'type': 'array', 'node': where, 'name': name}, array=np.ascontiguousarray(obj))
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class IrradConverterWorker(IrradConverter):
+    """
+    Interpreter of the data of a single server in sharded mode, see IrradConverter._start_workers. Interpreted data,
+    events and logs are published to the relays of the converter, rows to store are pushed to the converter which
+    writes the output file. Commands are forwarded by the converter; replies are pushed back to the converter which
+    replies to the sender of the command.
+
+    Parameters
+    ----------
+    server : str
+        IP of the server to interpret data from
+    setup : dict
+        Session setup
+    cmd_addr : str
+        Address from which to pull commands
+    storage_addr : str
+        Address to which to push rows to store
+    relay_addrs : dict
+        Addresses of the relays of the converter to which to publish 'data', 'event' and 'log'
+    """
+
+    def __init__(self, server, setup, cmd_addr, storage_addr, relay_addrs):
+
+        super(IrradConverterWorker, self).__init__(name=f'interpreter_{server}')
+
+        # Only interpret the data of own server
+        self.setup = dict(setup,
+                          session=dict(setup['session'], sharded=False, writer_thread=False, storage=dict(setup['session'].get('storage', {}), segment_interval=None)),
+                          server={server: setup['server'][server]})
+
+        # The converter writes segments including histograms; push snapshots of the histograms
+        self._push_hist_snapshots = bool(setup['session'].get('storage', {}).get('segment_interval'))
+
+        self._cmd_addr = cmd_addr
+        self._storage_addr = storage_addr
+        self._relay_addrs = relay_addrs
+        self._storage = None
+
+        # Interpreted data is published to the data relay instead of a local *send_data*
+        self._internal_sub_addr = relay_addrs['data']
+
+    def _allocate_sockets(self, *args, **kwargs):
+        """Connect to the sockets of the converter instead of binding own sockets"""
+
+        self.sockets['cmd'] = self.context.socket(zmq.PULL)
+        self.sockets['cmd'].connect(self._cmd_addr)
+
+        for kind in ('event', 'log', 'metrics'):
+            self.sockets[kind] = self.context.socket(zmq.PUB)
+            self.sockets[kind].connect(self._relay_addrs[kind])
+
+        self._storage = self.context.socket(zmq.PUSH)
+        self._storage.connect(self._storage_addr)
+
+    def _write_pid_file(self):
+        """The PID file belongs to the converter"""
+        pass
+
+    def _remove_pid_file(self):
+        pass
+
+    def _send_reply(self, reply, _type, sender, data=None):
+        """Push the reply to the converter which sends it, see IrradConverter._wait_for_worker_reply"""
+        self.state_flags['__busy__'].clear()
+        self._storage.send(self.serializer.dumps({'meta': {'type': 'reply', 'name': self.server[0],
+                                                           'reply': {'reply': reply, 'type': _type, 'sender': sender, 'data': data}}}))
+
+    def _setup_logging(self):
+
+        # Forked workers inherit the log handler of the converter
+        self._remove_log_publisher()
+
+        super(IrradConverterWorker, self)._setup_logging()
+
+    @staticmethod
+    def _remove_log_publisher():
+        root_logger = logging.getLogger()
+        for handler in [h for h in root_logger.handlers if isinstance(h, handlers.PUBHandler)]:
+            root_logger.removeHandler(handler)
+
+    def _checkpoint(self):
+        super(IrradConverterWorker, self)._checkpoint()
+        if self._push_hist_snapshots:
+            self._store_histograms()
+
+    def _open_output_file(self):
+        return _ShardFile(sock=self._storage,
+                          serializer=self.serializer,
+                          filename=self.setup['session']['outfile'] + '.h5')
+
+    def _launch_threads(self):
+        """Set up interpretation of the own server and start the event loop; data is not sent via *send_data*"""
+
+        self._start_interpreter(setup=self.setup)
+
+        self._storage.send(self.serializer.dumps({'meta': {'type': 'ready', 'name': self.server[0]}}))
+
+        self.launch_thread(target=self._event_loop)
+
+        self.launch_thread(target=self.send_metrics)
+
+    def clean_up(self):
+
+        # Push remaining rows and histograms
+        super(IrradConverterWorker, self).clean_up()
+
+        self._remove_log_publisher()
+
+        # Deliver pushed messages before the process exits
+        self.context.destroy(linger=int(self._worker_timeout * 1e3))
+
+
+class AsyncIrradConverter(AsyncDAQProcess, IrradConverter):
+    """IrradConverter running on an asyncio event loop, see AsyncDAQProcess"""
+    pass
+
+
+def run(blocking=True, asynchronous=False):
 
-    irrad_converter = IrradConverter()
+    irrad_converter = AsyncIrradConverter() if asynchronous else IrradConverter()
     irrad_converter.start()
     
     if blocking:
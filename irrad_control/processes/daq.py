@@ -3,14 +3,17 @@ import yaml
 import zmq
 import logging
 import signal
-from time import sleep
+from time import sleep, time, perf_counter, strftime
 from multiprocessing import Process
-from threading import Event
+from threading import Event, Lock
 from zmq.log import handlers
 from irrad_control import pid_file
 from irrad_control.utils.worker import ThreadWorker
 from irrad_control.utils.utils import check_zmq_addr
-from collections import defaultdict
+from irrad_control.utils.serializer import Serializer
+from irrad_control.utils.metrics import Metrics
+from irrad_control.utils.profiler import StackSampler
+from collections import defaultdict, deque
 
 
 class DAQProcess(Process):
@@ -50,9 +53,9 @@ class DAQProcess(Process):
         self.state_flags = defaultdict(Event)  # Create events in subclasses on demand
 
         # Ports/sockets used by this process
-        self.ports = {'log': None, 'cmd': None, 'data': None, 'event': None}
-        self.sockets = {'log': None, 'cmd': None, 'data': None, 'event': None}
-        self.socket_type = {'log': zmq.PUB, 'cmd': zmq.REP, 'data': zmq.PUB, 'event': zmq.PUB}
+        self.ports = {'log': None, 'cmd': None, 'data': None, 'event': None, 'metrics': None}
+        self.sockets = {'log': None, 'cmd': None, 'data': None, 'event': None, 'metrics': None}
+        self.socket_type = {'log': zmq.PUB, 'cmd': zmq.REP, 'data': zmq.PUB, 'event': zmq.PUB, 'metrics': zmq.PUB}
 
         # Attribute holding zmq context
         self.context = None
@@ -62,12 +65,39 @@ class DAQProcess(Process):
         # DAQ processes DAQ threads in an attempt to distribute the load on multiple CPU cores more evenly
         self._internal_sub_addr = internal_sub if internal_sub is not None and check_zmq_addr(internal_sub) else 'inproc://internal'
 
+        # Address of the socket which controls forwarding of internal data to the data publisher, see *send_data*
+        self._internal_ctrl_addr = 'inproc://internal_control'
+        self._send_data_control = None
+        self._send_data_ctrl = None
+        self._send_data_ctrl_lock = None
+
+        # Sockets which are multiplexed in the event loop, see *_event_loop*, and streams waiting to be added to it
+        self._loop_handlers = {}
+        self._new_loop_streams = deque()
+        self._stream_sockets = []
+
+        # Pair of sockets to wake up the event loop from other threads
+        self._wakeup_addr = 'inproc://wakeup'
+        self._wakeup_pair = None
+        self._wakeup_lock = None
+
         # High-water mark for all ZMQ sockets
         self.hwm = 100 if hwm is None or not isinstance(hwm, int) else hwm
 
         # Attribute to store irrad session setup in
         self.setup = None
 
+        # Instrumentation of the hot paths, published every *_metrics_interval* seconds, see *send_metrics*
+        self.metrics = Metrics()
+        self._metrics_interval = 1.0  # Set via setup['session']['metrics_interval']
+        self._metrics_source = name  # Name of this process in the published metrics
+
+        # Sampling profiler which is started and stopped by command, see *_handle_profile_cmd*
+        self._profiler = None
+
+        # Encodes data and events; JSON until the session setup negotiates the codec, see *_setup_serializer*
+        self.serializer = Serializer()
+
         # List to hold all threads of the process
         self.threads = []
 
@@ -99,6 +129,20 @@ class DAQProcess(Process):
         # Create sockets
         self._allocate_sockets()
 
+        # Create wake-up sockets of the event loop; the bound end is polled, the connected end sends
+        self._wakeup_pair = (self.context.socket(zmq.PAIR), self.context.socket(zmq.PAIR))
+        self._wakeup_pair[0].bind(self._wakeup_addr)
+        self._wakeup_pair[1].connect(self._wakeup_addr)
+        self._wakeup_lock = Lock()
+
+        # Pair of control sockets of the proxy in *send_data*, created before any thread is launched so that *shutdown*
+        # can always terminate the proxy; the bound end is used by the proxy, the connected end by *_stop_send_data*
+        self._send_data_control = self.context.socket(zmq.PAIR)
+        self._send_data_control.bind(self._internal_ctrl_addr)
+        self._send_data_ctrl = self.context.socket(zmq.PAIR)
+        self._send_data_ctrl.connect(self._internal_ctrl_addr)
+        self._send_data_ctrl_lock = Lock()
+
     def _allocate_sockets(self, min_port=8000, max_port=9000, max_tries=100, rep_linger=500):
         """
         Method to acquire all needed sockets. Ports are selected by zmq's *bind_to_random_port* method which
@@ -148,10 +192,36 @@ class DAQProcess(Process):
         internal_data_pub = self.context.socket(zmq.PUB)
         internal_data_pub.setsockopt(zmq.SNDHWM, self.hwm)
         internal_data_pub.setsockopt(zmq.LINGER, 0)
+        # Raise instead of silently dropping messages at the high-water mark; drops are counted, see *send_internal*
+        internal_data_pub.setsockopt(zmq.XPUB_NODROP, 1)
         internal_data_pub.connect(self._internal_sub_addr)
 
         return internal_data_pub
 
+    def send_internal(self, internal_pub, frames, **kwargs):
+        """
+        Send the message *frames* via the internal publisher *internal_pub* without blocking. If the high-water
+        mark is reached, the message is dropped and counted in the 'hwm_drops' metric
+
+        Parameters
+        ----------
+        internal_pub: zmq.Socket
+            Publisher created by *create_internal_data_pub*
+        frames: list
+            Frames of the message
+        kwargs: dict
+            Keyword arguments which are passed to zmq.Socket.send_multipart
+
+        Returns
+        -------
+        zmq.MessageTracker, None
+            Tracker of the message if requested via *kwargs* and the message was sent, else None
+        """
+        try:
+            return internal_pub.send_multipart(frames, flags=zmq.NOBLOCK, **kwargs)
+        except zmq.Again:
+            self.metrics.count('hwm_drops')
+
     def _write_pid_file(self):
         """
         Method that writes information of this process into a yaml file and stores it in the config-folder
@@ -188,6 +258,11 @@ class DAQProcess(Process):
         # Write PID file
         self._write_pid_file()
 
+    def _setup_serializer(self):
+        """Setup the codec of outgoing data and events from the session setup. Must be called once *self.setup* is known"""
+        self.serializer = Serializer(codec=self.setup['session'].get('serializer', 'json'))
+        self._metrics_interval = self.setup['session'].get('metrics_interval', self._metrics_interval)
+
     def launch_thread(self, target, *args, **kwargs):
         """Launch a ThreadWorker instance with *target* function and append to self.threads"""
 
@@ -198,24 +273,50 @@ class DAQProcess(Process):
         # Add to instance threads
         self.threads.append(thread)
 
-    def _launch_threads(self):
-        """Launch this instances threads. Must be called within the *run* method"""
+    def launch_daq(self, daq_func):
+        """Launch data acquisition which repeatedly calls *daq_func* in a separate thread, see *daq_thread*"""
+        self.launch_thread(target=self.daq_thread, daq_func=daq_func)
 
-        # Start command receiver thread
-        self.launch_thread(target=self.recv_cmd)
+    def daq_thread(self, daq_func):
+        """
+        Does data acquisition in separate thread, retrieving results and putting them into the outgoing queue
+        """
 
-        # Start command receiver thread
-        self.launch_thread(target=self.send_data)
+        internal_data_pub = self.create_internal_data_pub()
+
+        # Acquire data if not stop signal is set
+        while not self.stop_flags['__send__'].is_set():
+
+            meta, data = daq_func()
+
+            start = perf_counter()
+
+            # Put data into outgoing queue
+            self.send_internal(internal_data_pub, [self.serializer.dumps({'meta': meta, 'data': data})])
+
+            self.metrics.record('daq_publish', perf_counter() - start)
+
+    def _launch_threads(self):
+        """Launch this instances threads. Must be called within the *run* method"""
 
         # If there is data
         if len(self.daq_streams) > 0:
-            # Start data receiver thread
-            self.launch_thread(target=self.recv_data)
+            # Add data streams to event loop
+            self.recv_data()
 
         # If there are events
         if len(self.event_streams) > 0:
-            # Start data receiver thread
-            self.launch_thread(target=self.recv_event)
+            # Add event streams to event loop
+            self.recv_event()
+
+        # Start event loop thread which receives commands, data and events
+        self.launch_thread(target=self._event_loop)
+
+        # Start data sending thread
+        self.launch_thread(target=self.send_data)
+
+        # Start metrics publishing thread
+        self.launch_thread(target=self.send_metrics)
 
     def _setup_logging(self):
         """
@@ -258,49 +359,99 @@ class DAQProcess(Process):
         """
         return 'tcp://{}:{}'.format(ip, port)
 
-    def recv_cmd(self):
+    def _event_loop(self):
         """
-        Receiving commands at self.sockets['cmd']. This function is executed in an individual thread
-        on calling the process' *start* method. This enables to receive commands on self.sockets['cmd']
-        for setting up.
+        Event loop of the process which is executed in an individual thread on calling the process' *start* method.
+        A single poller multiplexes the command socket, all data and event streams and a wake-up socket. Polling blocks
+        without timeout until any socket is readable; *shutdown* and newly added streams wake the loop up.
         """
 
-        # Receive commands; wait 10 ms for stop flag
-        while not self.stop_flags['__recv__'].wait(1e-2):
+        poller = zmq.Poller()
+
+        self._loop_handlers[self._wakeup_pair[0]] = self._wakeup_pair[0].recv
+        self._loop_handlers[self.sockets['cmd']] = self.recv_cmd
+
+        for sock in self._loop_handlers:
+            poller.register(sock, zmq.POLLIN)
+
+        while not self.stop_flags['__recv__'].is_set():
+
+            # Add streams which were requested since the last iteration
+            while self._new_loop_streams:
+                sock, handler = self._new_loop_streams.popleft()
+                self._loop_handlers[sock] = handler
+                poller.register(sock, zmq.POLLIN)
+
+            # Wait for incoming messages; BLOCKING
+            for sock, _ in poller.poll():
+                self._call_loop_handler(self._loop_handlers[sock])
+
+        for sock in self._stream_sockets:
+            sock.close()
+
+    @staticmethod
+    def _call_loop_handler(handler):
+        """Call *handler* of the event loop; exceptions are logged so that a single bad message cannot stop the loop"""
+        try:
+            handler()
+        except Exception:
+            logging.exception(f"Handling message in '{getattr(handler, '__name__', handler)}' failed")
+
+    def _add_loop_socket(self, sock, handler):
+        """
+        Add a socket to the event loop; *handler* is called without arguments each time *sock* is readable
+        and must receive one message from it. Can be called from any thread
+        """
+        self._new_loop_streams.append((sock, handler))
+        self._wake_up()
 
-            # Check if were working on a command. We have to work sequentially
-            if not self.state_flags['__busy__'].is_set():
+    def _wake_up(self):
+        """Wake up the event loop; can be called from any thread"""
+        if self._wakeup_pair is not None:
+            with self._wakeup_lock:
+                self._wakeup_pair[1].send(b'')
 
-                # Poll the command receiver socket for 1 ms; continue if there are no commands
-                if not self.sockets['cmd'].poll(timeout=1, flags=zmq.POLLIN):
-                    continue
+    def recv_cmd(self):
+        """
+        Receive and handle a command at self.sockets['cmd']. Called by the event loop once a command arrived.
+        Commands are handled sequentially; *handle_cmd* blocks the event loop and should therefore return quickly.
+        """
 
-                logging.debug("Receiving command")
+        logging.debug("Receiving command")
 
-                # Cmd must be dict with command as 'cmd' key and 'args', 'kwargs' keys
-                cmd_dict = self.sockets['cmd'].recv_json()
+        # Cmd must be dict with command as 'cmd' key and 'args', 'kwargs' keys
+        self._handle_cmd_dict(cmd_dict=self.sockets['cmd'].recv_json())
 
-                # Command data
-                if 'data' not in cmd_dict:
-                    cmd_dict['data'] = None
+    def _handle_cmd_dict(self, cmd_dict):
+        """Check and handle a received command dict; a reply is sent in any case"""
 
-                error_reply = self._check_cmd(cmd_dict=cmd_dict)
+        # Command data
+        if 'data' not in cmd_dict:
+            cmd_dict['data'] = None
 
-                # Check for errors
-                if error_reply:
-                    self._send_reply(reply=error_reply, sender=self.pname, _type='ERROR', data=None)
-                else:
-                    logging.debug('Handling command {}'.format(cmd_dict['cmd']))
+        error_reply = self._check_cmd(cmd_dict=cmd_dict)
 
-                    # Set cmd to busy; other commands send will be queued and received later
-                    self.state_flags['__busy__'].set()
+        # Check for errors
+        if error_reply:
+            self._send_reply(reply=error_reply, sender=self.pname, _type='ERROR', data=None)
+        else:
+            logging.debug('Handling command {}'.format(cmd_dict['cmd']))
 
-                    self.handle_cmd(**cmd_dict)
+            # Set cmd to busy
+            self.state_flags['__busy__'].set()
 
-                # Check if a reply has been sent while handling the command. If not send generic reply which resets flag
+            try:
+                self.handle_cmd(**cmd_dict)
+            except Exception as e:
+                logging.exception(f"Handling command {cmd_dict['cmd']} failed")
+                # The REP socket must reply before it can receive the next command
                 if self.state_flags['__busy__'].is_set():
-                    self._send_reply(reply=cmd_dict['cmd'], sender=cmd_dict['target'], _type='STANDARD')
-                    # Now flag is cleared
+                    self._send_reply(reply=cmd_dict['cmd'], sender=cmd_dict['target'], _type='ERROR', data=repr(e))
+
+        # Check if a reply has been sent while handling the command. If not send generic reply which resets flag
+        if self.state_flags['__busy__'].is_set():
+            self._send_reply(reply=cmd_dict['cmd'], sender=cmd_dict['target'], _type='STANDARD')
+            # Now flag is cleared
 
     def _check_cmd(self, cmd_dict):
         """
@@ -362,26 +513,104 @@ class DAQProcess(Process):
     def send_data(self):
         """
         Send out data on the corresponding self.sockets['data']. The data is mostly gathered from
-        concurrent threads or other processes which publish to this instances *_internal_sub_addr*
+        concurrent threads or other processes which publish to this instances *_internal_sub_addr*.
+        Messages are forwarded as they are by a ZMQ proxy, without decoding or copying. The proxy blocks
+        until it is terminated via its control socket, see *_stop_send_data*
         """
 
         internal_data_sub = self.context.socket(zmq.SUB)
         internal_data_sub.bind(self._internal_sub_addr)
         internal_data_sub.setsockopt(zmq.SUBSCRIBE, b'')  # specify bytes for Py3
 
-        while not self.stop_flags['__send__'].is_set():  # Send data out as fast as possible
+        # Forward all messages from the internal subscriber to the data publisher; BLOCKING
+        # A TERMINATE which was sent before the proxy started is received right away
+        if not self.stop_flags['__send__'].is_set():
+            zmq.proxy_steerable(internal_data_sub, self.sockets['data'], None, self._send_data_control)
 
-            # Poll the command receiver socket for 1 ms; continue if there are no commands
-            if not internal_data_sub.poll(timeout=1, flags=zmq.POLLIN):
-                continue
+        internal_data_sub.close()
 
-            # Get outgoing data from internal subscriber socket
-            data = internal_data_sub.recv_json(zmq.NOBLOCK)
+    def send_metrics(self):
+        """
+        Publish a snapshot of the metrics of this process on self.sockets['metrics'] every *_metrics_interval*
+        seconds, see irrad_control.utils.metrics.Metrics.snapshot
+        """
 
-            # Send data on socket
-            self.sockets['data'].send_json(data)
+        while not self.stop_flags['__metrics__'].wait(self._metrics_interval):
+            self._publish_metrics()
 
-        internal_data_sub.close()
+    def _publish_metrics(self):
+        """Publish a snapshot of the metrics on self.sockets['metrics']; called in the thread of *send_metrics*"""
+
+        meta = {'timestamp': time(), 'name': self._metrics_source, 'pid': self.pid, 'type': 'metrics'}
+
+        self.sockets['metrics'].send(self.serializer.dumps({'meta': meta, 'data': self.metrics.snapshot()}))
+
+    def _handle_profile_cmd(self, target, cmd, data=None):
+        """
+        Start or stop sampling the call stacks of the threads of this process at runtime, see
+        irrad_control.utils.profiler.StackSampler. The data of 'profile_start' optionally holds the sampling
+        'interval' in seconds and the names of the 'threads' to sample. On 'profile_stop', the stacks are written
+        to the session folder if it exists on this host and are sent in the reply along with a summary
+
+        Parameters
+        ----------
+        target: str
+            Target of the command
+        cmd: str
+            Either 'profile_start' or 'profile_stop'
+        data: dict, None
+            Data of the command
+        """
+
+        running = self._profiler is not None and self._profiler.running
+
+        if cmd == 'profile_start':
+
+            if running:
+                self._send_reply(reply=cmd, _type='ERROR', sender=target, data='Profiler is already running')
+                return
+
+            data = data or {}
+
+            self._profiler = StackSampler(interval=data.get('interval', 0.01), threads=data.get('threads'))
+            self._profiler.start()
+
+            logging.info(f"Started profiling process {self.pname} every {self._profiler.interval * 1e3:.1f} ms")
+
+            self._send_reply(reply=cmd, _type='STANDARD', sender=target)
+
+        elif cmd == 'profile_stop':
+
+            if not running:
+                self._send_reply(reply=cmd, _type='ERROR', sender=target, data='Profiler is not running')
+                return
+
+            self._profiler.stop()
+
+            profile_file = None
+            outfolder = None if self.setup is None else self.setup['session'].get('outfolder')
+
+            if outfolder is not None and os.path.isdir(outfolder):
+                profile_file = os.path.join(outfolder, f"profile_{self.pname}_{strftime('%Y%m%d_%H%M%S')}.txt")
+                self._profiler.write(profile_file)
+
+            logging.info(f"Stopped profiling process {self.pname} after {self._profiler.n_samples} samples" +
+                         ("" if profile_file is None else f", stacks written to {profile_file}"))
+
+            reply_data = {'file': profile_file,
+                          'n_samples': self._profiler.n_samples,
+                          'duration': self._profiler.duration,
+                          'summary': self._profiler.summary(),
+                          'stacks': dict(self._profiler.stacks)}
+
+            self._send_reply(reply=cmd, _type='STANDARD', sender=target, data=reply_data)
+
+    def _stop_send_data(self):
+        """Terminate the proxy of *send_data*"""
+        if self._send_data_ctrl is not None:
+            with self._send_data_ctrl_lock:
+                if not self._send_data_ctrl.closed:
+                    self._send_data_ctrl.send(b'TERMINATE')
 
     def _add_stream(self, stream, stream_container):
         """
@@ -406,9 +635,10 @@ class DAQProcess(Process):
             if check_zmq_addr(strm) and strm not in stream_container:
                 stream_container.append(strm)
 
-    def _recv_from_stream(self, kind, stream, callback, pub_results=False, delay=None):
+    def _recv_from_stream(self, kind, stream, callback, pub_results=False, max_batch_size=None):
         """
-        Method which receives data from specific streams and calls a callback as well as publishes results internally.
+        Method which adds specific streams to the event loop, which receives from them and calls a callback as well as
+        publishes results internally.
 
         Parameters
         ----------
@@ -420,8 +650,9 @@ class DAQProcess(Process):
             Callable to be called on incoming packets
         pub_results : bool, optional
             Whther to create an internal publisher which send data via the 'send_data' method, by default False
-        delay : float, optional
-            Time in seconds sleep in between incoming data checks; useful save resources, by default None
+        max_batch_size : int, optional
+            If given, up to *max_batch_size* already queued packets are received at once and the callback is called
+            with a list of packets instead of a single packet, by default None
         """
 
         if stream:
@@ -438,37 +669,64 @@ class DAQProcess(Process):
             # Subscribe to all topics
             external_sub.setsockopt(zmq.SUBSCRIBE, b'')  # specify bytes for Py3
 
-            if pub_results:
-                internal_pub = self.create_internal_data_pub()
+            internal_pub = self.create_internal_data_pub() if pub_results else None
 
-            # While event not set receive data
-            while not self.stop_flags['__recv__'].is_set():
+            # Sockets are closed once the event loop ended
+            self._stream_sockets.extend(sock for sock in (external_sub, internal_pub) if sock is not None)
 
-                # Poll the socket for 1 ms; continue if there is nothing
-                if not external_sub.poll(timeout=1, flags=zmq.POLLIN):
-                    # Allow the thread to release the GIL while sleeping if we don't need to check for incoming stream data full-speed
-                    if delay is not None:
-                        sleep(delay)
-                    continue
+            def recv():
+
+                start = perf_counter()
 
                 # Get data
-                data = external_sub.recv_json(flags=zmq.NOBLOCK)
+                data = self.serializer.loads_frames(external_sub.recv_multipart(flags=zmq.NOBLOCK, copy=False))
+
+                # Drain packets which already queued up, without waiting for new ones
+                if max_batch_size is not None:
+                    data = [data]
+                    while len(data) < max_batch_size:
+                        try:
+                            data.append(self.serializer.loads_frames(external_sub.recv_multipart(flags=zmq.NOBLOCK, copy=False)))
+                        except zmq.Again:
+                            break
+
+                decoded = perf_counter()
 
                 # Callback for data
                 result = callback(data)
 
+                handled = perf_counter()
+
                 # Publish data
-                if pub_results:
+                if internal_pub is not None:
                     for res in result:
-                        internal_pub.send_json(res)
+                        self.send_internal(internal_pub, [self.serializer.dumps(res)])
+
+                self._record_recv_metrics(kind=kind, data=data, batched=max_batch_size is not None, timestamps=(start, decoded, handled, perf_counter()))
 
-            external_sub.close()
-            if pub_results:
-                internal_pub.close()
+            # Hand over to event loop
+            self._add_loop_socket(sock=external_sub, handler=recv)
 
         else:
             logging.error("No streams to connect to. Add streams via '_add_stream'-method")
 
+    def _record_recv_metrics(self, kind, data, batched, timestamps):
+        """
+        Record the metrics of receiving *data* from a *kind* stream. *timestamps* are the perf_counter values at
+        start, after decoding, after handling and after publishing. The number of packets received at once is the
+        depth of the queue of the stream
+        """
+
+        start, decoded, handled, published = timestamps
+
+        self.metrics.record(f'{kind}_decode', decoded - start)
+        self.metrics.record(f'{kind}_handle', handled - decoded)
+        self.metrics.record(f'{kind}_publish', published - handled)
+        self.metrics.count(f'{kind}_packets', len(data) if batched else 1)
+
+        if batched:
+            self.metrics.gauge(f'{kind}_queue', len(data))
+
     def add_daq_stream(self, daq_stream):
         """
         Method to add a data stream address to listen to to convert data from
@@ -482,7 +740,7 @@ class DAQProcess(Process):
         self._add_stream(stream=daq_stream, stream_container=self.daq_streams)
 
     def recv_data(self):
-        """Main method which receives raw data and calls interpretation and data storage methods"""
+        """Main method which receives raw data in the event loop and calls interpretation and data storage methods"""
         self._recv_from_stream(kind='data', stream=self.daq_streams, callback=self.handle_data, pub_results=True)
 
     def add_event_stream(self, event_stream):
@@ -498,8 +756,8 @@ class DAQProcess(Process):
         self._add_stream(stream=event_stream, stream_container=self.event_streams)
 
     def recv_event(self):
-        """Main method which receives events and calls handle event"""
-        self._recv_from_stream(kind='events', stream=self.event_streams, callback=self.handle_event, delay=1e-2)
+        """Main method which receives events in the event loop and calls handle event"""
+        self._recv_from_stream(kind='events', stream=self.event_streams, callback=self.handle_event)
 
     def shutdown(self, signum=None, frame=None):
         """
@@ -522,6 +780,12 @@ class DAQProcess(Process):
         for flag in self.stop_flags:
             self.stop_flags[flag].set()
 
+        # Stop forwarding data
+        self._stop_send_data()
+
+        # Stop event loop
+        self._wake_up()
+
     def _watch_threads(self):
         """
         Main function which is run: checks all the threads in which work is done and logs when an exception occurrs
@@ -529,25 +793,29 @@ class DAQProcess(Process):
 
         # Check threads until stop flag is set
         while not self.stop_flags['__watch__'].wait(1.0):
+            self._check_threads()
+
+    def _check_threads(self):
+        """Check whether exceptions have occurred in any of the threads and remove threads which are done"""
 
-            # Loop over all threads and check whether exceptions have occurred
-            for thread in self.threads:
+        # Loop over all threads and check whether exceptions have occurred
+        for thread in self.threads:
 
-                is_alive = thread.is_alive()
+            is_alive = thread.is_alive()
 
-                # If an exception occurred and has not yet been reported
-                if thread.exception is not None:
+            # If an exception occurred and has not yet been reported
+            if thread.exception is not None:
 
-                    # Construct error message
-                    msg = "A {} exception occurred in thread executing function '{}':\n".format(type(thread.exception).__name__, thread.name)
-                    msg += "{}\nThread is currently {}alive ".format(thread.traceback_str, '' if is_alive else 'not ')
+                # Construct error message
+                msg = "A {} exception occurred in thread executing function '{}':\n".format(type(thread.exception).__name__, thread.name)
+                msg += "{}\nThread is currently {}alive ".format(thread.traceback_str, '' if is_alive else 'not ')
 
-                    # Log message
-                    logging.error(msg)
+                # Log message
+                logging.error(msg)
 
-                # Remove thread object from container for garbage collection
-                if not is_alive:
-                    self.threads.remove(thread)
+            # Remove thread object from container for garbage collection
+            if not is_alive:
+                self.threads.remove(thread)
 
     def _close(self):
 
@@ -555,6 +823,12 @@ class DAQProcess(Process):
         for t in self.threads:
             t.join()
 
+        # The proxy of *send_data* has been terminated; inproc messages of a closed socket may be discarded
+        # before they are received, therefore the control sockets are only closed now
+        with self._send_data_ctrl_lock:
+            self._send_data_ctrl.close()
+        self._send_data_control.close()
+
         # Close action
         self._remove_pid_file()
 
@@ -1,3 +1,4 @@
+import os
 import sys
 import time
 import logging
@@ -10,9 +11,10 @@ from threading import Event
 # Package imports
 from irrad_control.utils.logger import CustomHandler, LoggingStream, log_levels
 from irrad_control.utils.worker import QtWorker
+from irrad_control.utils.serializer import Serializer
 from irrad_control.utils.proc_manager import ProcessManager
 from irrad_control.utils.utils import get_current_git_branch
-from irrad_control.gui.widgets import DaqInfoWidget, LoggingWidget, EventWidget
+from irrad_control.gui.widgets import DaqInfoWidget, LoggingWidget, EventWidget, MetricsWidget
 from irrad_control.gui.tabs import IrradSetupTab, IrradControlTab, IrradMonitorTab
 
 
@@ -28,6 +30,7 @@ class IrradGUI(QtWidgets.QMainWindow):
     log_received = QtCore.pyqtSignal(dict)  # Signal for log
     event_received = QtCore.pyqtSignal(dict)  # Signal for events
     reply_received = QtCore.pyqtSignal(dict)  # Signal for reply
+    metrics_received = QtCore.pyqtSignal(dict)  # Signal for metrics
 
     def __init__(self, parent=None):
         super(IrradGUI, self).__init__(parent)
@@ -62,6 +65,7 @@ class IrradGUI(QtWidgets.QMainWindow):
         self.log_received.connect(lambda log: self.handle_log(log))
         self.event_received.connect(lambda event: self.handle_event(event))
         self.reply_received.connect(lambda reply: self.handle_reply(reply))
+        self.metrics_received.connect(lambda metrics: self.handle_metrics(metrics))
 
         # Tab widgets
         self.setup_tab = None
@@ -133,6 +137,14 @@ class IrradGUI(QtWidgets.QMainWindow):
         self.appearance_menu.addAction('&Show/hide DAQ dock', self.handle_daq_ui, QtCore.Qt.CTRL + QtCore.Qt.Key_D)
         self.menuBar().addMenu(self.appearance_menu)
 
+        self.debug_menu = QtWidgets.QMenu('&Debug', self)
+        self.debug_menu.setToolTipsVisible(True)
+        self.profile_action = self.debug_menu.addAction('&Profile DAQ processes')
+        self.profile_action.setCheckable(True)
+        self.profile_action.setToolTip('Sample the call stacks of the server(s) and the converter; stacks are written to the session folder')
+        self.profile_action.toggled.connect(self.handle_profiling)
+        self.menuBar().addMenu(self.debug_menu)
+
     def _init_tabs(self):
         """
         Initializes the tabs for the control window
@@ -196,10 +208,12 @@ class IrradGUI(QtWidgets.QMainWindow):
         # Widget to display log in, we only want to read log
         self.log_widget = LoggingWidget()
         self.event_widget = EventWidget()
+        self.metrics_widget = MetricsWidget()
 
         info_tabs = QtWidgets.QTabWidget()
         info_tabs.addTab(self.log_widget, 'Log')
         info_tabs.addTab(self.event_widget, 'Event')
+        info_tabs.addTab(self.metrics_widget, 'Metrics')
         
         # Dock in which text widget is placed to make it closable without losing log content
         self.info_dock = QtWidgets.QDockWidget()
@@ -260,7 +274,7 @@ class IrradGUI(QtWidgets.QMainWindow):
     def _init_recv_threads(self):
 
         # Start receiving data, events and log messages from other processes
-        for recv_func in (self.recv_data, self.recv_event, self.recv_log):
+        for recv_func in (self.recv_data, self.recv_event, self.recv_log, self.recv_metrics):
             self.threadpool.start(QtWorker(func=recv_func))
 
     def _init_processes(self):
@@ -445,6 +459,12 @@ class IrradGUI(QtWidgets.QMainWindow):
     def handle_event(self, event_data):
         event_data['server'] = self.setup['server'][event_data['server']]['name']
         self.event_widget.register_event(event_dict=event_data)
+
+    def handle_metrics(self, metrics):
+        # Servers publish their metrics under their IP
+        process = metrics['meta']['name']
+        process = self.setup['server'][process]['name'] if process in self.setup['server'] else process
+        self.metrics_widget.update_metrics(process=process, metrics=metrics['data'])
     
     def handle_data(self, data):
 
@@ -621,6 +641,9 @@ class IrradGUI(QtWidgets.QMainWindow):
 
                     logging.info("Server at {} confirmed shutdown".format(hostname))
 
+                elif reply == 'profile_stop':
+                    self._store_profile(hostname=hostname, reply_data=reply_data)
+
                 elif reply == 'motorstages':
                     for ms, ms_config in reply_data.items():
                         self.control_tab.tab_widgets[hostname]['motorstage'].add_motorstage(motorstage=ms,
@@ -651,6 +674,9 @@ class IrradGUI(QtWidgets.QMainWindow):
 
                     logging.info("Interpreter confirmed shutdown")
 
+                if reply == 'profile_stop':
+                    self._store_profile(hostname=hostname, reply_data=reply_data)
+
             elif sender == '__scan__':
 
                 if reply == 'setup_scan':
@@ -732,10 +758,13 @@ class IrradGUI(QtWidgets.QMainWindow):
                 pass
 
     def recv_event(self):
-        self._recv_from_stream(stream='event', recv_func='recv_json', emit_signal=self.event_received)
+        self._recv_from_stream(stream='event', recv_func='recv_multipart', emit_signal=self.event_received, callback=Serializer.loads_frames)
 
     def recv_data(self):
-        self._recv_from_stream(stream='data', recv_func='recv_json', emit_signal=self.data_received)
+        self._recv_from_stream(stream='data', recv_func='recv_multipart', emit_signal=self.data_received, callback=Serializer.loads_frames)
+
+    def recv_metrics(self):
+        self._recv_from_stream(stream='metrics', recv_func='recv_multipart', emit_signal=self.metrics_received, callback=Serializer.loads_frames)
 
     def recv_log(self):
 
@@ -754,6 +783,39 @@ class IrradGUI(QtWidgets.QMainWindow):
 
         self._recv_from_stream(stream='log', recv_func='recv', emit_signal=self.log_received, callback=callback)
 
+    def handle_profiling(self, enable):
+        """Start or stop profiling all server(s) and the converter"""
+
+        if not self._procs_launched:
+            logging.warning("No DAQ processes to profile")
+            self.profile_action.blockSignals(True)
+            self.profile_action.setChecked(False)
+            self.profile_action.blockSignals(False)
+            return
+
+        cmd = 'profile_start' if enable else 'profile_stop'
+
+        for server in self.setup['server']:
+            self.send_cmd(hostname=server, target='server', cmd=cmd)
+
+        self.send_cmd(hostname='localhost', target='interpreter', cmd=cmd)
+
+    def _store_profile(self, hostname, reply_data):
+        """Write the profile of the process on *hostname* to the session folder, unless the process did itself"""
+
+        name = 'converter' if hostname not in self.setup['server'] else self.setup['server'][hostname]['name']
+
+        profile_file = reply_data['file']
+
+        if profile_file is None:
+            profile_file = os.path.join(self.setup['session']['outfolder'], f"profile_{name}_{time.strftime('%Y%m%d_%H%M%S')}.txt")
+            with open(profile_file, 'w') as pf:
+                for stack, count in sorted(reply_data['stacks'].items()):
+                    pf.write(f"{stack} {count}\n")
+
+        top = '\n'.join(f"\t{100. * count / total:.1f} % {func} ({thread})" for func, thread, count, total in reply_data['summary'])
+        logging.info(f"Profile of {name} with {reply_data['n_samples']} samples written to {profile_file}. Most sampled functions:\n{top}")
+
     def handle_messages(self, message, ms=4000):
         """Handles messages from the tabs shown in QMainWindows statusBar"""
 
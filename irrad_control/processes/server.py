@@ -1,5 +1,7 @@
+import zmq
 import logging
-from time import time, sleep
+import numpy as np
+from time import time, sleep, perf_counter
 from serial import SerialException
 
 # Package imports
@@ -9,6 +11,7 @@ from irrad_control.devices.motorstage.base_axis import BaseAxis, BaseAxisTracker
 from irrad_control.utils.dut_scan import DUTScan
 from irrad_control.devices.readout import RO_DEVICES
 from irrad_control.processes.daq import DAQProcess
+from irrad_control.processes.async_daq import AsyncDAQProcess
 from irrad_control.utils.events import create_irrad_events
 
 
@@ -37,6 +40,7 @@ class IrradServer(DAQProcess):
         self.server = setup['server']
         self.setup = setup['setup']
         self.name = setup['setup']['server'][self.server]['name']
+        self._metrics_source = self.server
 
         # Overwrite server setup with our server
         self.setup['server'] = self.setup['server'][self.server]
@@ -44,6 +48,8 @@ class IrradServer(DAQProcess):
         # Setup logging
         self._setup_logging()
 
+        self._setup_serializer()
+
         self._init_devices()
 
         self._setup_devices()
@@ -52,7 +58,7 @@ class IrradServer(DAQProcess):
 
         # Listen to events from converter
         self.add_event_stream(event_stream=self._tcp_addr(ip=self.setup['host'], port=self.setup['ports']['event']))
-        self.launch_thread(target=self.recv_event)
+        self.recv_event()
 
     def _init_devices(self):
 
@@ -164,20 +170,46 @@ class IrradServer(DAQProcess):
             # Add custom methods for being able to pause/resume data sending
             self.devices['RadiationMonitor']._send_data = lambda send: getattr(self.stop_flags['wait_rad_mon'], 'set' if send else 'clear')()
 
-    def daq_thread(self, daq_func):
+    def adc_block_daq_thread(self, block_size, n_buffers=4, tracker_timeout=0.1):
         """
-        Does data acquisition in separate thread, retrieving results and putting them into the outgoing queue
+        Does block-wise data acquisition of the ADC in separate thread. Blocks of *block_size* samples per channel are
+        read into preallocated arrays and published as multipart message of header and raw buffer without copying.
+        A buffer is refilled only once ZMQ released it, therefore *n_buffers* blocks can be in flight at once. While
+        waiting for a buffer, the stop flag is checked every *tracker_timeout* seconds.
         """
 
         internal_data_pub = self.create_internal_data_pub()
 
-        # Acquire data if not stop signal is set
+        channels = self.setup['server']['readout']['channels']
+
+        _meta = {'name': self.server, 'type': 'raw_data_block', 'columns': ['timestamp'] + channels}
+
+        buffers = [np.zeros(shape=(block_size, 1 + len(channels)), dtype=np.float64) for _ in range(n_buffers)]
+        trackers = [None] * n_buffers
+
+        i = 0
         while not self.stop_flags['__send__'].is_set():
 
-            meta, data = daq_func()
+            # Wait until ZMQ released the buffer; messages can be stuck e.g. at the high-water mark, check for shutdown meanwhile
+            while trackers[i] is not None:
+                try:
+                    trackers[i].wait(timeout=tracker_timeout)
+                    trackers[i] = None
+                except zmq.NotDone:
+                    if self.stop_flags['__send__'].is_set():
+                        return
+
+            block = self.devices['ADCBoard'].read_channels_block(out=buffers[i])
+
+            _meta['timestamp'] = float(block[0, 0])
+
+            start = perf_counter()
 
-            # Put data into outgoing queue
-            internal_data_pub.send_json({'meta': meta, 'data': data})
+            trackers[i] = self.send_internal(internal_data_pub, self.serializer.dumps_array(meta=_meta, array=block), copy=False, track=True)
+
+            self.metrics.record('daq_publish', perf_counter() - start)
+
+            i = (i + 1) % n_buffers
 
     def _launch_daq_threads(self):
 
@@ -185,13 +217,18 @@ class IrradServer(DAQProcess):
 
             # Start data sending thread
             if dev == 'ADCBoard':
-                self.launch_thread(target=self.daq_thread, daq_func=self._daq_adc)
+                # Block acquisition; the NTC readout of the IrradDAQBoard switches channels in between samples and needs single samples
+                block_size = self.setup['server']['readout'].get('block_size', 1)
+                if block_size > 1 and not self._daq_board_ntc_ro:
+                    self.launch_thread(target=self.adc_block_daq_thread, block_size=block_size)
+                else:
+                    self.launch_daq(daq_func=self._daq_adc)
 
             elif dev == 'ArduinoNTCReadout':
-                self.launch_thread(target=self.daq_thread, daq_func=self._daq_temp)
+                self.launch_daq(daq_func=self._daq_temp)
 
             elif dev == 'RadiationMonitor':
-                self.launch_thread(target=self.daq_thread, daq_func=self._daq_rad_monitor)
+                self.launch_daq(daq_func=self._daq_rad_monitor)
 
     def _daq_adc(self):
         """
@@ -306,6 +343,9 @@ class IrradServer(DAQProcess):
             elif cmd == 'toggle_event':
                 self.irrad_events[data['event']].value.disabled = data['disabled']
 
+            elif cmd in ('profile_start', 'profile_stop'):
+                self._handle_profile_cmd(target=target, cmd=cmd, data=data)
+
         else:
             logging.error(f"Command {cmd} with target {target} does not exist for server {self.name}.")
             self._send_reply(reply=cmd, _type='ERROR', sender=target)
@@ -335,9 +375,14 @@ class IrradServer(DAQProcess):
                 self.devices[dev].shutdown()
 
 
-def run(blocking=True):
+class AsyncIrradServer(AsyncDAQProcess, IrradServer):
+    """IrradServer running on an asyncio event loop, see AsyncDAQProcess"""
+    pass
+
+
+def run(blocking=True, asynchronous=False):
 
-    irrad_server = IrradServer()
+    irrad_server = AsyncIrradServer() if asynchronous else IrradServer()
     irrad_server.start()
     
     if blocking:
@@ -0,0 +1,107 @@
+import math
+import threading
+from time import time
+from collections import defaultdict
+
+
+class TimingHistogram(object):
+    """
+    Histogram of durations in bins of powers of two: bin 0 counts durations below 1 µs, bin i durations within
+    [2**(i-1), 2**i) µs. Adding a duration is O(1) and the memory is fixed, independent of the number of durations.
+    Quantiles are estimated by the upper edge of the bin in which they fall.
+    """
+
+    N_BINS = 32  # The last bin collects durations above ~18 min
+
+    def __init__(self):
+        self.counts = [0] * self.N_BINS
+        self.n = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, duration):
+        """Add a *duration* in seconds"""
+
+        us = duration * 1e6
+
+        self.counts[min(math.frexp(us)[1], self.N_BINS - 1) if us >= 1 else 0] += 1
+        self.n += 1
+        self.total += duration
+        self.max = max(self.max, duration)
+
+    def quantile(self, q):
+        """Estimate the *q*-quantile of the durations in seconds"""
+
+        if not self.n:
+            return float('nan')
+
+        threshold, cumulative = q * self.n, 0
+
+        for i, count in enumerate(self.counts):
+            cumulative += count
+            if cumulative >= threshold:
+                return min(2 ** i * 1e-6, self.max)
+
+        return self.max
+
+    def to_dict(self):
+        return {'count': self.n,
+                'mean': self.total / self.n if self.n else float('nan'),
+                'max': self.max,
+                'p50': self.quantile(0.5),
+                'p90': self.quantile(0.9),
+                'p99': self.quantile(0.99),
+                'counts': list(self.counts)}
+
+
+class Metrics(object):
+    """
+    Thread-safe collection of metrics of the hot paths of a process: timing histograms per stage, counters and
+    gauges. Metrics are collected from the last *snapshot* on, which returns and resets them. Recording costs a
+    lock and a few arithmetic operations, so instrumentation can stay enabled at full data rate.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._timings = defaultdict(TimingHistogram)
+        self._counters = defaultdict(int)
+        self._gauges = {}
+        self._start = time()
+
+    def record(self, stage, duration):
+        """Add the *duration* in seconds of one pass through *stage*"""
+        with self._lock:
+            self._timings[stage].add(duration)
+
+    def count(self, name, n=1):
+        """Increase counter *name* by *n*"""
+        with self._lock:
+            self._counters[name] += n
+
+    def gauge(self, name, value):
+        """Set gauge *name* to *value*; the maximum value since the last snapshot is kept"""
+        with self._lock:
+            self._gauges[name] = max(value, self._gauges.get(name, value))
+
+    def snapshot(self):
+        """
+        Return the metrics collected since the last snapshot and reset them
+
+        Returns
+        -------
+        dict
+            Length of the collection 'interval' in seconds, 'timings' per stage, see TimingHistogram.to_dict,
+            'counters' and peak values of 'gauges'
+        """
+
+        with self._lock:
+            timings, counters, gauges, start = self._timings, self._counters, self._gauges, self._start
+            self._reset()
+
+        return {'interval': self._start - start,
+                'timings': {stage: hist.to_dict() for stage, hist in timings.items()},
+                'counters': dict(counters),
+                'gauges': gauges}
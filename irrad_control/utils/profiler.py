@@ -0,0 +1,126 @@
+import os
+import sys
+import threading
+from time import time, perf_counter
+from collections import Counter
+
+
+class StackSampler(object):
+    """
+    Sampling profiler which periodically records the call stacks of the threads of the running process from a
+    dedicated thread, using sys._current_frames. Neither the sampled threads nor signal handlers are touched, so
+    it can be started and stopped at any time; the overhead is a short hold of the GIL per sample.
+
+    Stacks are aggregated in the collapsed format of flame graphs: one line per unique stack of a thread, frames
+    from the outermost to the innermost separated by ';', followed by the number of samples.
+
+    Parameters
+    ----------
+    interval : float
+        Seconds between samples
+    threads : iterable, None
+        Names of the threads to sample. If None, sample all threads except the sampler itself
+    """
+
+    def __init__(self, interval=0.01, threads=None):
+
+        self.interval = interval
+        self.threads = None if threads is None else set(threads)
+
+        self.stacks = Counter()
+        self.n_samples = 0
+        self.duration = 0.0
+
+        self._stop = threading.Event()
+        self._thread = None
+        self._start = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Start sampling in a daemon thread"""
+
+        self._stop.clear()
+        self._start = time()
+        self._thread = threading.Thread(target=self._run, name='StackSampler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop sampling and wait for the sampler thread"""
+
+        self._stop.set()
+        self._thread.join()
+        self.duration = time() - self._start
+
+    @staticmethod
+    def _frame_name(frame):
+        code = frame.f_code
+        return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+    def sample(self):
+        """Record the current stacks of the sampled threads"""
+
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        own = threading.get_ident()
+
+        for ident, frame in sys._current_frames().items():
+
+            name = names.get(ident, str(ident))
+
+            if ident == own or (self.threads is not None and name not in self.threads):
+                continue
+
+            stack = []
+            while frame is not None:
+                stack.append(self._frame_name(frame))
+                frame = frame.f_back
+
+            self.stacks[';'.join([name] + stack[::-1])] += 1
+
+        self.n_samples += 1
+
+    def _run(self):
+
+        next_sample = perf_counter()
+
+        while not self._stop.is_set():
+
+            self.sample()
+
+            # Keep the sampling rate if sampling itself takes a while
+            next_sample = max(next_sample + self.interval, perf_counter())
+            self._stop.wait(next_sample - perf_counter())
+
+    def summary(self, n=10):
+        """
+        Functions in which most samples were taken
+
+        Parameters
+        ----------
+        n : int
+            Number of functions to return
+
+        Returns
+        -------
+        list
+            Up to *n* tuples of function, thread, samples in the function itself and total samples of the thread,
+            in descending order of samples
+        """
+
+        own, total = Counter(), Counter()
+
+        for stack, count in self.stacks.items():
+            frames = stack.split(';')
+            own[(frames[-1], frames[0])] += count
+            total[frames[0]] += count
+
+        return [(func, thread, count, total[thread]) for (func, thread), count in own.most_common(n)]
+
+    def write(self, path):
+        """Write the stacks in collapsed format to *path*, e.g. to be rendered by flamegraph.pl or speedscope"""
+
+        with open(path, 'w') as out_file:
+            for stack, count in sorted(self.stacks.items()):
+                out_file.write(f"{stack} {count}\n")
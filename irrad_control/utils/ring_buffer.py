@@ -0,0 +1,121 @@
+import numpy as np
+
+
+class RingBuffer(object):
+    """
+    Circular buffer of fixed size for structured data with O(1) appends. Entries are kept in chronological order.
+    Each entry is written twice, *size* entries apart, so the latest entries are always available as one contiguous
+    view of the underlying array, without copying or rolling data.
+
+    Parameters
+    ----------
+    size : int
+        Maximum number of entries; once full, the oldest entry is overwritten on append
+    dtype : numpy.dtype
+        Structured dtype of the entries
+    time_field : str, optional
+        Name of the field holding ascending timestamps, used for time-window queries, by default 'timestamp'
+    """
+
+    def __init__(self, size, dtype, time_field='timestamp'):
+
+        if int(size) < 1:
+            raise ValueError("Size of ring buffer must be at least 1")
+
+        self.size = int(size)
+        self.dtype = np.dtype(dtype)
+        self.time_field = time_field
+
+        self._buffer = np.zeros(shape=2 * self.size, dtype=self.dtype)
+        self._head = 0  # Index to which the next entry is written
+        self._n_entries = 0
+
+    def __len__(self):
+        return self._n_entries
+
+    @property
+    def full(self):
+        return self._n_entries == self.size
+
+    def append(self, entry):
+        """
+        Append an entry; overwrites the oldest entry if the buffer is full
+
+        Parameters
+        ----------
+        entry : tuple, numpy.void
+            Entry of self.dtype
+        """
+        self._buffer[self._head] = self._buffer[self._head + self.size] = entry
+        self._head = (self._head + 1) % self.size
+        self._n_entries = min(self._n_entries + 1, self.size)
+
+    def clear(self):
+        self._head = self._n_entries = 0
+
+    def latest(self):
+        """Returns the latest entry"""
+        if not self._n_entries:
+            raise IndexError("Ring buffer is empty")
+        return self._buffer[self._head + self.size - 1]
+
+    def view(self, n=None):
+        """
+        Returns a contiguous view of the latest *n* entries in chronological order
+
+        Parameters
+        ----------
+        n : int, optional
+            Number of latest entries, by default None which returns all entries
+
+        Returns
+        -------
+        numpy.ndarray
+            View into the buffer; only valid until the next append
+        """
+        n = self._n_entries if n is None else max(0, min(n, self._n_entries))
+        stop = self._head + self.size
+        return self._buffer[stop - n:stop]
+
+    def window(self, t_start=None, t_stop=None):
+        """
+        Returns a contiguous view of the entries with t_start < timestamp <= t_stop in chronological order
+
+        Parameters
+        ----------
+        t_start : float, optional
+            Exclusive lower bound of the time window, by default None which is unbounded
+        t_stop : float, optional
+            Inclusive upper bound of the time window, by default None which is unbounded
+
+        Returns
+        -------
+        numpy.ndarray
+            View into the buffer; only valid until the next append
+        """
+        entries = self.view()
+        timestamps = entries[self.time_field]
+
+        start_idx = 0 if t_start is None else np.searchsorted(timestamps, t_start, side='right')
+        stop_idx = entries.shape[0] if t_stop is None else np.searchsorted(timestamps, t_stop, side='right')
+
+        return entries[start_idx:stop_idx]
+
+    def last_before(self, t_stop, n):
+        """
+        Returns a contiguous view of the latest *n* entries with timestamp <= t_stop in chronological order
+
+        Parameters
+        ----------
+        t_stop : float
+            Inclusive upper bound of the timestamps
+        n : int
+            Maximum number of entries
+
+        Returns
+        -------
+        numpy.ndarray
+            View into the buffer; only valid until the next append
+        """
+        entries = self.window(t_stop=t_stop)
+        return entries[max(0, entries.shape[0] - n):]
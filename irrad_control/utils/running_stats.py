@@ -0,0 +1,98 @@
+import math
+from collections import deque
+
+
+class SlidingWindowStats(object):
+    """
+    Mean and standard deviation of a stream of samples within a sliding time window. Running sums are updated
+    with every sample and corrected for samples leaving the window, so each update is O(1) independent of the
+    window length and the data rate. NaN values are ignored, like in numpy.nanmean and numpy.nanstd.
+
+    Parameters
+    ----------
+    window : float
+        Length of the time window in seconds; a sample at *t* is in the window of the latest sample at *t_latest*
+        if t > t_latest - window
+    """
+
+    def __init__(self, window):
+
+        self.window = window
+
+        self._samples = deque()
+
+        # Running sums are taken relative to a reference value to limit cancellation in the variance
+        self._ref = 0.0
+        self._sum = 0.0
+        self._sum_sq = 0.0
+
+        # Number of updates since the sums were last computed from scratch
+        self._n_updates = 0
+
+    def __len__(self):
+        return len(self._samples)
+
+    @property
+    def mean(self):
+        n = len(self._samples)
+        return self._ref + self._sum / n if n else float('nan')
+
+    @property
+    def std(self):
+        n = len(self._samples)
+        if not n:
+            return float('nan')
+        return math.sqrt(max(self._sum_sq / n - (self._sum / n) ** 2, 0.0))
+
+    def update(self, timestamp, value):
+        """
+        Add a sample and remove samples which left the window
+
+        Parameters
+        ----------
+        timestamp : float
+            Timestamp of the sample in seconds; must not decrease between updates
+        value : float
+            Value of the sample
+        """
+        self.expire(t_min=timestamp - self.window)
+
+        value = float(value)
+
+        if not math.isnan(value):
+            if not self._samples:
+                self._ref = value
+            self._samples.append((timestamp, value))
+            self._sum += value - self._ref
+            self._sum_sq += (value - self._ref) ** 2
+
+        # Rounding errors of adding and removing accumulate; recompute the sums once all samples have been renewed
+        self._n_updates += 1
+        if self._n_updates > len(self._samples):
+            self._resum()
+
+    def expire(self, t_min):
+        """Remove all samples with timestamps <= *t_min*"""
+
+        while self._samples and self._samples[0][0] <= t_min:
+            _, value = self._samples.popleft()
+            self._sum -= value - self._ref
+            self._sum_sq -= (value - self._ref) ** 2
+
+        if not self._samples:
+            self.clear()
+
+    def clear(self):
+        self._samples.clear()
+        self._ref = self._sum = self._sum_sq = 0.0
+        self._n_updates = 0
+
+    def _resum(self):
+
+        if self._samples:
+            # Use the latest sample as reference; it is closest to the upcoming samples
+            self._ref = self._samples[-1][1]
+            self._sum = math.fsum(value - self._ref for _, value in self._samples)
+            self._sum_sq = math.fsum((value - self._ref) ** 2 for _, value in self._samples)
+
+        self._n_updates = 0
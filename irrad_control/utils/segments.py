@@ -0,0 +1,143 @@
+import os
+import glob
+import logging
+import tables as tb
+
+
+def segment_dir(out_file):
+    """Directory of the segments of the output file *out_file*, given without extension"""
+    return out_file + '_segments'
+
+
+def segment_path(seg_dir, index):
+    """Path of the segment with number *index* in *seg_dir*"""
+    return os.path.join(seg_dir, f'segment_{index:04d}.h5')
+
+
+def fsync_file(path):
+    """Write the content of the file at *path* to disk"""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def copy_layout(src, dst, skip_arrays=('hist',)):
+    """
+    Create the groups, empty tables and arrays of *src* in *dst*. Tables keep their description, filters
+    and chunk shape.
+
+    Parameters
+    ----------
+    src : tables.File
+        File to copy the layout from
+    dst : tables.File
+        File to create the layout in
+    skip_arrays : tuple, optional
+        Names of arrays which are not copied, by default ('hist',) which are written once the data is complete
+    """
+
+    for node in src.walk_nodes('/'):
+
+        if node is src.root:
+            continue
+
+        parent = node._v_parent._v_pathname
+
+        if isinstance(node, tb.Group):
+            dst.create_group(parent, node._v_name)
+
+        elif isinstance(node, tb.Table):
+            dst.create_table(parent, node._v_name, description=node.description, filters=node.filters, chunkshape=node.chunkshape)
+
+        elif isinstance(node, tb.Array) and node._v_name not in skip_arrays:
+            dst.create_array(parent, node._v_name, node.read())
+
+
+def create_segment(path, template):
+    """
+    Create a segment at *path* with the layout of the open output file *template*
+
+    Returns
+    -------
+    tables.File
+        Segment opened for writing
+    """
+
+    segment = tb.open_file(path, 'w')
+
+    copy_layout(src=template, dst=segment)
+
+    return segment
+
+
+def consolidate_segments(seg_dir, out_file):
+    """
+    Merge the segments in *seg_dir* into a single output file of the same layout. Rows of all tables are
+    concatenated in order of the segments. Histograms are cumulative and are taken from the latest segment
+    containing them. Unreadable segments, e.g. the last one after a crash, are skipped.
+
+    Parameters
+    ----------
+    seg_dir : str
+        Directory containing the segments
+    out_file : str
+        Path of the consolidated output file
+
+    Returns
+    -------
+    int
+        Number of merged segments
+    """
+
+    segments = sorted(glob.glob(os.path.join(seg_dir, 'segment_*.h5')))
+
+    if not segments:
+        raise ValueError(f"No segments found in {seg_dir}")
+
+    n_merged = 0
+
+    with tb.open_file(out_file, 'w') as out:
+
+        # Histograms are cumulative; the ones of the latest readable segment are kept
+        hists = {}
+
+        for seg in segments:
+
+            # Read the whole segment first; a segment truncated by a crash may open fine but fail on reading
+            try:
+                with tb.open_file(seg) as in_file:
+
+                    rows = {table._v_pathname: table.read() for table in in_file.walk_nodes('/', classname='Table')}
+                    seg_hists = {array._v_parent._v_pathname: array.read()
+                                 for array in in_file.walk_nodes('/', classname='Array') if array._v_name == 'hist'}
+
+                    if n_merged == 0:
+                        copy_layout(src=in_file, dst=out)
+
+            except Exception as e:
+                logging.warning(f"Skipping unreadable segment {seg}: {type(e).__name__}")
+                continue
+
+            for node, data in rows.items():
+                out.get_node(node).append(data)
+
+            if seg_hists:
+                hists = seg_hists
+
+            n_merged += 1
+
+            logging.info(f"Merged segment {seg}")
+
+        # Segments are removed after consolidation; make sure this fails
+        if n_merged == 0:
+            raise ValueError(f"No readable segments in {seg_dir}")
+
+        if hists:
+            for where, hist in hists.items():
+                out.create_array(where, 'hist', hist)
+        else:
+            logging.warning("No segment contains histograms")
+
+    return n_merged
@@ -0,0 +1,139 @@
+import json
+import logging
+import numpy as np
+
+
+# msgpack is optional; without it, all messages are encoded as JSON
+_MSGPACK = True
+try:
+    import msgpack
+except ModuleNotFoundError:
+    _MSGPACK = False
+
+
+def _dumps_json(obj):
+    return json.dumps(obj).encode('utf8')
+
+
+def _loads_json(msg):
+    return json.loads(msg)
+
+
+def _dumps_msgpack(obj):
+    # Floats are packed as binary doubles; no conversion to and from text
+    return msgpack.packb(obj, use_bin_type=True)
+
+
+def _loads_msgpack(msg):
+    if not _MSGPACK:
+        raise ValueError("Received binary message but 'msgpack' is not installed")
+    return msgpack.unpackb(msg, raw=False, strict_map_key=False)
+
+
+# Available codecs of the data and event streams with their (dumps, loads) functions
+CODECS = {'json': (_dumps_json, _loads_json)}
+
+if _MSGPACK:
+    CODECS['msgpack'] = (_dumps_msgpack, _loads_msgpack)
+
+
+def detect_codec(msg):
+    """
+    Returns the name of the codec with which *msg* was encoded. JSON messages are objects or arrays and start
+    with '{' or '['; msgpack encodes maps and arrays with a leading byte >= 0x80, so both are distinguishable.
+
+    Parameters
+    ----------
+    msg : bytes
+        Encoded message
+
+    Returns
+    -------
+    str
+        Name of codec
+    """
+    return 'json' if msg[:1] in (b'{', b'[') else 'msgpack'
+
+
+class Serializer(object):
+    """
+    Encodes outgoing messages with the codec negotiated via the session setup and decodes incoming messages of
+    any codec. Decoding is independent of the configured codec, so processes with differing codecs e.g. due to a
+    missing optional dependency, still understand each other.
+
+    Parameters
+    ----------
+    codec : str, optional
+        Name of the codec used to encode messages, one of CODECS, by default 'json'
+    """
+
+    def __init__(self, codec='json'):
+
+        if codec not in CODECS:
+            logging.warning(f"Serialization codec '{codec}' not available, falling back to 'json'")
+            codec = 'json'
+
+        self.codec = codec
+
+        # Encode function of the codec
+        self.dumps = CODECS[codec][0]
+
+    @staticmethod
+    def loads(msg):
+        """
+        Decodes a message of any known codec
+
+        Parameters
+        ----------
+        msg : bytes
+            Encoded message
+
+        Returns
+        -------
+        object
+            Decoded message
+        """
+        return _loads_json(msg) if detect_codec(msg) == 'json' else _loads_msgpack(msg)
+
+    def dumps_array(self, meta, array):
+        """
+        Encodes a NumPy array as multipart message of a header frame, holding *meta* and the layout of the array,
+        and a frame holding the raw buffer of the array. The array is not copied; send the frames with copy=False
+
+        Parameters
+        ----------
+        meta : dict
+            Meta data of the message
+        array : numpy.ndarray
+            C-contiguous array
+
+        Returns
+        -------
+        list
+            Header and buffer frame
+        """
+        header = {'meta': meta, 'data': {'dtype': array.dtype.str, 'shape': array.shape}}
+        return [self.dumps(header), array]
+
+    @classmethod
+    def loads_frames(cls, frames):
+        """
+        Decodes a message of one or multiple frames. For multipart messages, see *dumps_array*, the 'data' of
+        the message is the array which is read from the buffer frame without copying
+
+        Parameters
+        ----------
+        frames : list
+            Frames of the message as bytes or zmq.Frame
+
+        Returns
+        -------
+        dict
+            Decoded message
+        """
+        msg = cls.loads(bytes(frames[0]))
+
+        if len(frames) > 1:
+            msg['data'] = np.frombuffer(frames[1], dtype=msg['data']['dtype']).reshape(msg['data']['shape'])
+
+        return msg
@@ -0,0 +1,142 @@
+import queue
+import logging
+import threading
+import numpy as np
+
+from irrad_control.utils.ring_buffer import RingBuffer
+
+
+class TableWriter(object):
+    """
+    Dedicated thread which executes write calls to an output file in order of submission. All calls to the file
+    must be submitted once a writer is used, since HDF5 files must not be accessed from multiple threads.
+    """
+
+    def __init__(self):
+
+        self._queue = queue.Queue()
+
+        self._thread = threading.Thread(target=self._run, name='TableWriter', daemon=True)
+        self._thread.start()
+
+    def submit(self, func, *args):
+        """Execute *func* with *args* in the writer thread"""
+        self._queue.put((func, args))
+
+    @property
+    def pending(self):
+        """Number of submitted calls which have not been executed yet"""
+        return self._queue.qsize()
+
+    def wait(self):
+        """Block until all submitted calls have been executed"""
+        self._queue.join()
+
+    def close(self):
+        """Execute remaining calls and stop the writer thread"""
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+
+        while True:
+
+            call = self._queue.get()
+
+            try:
+                if call is None:
+                    break
+                func, args = call
+                func(*args)
+            except Exception:
+                logging.exception("Writing to output file failed")
+            finally:
+                self._queue.task_done()
+
+
+class TableBuffer(object):
+    """
+    Accumulates rows of a table in a preallocated structured array and appends them to the table in chunks,
+    which avoids the overhead of appending row by row. Rows are appended once the buffer is full or on *flush*.
+
+    Parameters
+    ----------
+    table : tables.Table
+        Table to append rows to; any object with *append* and *col* methods and a *dtype* attribute
+    size : int, optional
+        Number of rows to accumulate before appending, by default 4096
+    writer : TableWriter, optional
+        Writer in whose thread the rows are appended, by default None which appends immediately
+    history : int, optional
+        Number of latest rows to keep for reading back columns, see *col*, by default None
+    """
+
+    def __init__(self, table, size=4096, writer=None, history=None):
+
+        if int(size) < 1:
+            raise ValueError("Size of table buffer must be at least 1")
+
+        self.table = table
+        self.dtype = np.dtype(table.dtype)
+
+        self._buffer = np.zeros(shape=int(size), dtype=self.dtype)
+        self._n_rows = 0
+        self._writer = writer
+        self._history = None if history is None else RingBuffer(size=history, dtype=self.dtype)
+
+    def __len__(self):
+        """Number of rows which have not been appended to the table yet"""
+        return self._n_rows
+
+    def append(self, rows):
+        """
+        Add rows to the buffer; the rows are copied
+
+        Parameters
+        ----------
+        rows : numpy.ndarray
+            Structured array of rows of self.dtype
+        """
+        rows = np.asarray(rows, dtype=self.dtype).reshape(-1)
+
+        if self._history is not None:
+            for row in rows:
+                self._history.append(row)
+
+        while len(rows):
+
+            n = min(len(rows), len(self._buffer) - self._n_rows)
+
+            self._buffer[self._n_rows:self._n_rows + n] = rows[:n]
+            self._n_rows += n
+            rows = rows[n:]
+
+            if self._n_rows == len(self._buffer):
+                self.flush()
+
+    def flush(self):
+        """Append the buffered rows to the table"""
+
+        if not self._n_rows:
+            return
+
+        if self._writer is None:
+            self.table.append(self._buffer[:self._n_rows])
+        else:
+            # The buffer is reused before the writer appends
+            self._writer.submit(self.table.append, self._buffer[:self._n_rows].copy())
+
+        self._n_rows = 0
+
+    def col(self, name):
+        """Read column *name* of the table, including buffered rows. With a history, only the latest rows are read"""
+
+        if self._history is not None:
+            return self._history.view()[name]
+
+        self.flush()
+
+        if self._writer is not None:
+            self._writer.wait()
+
+        return self.table.col(name)
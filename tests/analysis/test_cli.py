@@ -70,6 +70,9 @@ class TestAnalysisCLI(unittest.TestCase):
     def test_multipart_damage(self):
         self._run_cli_analysis(analysis='damage', infile=self.fixtures['multipart'], flags=['--multipart'])
 
+    def test_multipart_damage_parallel(self):
+        self._run_cli_analysis(analysis='damage', infile=self.fixtures['multipart'], flags=['--multipart', '--jobs', '2'])
+
     def test_irradiation(self):
         self._run_cli_analysis(analysis='irradiation', infile=self.fixtures['irradiation'])
 
@@ -0,0 +1,125 @@
+import os
+import logging
+import unittest
+import tempfile
+import numpy as np
+import tables as tb
+
+from irrad_control.analysis.utils import load_irrad_data, IrradDataset
+from irrad_control.analysis.main import input_files
+
+
+class TestIrradDataset(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+
+        cls.fixture_path = os.path.join(os.path.dirname(__file__), '../fixtures')
+        cls.test_base = os.path.join(cls.fixture_path, 'test_irrad_w_corr')
+
+        cls.data, cls.config = load_irrad_data(data_file=cls.test_base+'.h5', config_file=cls.test_base+'.yaml')
+        cls.server = list(cls.data)[0]
+
+    def test_lazy_access(self):
+
+        with IrradDataset(data_file=self.test_base+'.h5', config_file=self.test_base+'.yaml') as dataset:
+
+            assert dataset.config == self.config
+            assert list(dataset) == list(self.data)
+
+            beam, beam_lazy = self.data[self.server]['Beam'], dataset[self.server]['Beam']
+
+            assert len(beam) == len(beam_lazy) and beam.dtype == beam_lazy.dtype
+
+            # Columns, row ranges and chunks
+            np.testing.assert_array_equal(beam['beam_current'], beam_lazy['beam_current'])
+            np.testing.assert_array_equal(beam[100:200], beam_lazy.read(start=100, stop=200))
+            np.testing.assert_array_equal(beam['timestamp'], np.concatenate(list(beam_lazy.iter_chunks(chunk_size=1000, field='timestamp'))))
+
+            # Indexing reads the entire table
+            np.testing.assert_array_equal(beam[beam['beam_current'] > 0], beam_lazy[beam_lazy['beam_current'] > 0])
+
+            # Nested groups and arrays
+            assert 'ArduinoNTCReadout' in dataset[self.server]['Temperature']
+            np.testing.assert_array_equal(self.data[self.server]['Histogram']['BeamPosition']['hist'],
+                                          dataset[self.server]['Histogram']['BeamPosition']['hist'])
+
+    def test_raw_offset(self):
+
+        dtype = np.dtype([('timestamp', '<f8'), ('sem_left', '<f4')])
+        raw, raw_offset = np.zeros(shape=10, dtype=dtype), np.zeros(shape=2, dtype=dtype)
+        raw['timestamp'] = raw['sem_left'] = np.arange(10)
+        raw_offset['timestamp'], raw_offset['sem_left'] = (0, 1), (1, 2)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+
+            data_file = os.path.join(tmp_dir, 'test_dataset.h5')
+
+            with tb.open_file(data_file, 'w') as out_file:
+                out_file.create_group('/', self.server)
+                out_file.create_table(f'/{self.server}', 'Raw', obj=raw)
+                out_file.create_table(f'/{self.server}', 'RawOffset', obj=raw_offset)
+
+            with IrradDataset(data_file=data_file, config_file=self.test_base+'.yaml') as dataset:
+
+                # Latest offset is subtracted
+                raw_lazy = dataset[self.server]['Raw']
+                np.testing.assert_array_equal(raw_lazy['sem_left'], raw['sem_left'] - 2)
+                np.testing.assert_array_equal(raw_lazy.read(start=5)['sem_left'], raw['sem_left'][5:] - 2)
+                np.testing.assert_array_equal(raw_lazy['timestamp'], raw['timestamp'])
+
+            with IrradDataset(data_file=data_file, config_file=self.test_base+'.yaml', subtract_raw_offset=False) as dataset:
+                np.testing.assert_array_equal(dataset[self.server]['Raw']['sem_left'], raw['sem_left'])
+
+    def test_time_window(self):
+
+        dtype = np.dtype([('timestamp', '<f8'), ('beam_current', '<f4')])
+        beam = np.zeros(shape=1000, dtype=dtype)
+        beam['timestamp'] = np.repeat(np.arange(500), 2) * 0.1
+        beam['beam_current'] = np.arange(1000)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+
+            data_file = os.path.join(tmp_dir, 'test_dataset.h5')
+
+            # Small chunks, such that windows span multiple blocks of the index
+            with tb.open_file(data_file, 'w') as out_file:
+                out_file.create_group('/', self.server)
+                out_file.create_table(f'/{self.server}', 'Beam', obj=beam, chunkshape=(16,))
+
+            with IrradDataset(data_file=data_file, config_file=self.test_base+'.yaml') as dataset:
+
+                beam_lazy = dataset[self.server]['Beam']
+
+                block_size, block_min, block_max = beam_lazy.time_index()
+                assert block_size == 16 and len(block_min) == len(block_max) == 63
+
+                for t_start, t_stop in ((None, None), (1.05, 2.3), (None, 0.1), (49.9, None), (-1, 0), (60, 70), (12.3, 12.3)):
+
+                    mask = np.ones(shape=len(beam), dtype=bool)
+                    if t_start is not None:
+                        mask &= beam['timestamp'] >= t_start
+                    if t_stop is not None:
+                        mask &= beam['timestamp'] <= t_stop
+
+                    np.testing.assert_array_equal(beam_lazy.window(t_start=t_start, t_stop=t_stop), beam[mask])
+                    np.testing.assert_array_equal(beam_lazy.window(t_start=t_start, t_stop=t_stop, field='beam_current'), beam['beam_current'][mask])
+
+                    start, stop = beam_lazy.window_rows(t_start=t_start, t_stop=t_stop)
+                    np.testing.assert_array_equal(beam[start:stop], beam[mask])
+
+    def test_input_files_closed(self):
+
+        files = input_files(infiles=[self.test_base+'.h5'])
+        _, dataset, _, _ = next(files)
+        assert dataset.data_file.isopen
+
+        # Stopping early, e.g. due to a failing analysis, closes the file
+        files.close()
+        assert not dataset.data_file.isopen
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - [%(levelname)-8s] (%(threadName)-10s) %(message)s")
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestIrradDataset)
+    unittest.TextTestRunner(verbosity=2).run(suite)
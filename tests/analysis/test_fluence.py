@@ -0,0 +1,164 @@
+import os
+import logging
+import unittest
+import tempfile
+import numpy as np
+
+from irrad_control.analysis.utils import load_irrad_data, IrradDataset
+from irrad_control.analysis import fluence
+
+
+class TestFluence(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+
+        cls.fixture_path = os.path.join(os.path.dirname(__file__), '../fixtures')
+        cls.test_base = os.path.join(cls.fixture_path, 'test_irradiation_multipart_part_1')
+
+        cls.data, cls.config = load_irrad_data(data_file=cls.test_base+'.h5', config_file=cls.test_base+'.yaml')
+        cls.server = list(cls.data)[0]
+
+        cls.fluence_map = fluence.generate_fluence_map(beam_data=cls.data[cls.server]['Beam'],
+                                                       scan_data=cls.data[cls.server]['Scan'],
+                                                       irrad_data=cls.data[cls.server]['Irrad'])
+
+    def _assert_equal_maps(self, result):
+        for res, expected in zip(result, self.fluence_map):
+            np.testing.assert_array_equal(res, expected)
+
+    def test_chunked_fluence_map(self):
+
+        with IrradDataset(data_file=self.test_base+'.h5', config_file=self.test_base+'.yaml') as dataset:
+
+            for rows_per_chunk in (1, 7):
+                self._assert_equal_maps(fluence.generate_fluence_map_chunked(beam_data=dataset[self.server]['Beam'],
+                                                                             scan_data=dataset[self.server]['Scan'],
+                                                                             irrad_data=dataset[self.server]['Irrad'],
+                                                                             rows_per_chunk=rows_per_chunk))
+
+    def test_chunked_fluence_map_checkpoint(self):
+
+        with IrradDataset(data_file=self.test_base+'.h5', config_file=self.test_base+'.yaml') as dataset, tempfile.TemporaryDirectory() as tmp_dir:
+
+            checkpoint_file = os.path.join(tmp_dir, 'test_fluence_checkpoint.npz')
+            scan_data = dataset[self.server]['Scan'][:]
+
+            # Interrupted after half of the rows
+            fluence.generate_fluence_map_chunked(beam_data=dataset[self.server]['Beam'],
+                                                 scan_data=scan_data[:len(scan_data) // 2],
+                                                 irrad_data=dataset[self.server]['Irrad'],
+                                                 rows_per_chunk=5,
+                                                 checkpoint_file=checkpoint_file)
+
+            assert os.path.isfile(checkpoint_file)
+
+            # Resumed from the checkpoint
+            self._assert_equal_maps(fluence.generate_fluence_map_chunked(beam_data=dataset[self.server]['Beam'],
+                                                                         scan_data=scan_data,
+                                                                         irrad_data=dataset[self.server]['Irrad'],
+                                                                         rows_per_chunk=5,
+                                                                         checkpoint_file=checkpoint_file))
+
+    def test_parallel_fluence_map(self):
+
+        # Partial maps of the blocks of rows are added up in a different order
+        for n_threads in (2, 5):
+            for res, expected in zip(fluence.generate_fluence_map(beam_data=self.data[self.server]['Beam'],
+                                                                  scan_data=self.data[self.server]['Scan'],
+                                                                  irrad_data=self.data[self.server]['Irrad'],
+                                                                  n_threads=n_threads), self.fluence_map):
+                np.testing.assert_allclose(res, expected, rtol=1e-12)
+
+        with IrradDataset(data_file=self.test_base+'.h5', config_file=self.test_base+'.yaml') as dataset:
+            for res, expected in zip(fluence.generate_fluence_map_chunked(beam_data=dataset[self.server]['Beam'],
+                                                                          scan_data=dataset[self.server]['Scan'],
+                                                                          irrad_data=dataset[self.server]['Irrad'],
+                                                                          rows_per_chunk=7,
+                                                                          n_threads=3), self.fluence_map):
+                np.testing.assert_allclose(res, expected, rtol=1e-12)
+
+    def test_gauss_2d_kernel(self):
+
+        bin_centers_x, bin_centers_y = np.linspace(0, 30, 60), np.linspace(-5, 20, 50)
+        mus_x, mu_y, sigma_x, sigma_y = np.array([-8.0, 0.3, 12.1, 12.1, 29.5]), 4.2, 1.1, 0.8
+        amplitudes, amplitude_errors = np.array([1e3, 2e3, 3e3, 5e2, 1e3]), np.array([10, 20, 30, 5, 10])
+
+        # Evaluate the PDF bin by bin within 6 sigmas
+        expected, expected_error = np.zeros(shape=(50, 60)), np.zeros(shape=(50, 60))
+        for mu_x, amplitude, amplitude_error in zip(mus_x, amplitudes, amplitude_errors):
+            x, y = np.meshgrid(bin_centers_x, bin_centers_y)
+            mask = (np.abs(x - mu_x) <= 6 * sigma_x) & (np.abs(y - mu_y) <= 6 * sigma_y)
+            for pdf_map, amp in ((expected, amplitude), (expected_error, amplitude_error ** 2)):
+                pdf_map[mask] += [fluence.gauss_2d_pdf(x=xx, y=yy, mu_x=mu_x, mu_y=mu_y, sigma_x=sigma_x, sigma_y=sigma_y, amplitude=amp)
+                                  for xx, yy in zip(x[mask], y[mask])]
+
+        kernel_maps = np.zeros(shape=(2, 50, 60))
+        for mu_x, amplitude, amplitude_error in zip(mus_x, amplitudes, amplitude_errors):
+            fluence.apply_gauss_2d_kernel(kernel_maps[0], kernel_maps[1], amplitude, amplitude_error, bin_centers_x, bin_centers_y,
+                                          mu_x, mu_y, sigma_x, sigma_y, False)
+
+        row_maps = np.zeros(shape=(2, 50, 60))
+        fluence.apply_gauss_2d_kernel_row(row_maps[0], row_maps[1], amplitudes, amplitude_errors, bin_centers_x, bin_centers_y,
+                                          mus_x, mu_y, sigma_x, sigma_y, False)
+
+        for result in (kernel_maps, row_maps):
+            np.testing.assert_allclose(result[0], expected, rtol=1e-12, atol=1e-12)
+            np.testing.assert_allclose(result[1], expected_error, rtol=1e-12, atol=1e-12)
+
+        with self.assertRaises(ValueError):
+            fluence.apply_gauss_2d_kernel_row(row_maps[0], row_maps[1], amplitudes, amplitude_errors, bin_centers_x, bin_centers_y,
+                                              mus_x, mu_y, sigma_x, sigma_y, False, skip_sigmas=2)
+
+        # Precomputed profiles at the bin centers
+        bin_amplitudes, bin_amplitude_errors = np.linspace(0, 1e3, 60), np.linspace(0, 10, 60)
+        row_maps, profile_maps = np.zeros(shape=(2, 50, 60)), np.zeros(shape=(2, 50, 60))
+        fluence.apply_gauss_2d_kernel_row(row_maps[0], row_maps[1], bin_amplitudes, bin_amplitude_errors, bin_centers_x, bin_centers_y,
+                                          bin_centers_x, mu_y, sigma_x, sigma_y, False)
+        fluence.apply_gauss_2d_kernel_bin_centers(profile_maps[0], profile_maps[1], bin_amplitudes, bin_amplitude_errors,
+                                                  fluence.gauss_1d_profiles(bin_centers_x, sigma_x), bin_centers_y, mu_y, sigma_x, sigma_y, False)
+        np.testing.assert_allclose(profile_maps, row_maps, rtol=1e-12, atol=1e-12)
+
+        # Convolution of point charges on the grid is exact
+        pad_x, pad_y = fluence._gauss_1d_kernel_size(bin_centers_x, sigma_x), fluence._gauss_1d_kernel_size(bin_centers_y, sigma_y)
+        charge_maps = np.zeros(shape=(2, 50 + 2 * pad_y, 60 + 2 * pad_x))
+        fluence.deposit_point_charges_row(charge_maps[0], charge_maps[1], amplitudes, amplitude_errors, bin_centers_x, bin_centers_y,
+                                          bin_centers_x[[0, 10, 11, 30, 59]], bin_centers_y[20])
+        kernel_maps = np.zeros(shape=(2, 50, 60))
+        fluence.apply_gauss_2d_kernel_row(kernel_maps[0], kernel_maps[1], amplitudes, amplitude_errors, bin_centers_x, bin_centers_y,
+                                          bin_centers_x[[0, 10, 11, 30, 59]], bin_centers_y[20], sigma_x, sigma_y, False)
+
+        for charge_map, kernel_map in zip(charge_maps, kernel_maps):
+            np.testing.assert_allclose(fluence.convolve_gauss_2d(charge_map, bin_centers_x, bin_centers_y, sigma_x, sigma_y), kernel_map,
+                                       rtol=1e-6, atol=1e-7 * kernel_map.max())
+
+    def test_convolution_fluence_map(self):
+
+        result = fluence.generate_fluence_map(beam_data=self.data[self.server]['Beam'],
+                                              scan_data=self.data[self.server]['Scan'],
+                                              irrad_data=self.data[self.server]['Irrad'],
+                                              engine='convolution')
+
+        # Positions which are not on the grid are interpolated
+        for res, expected in zip(result, self.fluence_map):
+            np.testing.assert_allclose(res, expected, rtol=0, atol=5e-3 * expected.max())
+
+        with IrradDataset(data_file=self.test_base+'.h5', config_file=self.test_base+'.yaml') as dataset:
+            for res, expected in zip(fluence.generate_fluence_map_chunked(beam_data=dataset[self.server]['Beam'],
+                                                                          scan_data=dataset[self.server]['Scan'],
+                                                                          irrad_data=dataset[self.server]['Irrad'],
+                                                                          rows_per_chunk=7,
+                                                                          engine='convolution'), result):
+                np.testing.assert_array_equal(res, expected)
+
+        with self.assertRaises(ValueError):
+            fluence.generate_fluence_map(beam_data=self.data[self.server]['Beam'],
+                                         scan_data=self.data[self.server]['Scan'],
+                                         irrad_data=self.data[self.server]['Irrad'],
+                                         engine='fft')
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - [%(levelname)-8s] (%(threadName)-10s) %(message)s")
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestFluence)
+    unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,229 @@
+import os
+import time
+import logging
+import unittest
+
+import zmq
+
+from irrad_control import pid_file
+from irrad_control.utils.tools import load_yaml
+from irrad_control.utils.serializer import Serializer
+from irrad_control.processes.daq import DAQProcess
+from irrad_control.processes.async_daq import AsyncDAQProcess
+from irrad_control.processes.converter import IrradConverter, AsyncIrradConverter
+
+
+def acquire():
+    """Blocking data acquisition function, see AsyncDAQProcess.launch_daq"""
+    time.sleep(0.01)
+    return {'name': 'TestAsyncDAQProcess', 'type': 'daq', 'timestamp': time.time()}, {'value': 1.0}
+
+
+class BaseAsyncDAQProcess(AsyncDAQProcess):
+
+    max_batch_size = 16
+
+    def __init__(self, daq_stream=None, daq_func=None):
+        super(BaseAsyncDAQProcess, self).__init__(name='TestAsyncDAQProcess')
+
+        self._daq_func = daq_func
+
+        if daq_stream is not None:
+            self.add_daq_stream(daq_stream=daq_stream)
+
+    def _launch_threads(self):
+
+        super(BaseAsyncDAQProcess, self)._launch_threads()
+
+        if self._daq_func is not None:
+            self.launch_daq(daq_func=self._daq_func)
+
+    def recv_data(self):
+        self._recv_from_stream(kind='data', stream=self.daq_streams, callback=self.handle_data, pub_results=True, max_batch_size=self.max_batch_size)
+
+    def handle_data(self, raw_data):
+        return [{'meta': dict(packet['meta'], type='interpreted'), 'data': packet['data']} for packet in raw_data]
+
+    def handle_cmd(self, target, cmd, data=None):
+        pass
+
+    # Define clean up
+    def clean_up(self):
+        pass
+
+
+def wait_for_pid_file():
+
+    # Wait until process is created with irrad_control.pid file
+    start = time.time()
+    while not os.path.isfile(pid_file):
+        time.sleep(1)
+
+        # Wait max 30 seconds
+        if time.time() - start > 30:
+            break
+
+    assert os.path.isfile(pid_file)
+
+
+class TestAsyncDAQProcess(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+
+        cls.context = zmq.Context()
+        cls.serializer = Serializer()
+
+        # Stream of raw data to which the process subscribes
+        cls.raw_pub = cls.context.socket(zmq.PUB)
+        raw_port = cls.raw_pub.bind_to_random_port('tcp://127.0.0.1')
+
+        # Create process
+        cls.daq_proc = BaseAsyncDAQProcess(daq_stream=f'tcp://127.0.0.1:{raw_port}')
+
+        # Launch process
+        cls.daq_proc.start()
+
+        wait_for_pid_file()
+
+        cls.ports = load_yaml(pid_file)['ports']
+
+    @classmethod
+    def tearDownClass(cls):
+        # Send SIGTERM
+        cls.daq_proc.terminate()
+
+        # Wait until down
+        cls.daq_proc.join()
+
+        # Check pid file is gone
+        assert not os.path.isfile(pid_file)
+
+        cls.raw_pub.close()
+        cls.context.term()
+
+        time.sleep(1)
+
+    def _subscribe(self, port):
+        sub = self.context.socket(zmq.SUB)
+        sub.setsockopt(zmq.SUBSCRIBE, b'')
+        sub.setsockopt(zmq.LINGER, 0)
+        sub.connect(f"tcp://127.0.0.1:{port}")
+        return sub
+
+    def _publish_raw(self, index):
+        self.raw_pub.send(self.serializer.dumps({'meta': {'name': 'test', 'type': 'raw_data', 'timestamp': time.time()},
+                                                 'data': {'index': index}}))
+
+    def test_cmd_reply(self):
+
+        cmd_req = self.context.socket(zmq.REQ)
+        cmd_req.setsockopt(zmq.RCVTIMEO, 5000)
+        cmd_req.setsockopt(zmq.LINGER, 0)
+        cmd_req.connect(f"tcp://127.0.0.1:{self.ports['cmd']}")
+
+        try:
+            cmd_req.send_json({'target': 'test', 'cmd': 'test_cmd'})
+            reply = cmd_req.recv_json()
+        finally:
+            cmd_req.close()
+
+        assert reply['type'] == 'STANDARD'
+        assert reply['reply'] == 'test_cmd'
+        assert reply['sender'] == 'test'
+
+    def test_handle_data(self):
+
+        data_sub = self._subscribe(port=self.ports['data'])
+        metrics_sub = self._subscribe(port=self.ports['metrics'])
+
+        try:
+            # Publish until both subscriptions are established and a result is re-published
+            start = time.time()
+            while not data_sub.poll(timeout=200):
+                self._publish_raw(index=-1)
+                assert time.time() - start < 10
+
+            while data_sub.poll(timeout=500):
+                data_sub.recv_multipart()
+
+            # A burst of packets queues up and is drained in batches
+            n_packets = 5 * BaseAsyncDAQProcess.max_batch_size
+            for i in range(n_packets):
+                self._publish_raw(index=i)
+
+            results = []
+            while len(results) < n_packets and data_sub.poll(timeout=5000):
+                results.append(Serializer.loads_frames(data_sub.recv_multipart()))
+
+            assert [res['data']['index'] for res in results] == list(range(n_packets))
+            assert all(res['meta']['type'] == 'interpreted' for res in results)
+
+            # Metrics of receiving are published every second
+            packets, queue = 0, 0
+            start = time.time()
+            while packets < n_packets and time.time() - start < 5:
+                if metrics_sub.poll(timeout=1000):
+                    metrics = Serializer.loads_frames(metrics_sub.recv_multipart())['data']
+                    packets += metrics['counters'].get('data_packets', 0)
+                    queue = max(queue, metrics['gauges'].get('data_queue', 0))
+
+            assert packets >= n_packets
+            assert 1 <= queue <= BaseAsyncDAQProcess.max_batch_size
+
+        finally:
+            data_sub.close()
+            metrics_sub.close()
+
+
+class TestAsyncDAQProcessDAQ(unittest.TestCase):
+
+    def test_launch_daq(self):
+
+        daq_proc = BaseAsyncDAQProcess(daq_func=acquire)
+        daq_proc.start()
+
+        wait_for_pid_file()
+
+        context = zmq.Context()
+        data_sub = context.socket(zmq.SUB)
+        data_sub.setsockopt(zmq.SUBSCRIBE, b'')
+        data_sub.setsockopt(zmq.LINGER, 0)
+        data_sub.connect(f"tcp://127.0.0.1:{load_yaml(pid_file)['ports']['data']}")
+
+        try:
+            # Data acquired in the executor reaches the data port
+            assert data_sub.poll(timeout=5000)
+            data = Serializer.loads_frames(data_sub.recv_multipart())
+        finally:
+            data_sub.close()
+            context.term()
+
+            daq_proc.terminate()
+            daq_proc.join(timeout=10)
+
+        assert data['meta']['type'] == 'daq'
+        assert data['data'] == {'value': 1.0}
+
+        # Tasks are cancelled and the executor is shut down
+        assert not daq_proc.is_alive()
+        assert daq_proc.exitcode == 0
+        assert not os.path.isfile(pid_file)
+
+    def test_async_converter(self):
+
+        # The event loop of AsyncDAQProcess takes precedence over the threads of DAQProcess
+        for method in ('run', 'launch_daq', '_recv_from_stream', '_add_loop_socket', '_launch_threads', 'shutdown'):
+            assert getattr(AsyncIrradConverter, method) is getattr(AsyncDAQProcess, method)
+
+        # Interpretation is the one of IrradConverter
+        for method in ('handle_cmd', 'handle_data', 'recv_data'):
+            assert getattr(AsyncIrradConverter, method) is getattr(IrradConverter, method)
+            assert getattr(AsyncIrradConverter, method) is not getattr(DAQProcess, method)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - [%(levelname)-8s] (%(threadName)-10s) %(message)s")
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestAsyncDAQProcess)
+    suite.addTests(unittest.TestLoader().loadTestsFromTestCase(TestAsyncDAQProcessDAQ))
+    unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,212 @@
+import os
+import json
+import logging
+import unittest
+import zmq
+import numpy as np
+import tables as tb
+
+from irrad_control.analysis.utils import load_irrad_data, window_hist
+from irrad_control.processes.converter import IrradConverter, IrradConverterWorker
+
+
+class TestConverterBatch(unittest.TestCase):
+    """Batch interpretation of raw data must yield the exact same results as interpreting sample-by-sample"""
+
+    @classmethod
+    def setUpClass(cls):
+
+        cls.context = zmq.Context()
+
+        cls.fixture_path = os.path.join(os.path.dirname(__file__), '../fixtures')
+        cls.test_base = os.path.join(cls.fixture_path, 'test_irrad_w_corr')
+
+        # Load the data
+        cls.data, cls.config = load_irrad_data(data_file=cls.test_base+'.h5',
+                                               config_file=cls.test_base+'.yaml',
+                                               subtract_raw_offset=False)
+
+        # Make output dir
+        cls.output_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), 'output_batch'))
+        if not os.path.isdir(cls.output_dir):
+            os.mkdir(cls.output_dir)
+
+        # Overwrite server ip to localhost
+        server_ip = list(cls.config['server'].keys())[0]
+        cls.server = cls.config['server'][server_ip]['name']
+        cls.config['server']['localhost'] = cls.config['server'].pop(server_ip)
+
+        cls.raw_packets = [{'meta': {'timestamp': float(raw['timestamp']), 'name': 'localhost', 'type': 'raw_data'},
+                            'data': {ch: float(raw[ch]) for ch in cls.config['server']['localhost']['readout']['channels']}}
+                           for raw in cls.data[cls.server]['Raw'][:2000]]
+
+        cls.outfiles, cls.results = {}, {}
+        for batch_size in (1, 64):
+            cls.outfiles[batch_size], cls.results[batch_size] = cls._interpret(batch_size=batch_size)
+        cls.outfiles['block'], cls.results['block'] = cls._interpret(batch_size=64, block=True)
+        cls.outfiles['sharded'], cls.results['sharded'] = cls._interpret(batch_size=64, sharded=True)
+        cls.outfiles['writer'], cls.results['writer'] = cls._interpret(batch_size=64, writer_thread=True)
+
+    @classmethod
+    def tearDownClass(cls):
+
+        # Delete files
+        for root, _, files in os.walk(cls.output_dir):
+            for fname in files:
+                os.remove(os.path.join(root, fname))
+        os.rmdir(cls.output_dir)
+
+        cls.context.term()
+
+    @classmethod
+    def _interpret(cls, batch_size, block=False, sharded=False, writer_thread=False):
+
+        converter = IrradConverter(name=f'TestConverterBatch{batch_size}')
+        converter.setup = cls.config
+        converter.setup['session']['outfile'] = os.path.join(cls.output_dir, f'test_converter_batch_{batch_size}{"_block" if block else ""}{"_sharded" if sharded else ""}{"_writer" if writer_thread else ""}')
+        converter.setup['session']['writer_thread'] = writer_thread
+        converter.setup['session']['storage'] = {'complib': 'blosc:lz4', 'complevel': 5, 'duration': 1} if writer_thread else {}
+        converter.sockets['event'] = cls.context.socket(zmq.PUB)
+        converter._setup_daq()
+
+        if sharded:
+            # Interpret in a worker which pushes its rows to the converter, which writes the output file
+            writer = converter
+            writer._storage_pull = cls.context.socket(zmq.PULL)
+            writer._storage_pull.bind('inproc://test_storage')
+
+            converter = IrradConverterWorker(server='localhost', setup=cls.config, cmd_addr=None, storage_addr=None, relay_addrs={'data': None})
+            converter._storage = cls.context.socket(zmq.PUSH)
+            converter._storage.connect('inproc://test_storage')
+            converter.sockets['event'] = writer.sockets['event']
+            converter._setup_daq()
+            writer._workers['localhost'] = converter
+
+        results = []
+        for i in range(0, len(cls.raw_packets), batch_size):
+            raw_data_batch = [json.loads(json.dumps(raw_data)) for raw_data in cls.raw_packets[i:i+batch_size]]
+            if block:
+                # Blocks as acquired by the server, with reversed channel order
+                columns = ['timestamp'] + list(raw_data_batch[0]['data'])[::-1]
+                raw_data_block = {'meta': {'timestamp': raw_data_batch[0]['meta']['timestamp'], 'name': 'localhost', 'type': 'raw_data_block', 'columns': columns},
+                                  'data': np.array([[raw_data['meta']['timestamp']] + [raw_data['data'][ch] for ch in columns[1:]] for raw_data in raw_data_batch])}
+                results.extend(converter.handle_data_batch([raw_data_block]))
+            elif batch_size == 1:
+                results.extend(converter.handle_data(raw_data_batch[0]))
+            else:
+                results.extend(converter.handle_data_batch(raw_data_batch))
+
+        converter._close_tables()
+
+        if sharded:
+            while writer._storage_pull.poll(timeout=100):
+                writer._handle_storage()
+            writer._storage_pull.close()
+            converter._storage.close()
+            converter = writer
+            converter._close_tables()
+
+        converter.sockets['event'].close()
+
+        # Data rates depend on the time of arrival
+        for res in results:
+            res['meta'].pop('data_rate', None)
+
+        return converter.setup['session']['outfile'] + '.h5', results
+
+    def test_interpreted_data(self):
+
+        assert len(self.results[1]) == len(self.results[64]) == 3 * len(self.raw_packets)
+
+        for res, res_batch in zip(self.results[1], self.results[64]):
+            assert json.dumps(res) == json.dumps(res_batch)
+
+    def test_interpreted_block_data(self):
+
+        assert len(self.results[1]) == len(self.results['block'])
+
+        for res, res_block in zip(self.results[1], self.results['block']):
+            assert json.dumps(res) == json.dumps(res_block)
+
+    def test_interpreted_sharded_data(self):
+
+        assert len(self.results[1]) == len(self.results['sharded'])
+
+        for res, res_sharded in zip(self.results[1], self.results['sharded']):
+            assert json.dumps(res) == json.dumps(res_sharded)
+
+    def test_sharded_record_data(self):
+
+        writer = IrradConverter(name='TestConverterBatchRecord')
+        writer.setup = self.config
+        writer.setup['session']['outfile'] = os.path.join(self.output_dir, 'test_converter_batch_record')
+        writer.setup['session']['writer_thread'] = False
+        writer.setup['session']['storage'] = {}
+        writer.sockets['event'] = self.context.socket(zmq.PUB)
+        writer._setup_daq()
+        writer._storage_pull = self.context.socket(zmq.PULL)
+        writer._storage_pull.bind('inproc://test_storage_record')
+
+        worker = IrradConverterWorker(server='localhost', setup=self.config, cmd_addr=None, storage_addr=None, relay_addrs={'data': None})
+        worker._storage = self.context.socket(zmq.PUSH)
+        worker._storage.connect('inproc://test_storage_record')
+        worker.sockets['event'] = writer.sockets['event']
+        worker._setup_daq()
+
+        # The reply carries the recording state of the worker
+        worker.handle_cmd(target='interpreter', cmd='record_data', data=['localhost', False])
+        reply = writer._wait_for_worker_reply(server='localhost', cmd='record_data')
+        assert reply['type'] == 'STANDARD' and reply['data'] == ['localhost', False]
+        assert not worker.interaction_flags['localhost']['write'].is_set()
+
+        # No confirmation if the worker does not reply
+        writer._worker_reply_timeout = 0.2
+        assert writer._wait_for_worker_reply(server='localhost', cmd='record_data') is None
+
+        worker._close_tables()
+        writer._storage_pull.close()
+        worker._storage.close()
+        writer._close_tables()
+        writer.sockets['event'].close()
+
+    def test_output_data(self):
+
+        for outfile in (self.outfiles[64], self.outfiles['block'], self.outfiles['sharded'], self.outfiles['writer']):
+            self._compare_output(outfile_batch=outfile)
+
+    def test_output_storage(self):
+
+        with tb.open_file(self.outfiles['writer']) as out:
+            raw = out.get_node(f'/{self.server}/Raw')
+            assert raw.filters.complib == 'blosc:lz4' and raw.filters.complevel == 5
+
+    def test_output_hist_deltas(self):
+
+        for outfile in (self.outfiles[1], self.outfiles['sharded'], self.outfiles['writer']):
+            with tb.open_file(outfile) as out:
+                for hist_name in ('BeamPosition', 'SeeHorizontal', 'SeeVertical', 'Sey'):
+                    group = out.get_node(f'/{self.server}/Histogram/{hist_name}')
+                    deltas = group.deltas.read()
+                    # Increments add up to the final histogram
+                    np.testing.assert_array_equal(window_hist(deltas), group.hist.read())
+                    assert not window_hist(deltas, stop=0).any()
+
+    def _compare_output(self, outfile_batch):
+
+        with tb.open_file(self.outfiles[1]) as out, tb.open_file(outfile_batch) as out_batch:
+
+            for node in ('Raw', 'Beam', 'See', 'Histogram/BeamPosition/hist', 'Histogram/SeeHorizontal/hist', 'Histogram/SeeVertical/hist'):
+
+                data = out.get_node(f'/{self.server}/{node}').read()
+                data_batch = out_batch.get_node(f'/{self.server}/{node}').read()
+
+                assert data.shape == data_batch.shape
+                assert data.tobytes() == data_batch.tobytes()
+
+            assert len(out.get_node(f'/{self.server}/Raw')) == len(self.raw_packets)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - [%(levelname)-8s] (%(threadName)-10s) %(message)s")
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestConverterBatch)
+    unittest.TextTestRunner(verbosity=2).run(suite)
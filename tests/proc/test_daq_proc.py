@@ -2,9 +2,12 @@ import os
 import time
 import logging
 import unittest
+import threading
+import zmq
 
 from irrad_control import pid_file
 from irrad_control.utils.tools import load_yaml
+from irrad_control.utils.serializer import Serializer
 from irrad_control.processes.daq import DAQProcess
 
 
@@ -13,6 +16,12 @@ class BaseDAQProcess(DAQProcess):
     def __init__(self):
         super(BaseDAQProcess, self).__init__(name='TestDAQProcess')
 
+    def handle_cmd(self, target, cmd, data=None):
+        if cmd in ('profile_start', 'profile_stop'):
+            self._handle_profile_cmd(target=target, cmd=cmd, data=data)
+        elif cmd == 'fail':
+            raise RuntimeError('Command failed')
+
     # Define clean up
     def clean_up(self):
         pass
@@ -66,6 +75,93 @@ class TestDAQProcess(unittest.TestCase):
         # Check that all ports are found
         assert all(isinstance(port, int) for port in pid_file_content['ports'].values())
 
+    def test_metrics(self):
+
+        context = zmq.Context()
+        sub = context.socket(zmq.SUB)
+        sub.setsockopt(zmq.SUBSCRIBE, b'')
+        sub.connect(f"tcp://localhost:{load_yaml(pid_file)['ports']['metrics']}")
+
+        try:
+            # Metrics are published every second
+            assert sub.poll(timeout=5000)
+            metrics = Serializer.loads_frames(sub.recv_multipart())
+        finally:
+            sub.close()
+            context.term()
+
+        assert metrics['meta']['type'] == 'metrics'
+        assert metrics['meta']['name'] == 'TestDAQProcess'
+        assert set(metrics['data']) == {'interval', 'timings', 'counters', 'gauges'}
+
+    def test_stop_send_data(self):
+
+        daq_proc = BaseDAQProcess()
+        daq_proc._setup_zmq()
+
+        # Proxy is terminated even if it is stopped before it started
+        daq_proc._stop_send_data()
+
+        send_data = threading.Thread(target=daq_proc.send_data)
+        send_data.start()
+        send_data.join(timeout=5)
+
+        try:
+            assert not send_data.is_alive()
+        finally:
+            daq_proc.context.destroy(linger=0)
+
+    def test_failing_cmd(self):
+
+        context = zmq.Context()
+        req = context.socket(zmq.REQ)
+        req.setsockopt(zmq.RCVTIMEO, 5000)
+        req.setsockopt(zmq.LINGER, 0)
+        req.connect(f"tcp://localhost:{load_yaml(pid_file)['ports']['cmd']}")
+
+        try:
+            req.send_json({'target': 'test', 'cmd': 'fail'})
+            reply = req.recv_json()
+
+            # The event loop keeps handling commands
+            req.send_json({'target': 'test', 'cmd': 'noop'})
+            next_reply = req.recv_json()
+        finally:
+            req.close()
+            context.term()
+
+        assert reply['type'] == 'ERROR' and 'Command failed' in reply['data']
+        assert next_reply['type'] == 'STANDARD'
+
+    def test_profile_cmds(self):
+
+        context = zmq.Context()
+        req = context.socket(zmq.REQ)
+        req.setsockopt(zmq.RCVTIMEO, 5000)
+        req.setsockopt(zmq.LINGER, 0)
+        req.connect(f"tcp://localhost:{load_yaml(pid_file)['ports']['cmd']}")
+
+        def send_cmd(cmd, data=None):
+            req.send_json({'target': 'test', 'cmd': cmd, 'data': data})
+            return req.recv_json()
+
+        try:
+            assert send_cmd('profile_stop')['type'] == 'ERROR'
+            assert send_cmd('profile_start', data={'interval': 0.005})['type'] == 'STANDARD'
+            assert send_cmd('profile_start')['type'] == 'ERROR'
+            time.sleep(0.5)
+            reply = send_cmd('profile_stop')
+        finally:
+            req.close()
+            context.term()
+
+        assert reply['type'] == 'STANDARD'
+
+        # No session setup, hence no session folder to write to
+        assert reply['data']['file'] is None
+        assert reply['data']['n_samples'] > 10
+        assert reply['data']['stacks'] and reply['data']['summary']
+
 
 if __name__ == '__main__':
     logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - [%(levelname)-8s] (%(threadName)-10s) %(message)s")
@@ -0,0 +1,51 @@
+import os
+import copy
+import logging
+import unittest
+import numpy as np
+
+from irrad_control.utils.tools import load_yaml
+from irrad_control.processes.converter import ReadoutPlan
+
+
+class TestReadoutPlan(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+
+        cls.fixture_path = os.path.join(os.path.dirname(__file__), '../fixtures')
+        cls.config = load_yaml(os.path.join(cls.fixture_path, 'test_irrad_w_corr.yaml'))
+        cls.readout_setup = list(cls.config['server'].values())[0]['readout']
+
+    def test_lookups(self):
+
+        plan = ReadoutPlan(readout_setup=self.readout_setup)
+
+        assert plan.channels == ['Left', 'Right', 'Up', 'Down', 'Sum', 'BLM']
+        assert plan.type_ch['sem_sum'] == 'Sum' and plan.sum_idx == 4
+        assert plan.sem_foils == ['sem_left', 'sem_right', 'sem_up', 'sem_down'] and plan.n_foils == 4
+        assert plan.sem_h and plan.sem_v and plan.batchable
+        assert plan.offset_mask.all() and plan.offset_channels == plan.channels
+        assert plan.ntc_group_idx is None
+
+        # DAQBoard full-scale currents are given per channel group in nA
+        np.testing.assert_array_equal(plan.ifs, [plan.type_ifs[rt] for rt in plan.types])
+        assert plan.type_ifs['blm'] == self.readout_setup['ro_group_scales']['ch12'] * 1e-9
+
+    def test_rebuild(self):
+
+        readout_setup = copy.deepcopy(self.readout_setup)
+        plan = ReadoutPlan(readout_setup=readout_setup)
+
+        readout_setup['ro_group_scales']['ch12'] *= 10
+        new_plan = ReadoutPlan(readout_setup=readout_setup)
+
+        # Only the BLM is in group 'ch12'
+        assert new_plan.type_ifs['blm'] == 10 * plan.type_ifs['blm']
+        assert new_plan.type_ifs['sem_sum'] == plan.type_ifs['sem_sum']
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - [%(levelname)-8s] (%(threadName)-10s) %(message)s")
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestReadoutPlan)
+    unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,59 @@
+import logging
+import unittest
+import numpy as np
+
+from irrad_control.utils.metrics import Metrics, TimingHistogram
+
+
+class TestMetrics(unittest.TestCase):
+
+    def test_timing_histogram(self):
+
+        durations = np.random.default_rng(42).lognormal(mean=np.log(1e-4), sigma=1.0, size=10000)
+
+        hist = TimingHistogram()
+        for duration in durations:
+            hist.add(duration)
+
+        assert hist.n == durations.size
+        np.testing.assert_allclose(hist.total, durations.sum())
+        assert hist.max == durations.max()
+
+        # Quantiles are the upper edges of their bins, at most a factor 2 off
+        for q in (0.5, 0.9, 0.99):
+            assert np.quantile(durations, q) <= hist.quantile(q) <= 2 * np.quantile(durations, q)
+
+        # Durations below 1 us and above the range end up in the outer bins
+        hist = TimingHistogram()
+        hist.add(1e-7)
+        hist.add(1e4)
+        assert hist.counts[0] == hist.counts[-1] == 1
+
+    def test_snapshot(self):
+
+        metrics = Metrics()
+
+        for duration in (1e-3, 2e-3, 3e-3):
+            metrics.record('store', duration)
+        metrics.count('hwm_drops')
+        metrics.count('hwm_drops', 2)
+        for depth in (5, 40, 7):
+            metrics.gauge('data_queue', depth)
+
+        snapshot = metrics.snapshot()
+
+        assert snapshot['timings']['store']['count'] == 3
+        np.testing.assert_allclose(snapshot['timings']['store']['mean'], 2e-3)
+        assert snapshot['timings']['store']['max'] == 3e-3
+        assert snapshot['counters'] == {'hwm_drops': 3}
+        assert snapshot['gauges'] == {'data_queue': 40}
+
+        # Metrics are reset with every snapshot
+        snapshot = metrics.snapshot()
+        assert not snapshot['timings'] and not snapshot['counters'] and not snapshot['gauges']
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - [%(levelname)-8s] (%(threadName)-10s) %(message)s")
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestMetrics)
+    unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,59 @@
+import os
+import time
+import logging
+import unittest
+import tempfile
+import threading
+
+from irrad_control.utils.profiler import StackSampler
+
+
+def busy_wait(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+class TestStackSampler(unittest.TestCase):
+
+    def test_sampling(self):
+
+        stop = threading.Event()
+        busy = threading.Thread(target=busy_wait, args=(stop,), name='busy')
+        busy.start()
+
+        sampler = StackSampler(interval=0.002, threads=['busy'])
+        sampler.start()
+        assert sampler.running
+        time.sleep(0.5)
+        sampler.stop()
+
+        stop.set()
+        busy.join()
+
+        assert not sampler.running
+        assert sampler.n_samples > 10
+        assert sampler.duration >= 0.5
+
+        # Only the selected thread is sampled, stacks start with the thread name
+        assert all(stack.startswith('busy;') for stack in sampler.stacks)
+        assert sum(sampler.stacks.values()) <= sampler.n_samples
+
+        # Samples can also be taken within the check of the stop event
+        func, thread, count, total = sampler.summary(n=1)[0]
+        assert func.startswith('busy_wait (test_profiler.py') and thread == 'busy'
+        assert count > total / 2
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            profile_file = os.path.join(tmp_dir, 'profile.txt')
+            sampler.write(profile_file)
+            with open(profile_file) as pf:
+                lines = pf.read().splitlines()
+
+        assert len(lines) == len(sampler.stacks)
+        assert all(int(line.rsplit(' ', 1)[1]) == sampler.stacks[line.rsplit(' ', 1)[0]] for line in lines)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - [%(levelname)-8s] (%(threadName)-10s) %(message)s")
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestStackSampler)
+    unittest.TextTestRunner(verbosity=2).run(suite)
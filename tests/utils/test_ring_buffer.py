@@ -0,0 +1,64 @@
+import logging
+import unittest
+import numpy as np
+
+from irrad_control.utils.ring_buffer import RingBuffer
+
+
+class TestRingBuffer(unittest.TestCase):
+
+    def setUp(self):
+        self.dtype = [('timestamp', '<f8'), ('beam', '<f4')]
+        self.buffer = RingBuffer(size=5, dtype=self.dtype)
+
+    def test_append_and_wrap(self):
+
+        assert len(self.buffer) == 0 and self.buffer.view().size == 0
+
+        for i in range(3):
+            self.buffer.append((i, 10 * i))
+
+        assert len(self.buffer) == 3 and not self.buffer.full
+        np.testing.assert_array_equal(self.buffer.view()['timestamp'], [0, 1, 2])
+
+        # Overwrite oldest entries
+        for i in range(3, 12):
+            self.buffer.append((i, 10 * i))
+
+        assert len(self.buffer) == 5 and self.buffer.full
+        np.testing.assert_array_equal(self.buffer.view()['timestamp'], [7, 8, 9, 10, 11])
+        np.testing.assert_array_equal(self.buffer.view(n=2)['beam'], [100, 110])
+        assert self.buffer.latest()['timestamp'] == 11
+
+        # Views are contiguous and do not copy
+        assert self.buffer.view().flags['C_CONTIGUOUS']
+        assert np.shares_memory(self.buffer.view(), self.buffer._buffer)
+
+    def test_window(self):
+
+        for i in range(8):
+            self.buffer.append((i, 10 * i))
+
+        # Lower bound is exclusive, upper bound inclusive
+        np.testing.assert_array_equal(self.buffer.window(t_start=4, t_stop=6)['timestamp'], [5, 6])
+        np.testing.assert_array_equal(self.buffer.window(t_start=5.5)['timestamp'], [6, 7])
+        np.testing.assert_array_equal(self.buffer.window(t_stop=4)['timestamp'], [3, 4])
+        assert self.buffer.window(t_start=7).size == 0
+
+        np.testing.assert_array_equal(self.buffer.last_before(t_stop=6.5, n=2)['timestamp'], [5, 6])
+        np.testing.assert_array_equal(self.buffer.last_before(t_stop=6.5, n=10)['timestamp'], [3, 4, 5, 6])
+
+    def test_clear(self):
+
+        self.buffer.append((1, 1))
+        self.buffer.clear()
+
+        assert len(self.buffer) == 0
+        with self.assertRaises(IndexError):
+            self.buffer.latest()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - [%(levelname)-8s] (%(threadName)-10s) %(message)s")
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestRingBuffer)
+    unittest.TextTestRunner(verbosity=2).run(suite)
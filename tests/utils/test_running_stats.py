@@ -0,0 +1,50 @@
+import logging
+import unittest
+import numpy as np
+
+from irrad_control.utils.running_stats import SlidingWindowStats
+
+
+class TestSlidingWindowStats(unittest.TestCase):
+
+    def test_matches_numpy(self):
+
+        rng = np.random.default_rng(42)
+        window = 2.5
+
+        timestamps = np.cumsum(rng.uniform(1e-3, 2e-2, size=5000))
+        values = rng.normal(2.7e-7, 5e-9, size=timestamps.size)
+        values[rng.integers(0, values.size, size=100)] = np.nan
+
+        stats = SlidingWindowStats(window=window)
+
+        for i, (ts, val) in enumerate(zip(timestamps, values)):
+
+            stats.update(timestamp=ts, value=val)
+
+            if i % 97 == 0:
+                in_window = values[(timestamps > ts - window) & (timestamps <= ts)]
+                np.testing.assert_allclose(stats.mean, np.nanmean(in_window), rtol=1e-12)
+                np.testing.assert_allclose(stats.std, np.nanstd(in_window), rtol=1e-6)
+
+    def test_expiry(self):
+
+        stats = SlidingWindowStats(window=1)
+
+        stats.update(timestamp=0, value=1)
+        stats.update(timestamp=0.5, value=3)
+        assert len(stats) == 2 and stats.mean == 2 and stats.std == 1
+
+        # First sample leaves the window
+        stats.update(timestamp=1.0, value=5)
+        assert len(stats) == 2 and stats.mean == 4
+
+        # Gap longer than the window empties it
+        stats.expire(t_min=10)
+        assert len(stats) == 0 and np.isnan(stats.mean) and np.isnan(stats.std)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - [%(levelname)-8s] (%(threadName)-10s) %(message)s")
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestSlidingWindowStats)
+    unittest.TextTestRunner(verbosity=2).run(suite)
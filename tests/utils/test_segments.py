@@ -0,0 +1,115 @@
+import os
+import logging
+import unittest
+import tempfile
+import numpy as np
+import tables as tb
+
+import irrad_control.utils.segments as segments
+
+
+class TestSegments(unittest.TestCase):
+
+    def setUp(self):
+        self.dtype = np.dtype([('timestamp', '<f8'), ('beam', '<f4')])
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.seg_dir = segments.segment_dir(os.path.join(self.tmp_dir.name, 'test_segments'))
+        os.makedirs(self.seg_dir)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _rows(self, start, stop):
+        rows = np.zeros(shape=stop - start, dtype=self.dtype)
+        rows['timestamp'] = np.arange(start, stop)
+        rows['beam'] = 10 * rows['timestamp']
+        return rows
+
+    def _write_segments(self, n_segments, rows_per_segment=10):
+        """Write *n_segments* segments as the converter does; the histogram counts all rows so far"""
+
+        filters = tb.Filters(complib='zlib', complevel=1)
+
+        with tb.open_file(segments.segment_path(self.seg_dir, 0), 'w') as template:
+
+            template.create_group('/', 'Server')
+            template.create_table('/Server', description=self.dtype, name='Beam', filters=filters)
+            template.create_group('/Server', 'Histogram')
+            template.create_array('/Server/Histogram', 'bin_edges', np.arange(5))
+
+            for i in range(n_segments):
+
+                segment = template if i == 0 else segments.create_segment(path=segments.segment_path(self.seg_dir, i), template=template)
+
+                segment.root.Server.Beam.append(self._rows(i * rows_per_segment, (i + 1) * rows_per_segment))
+                segment.create_array('/Server/Histogram', 'hist', np.full(4, (i + 1) * rows_per_segment))
+
+                if segment is not template:
+                    segment.close()
+
+    def test_create_segment(self):
+
+        self._write_segments(n_segments=2)
+
+        with tb.open_file(segments.segment_path(self.seg_dir, 1)) as segment:
+
+            # Layout of the first segment is kept; rows are only the ones of this segment
+            assert segment.root.Server.Beam.filters.complib == 'zlib'
+            np.testing.assert_array_equal(segment.root.Server.Beam.read(), self._rows(10, 20))
+            np.testing.assert_array_equal(segment.root.Server.Histogram.bin_edges.read(), np.arange(5))
+
+    def test_consolidate_segments(self):
+
+        self._write_segments(n_segments=3)
+
+        out_file = os.path.join(self.tmp_dir.name, 'test_segments.h5')
+
+        assert segments.consolidate_segments(seg_dir=self.seg_dir, out_file=out_file) == 3
+
+        with tb.open_file(out_file) as merged:
+            np.testing.assert_array_equal(merged.root.Server.Beam.read(), self._rows(0, 30))
+            # Histograms are cumulative and taken from the latest segment
+            np.testing.assert_array_equal(merged.root.Server.Histogram.hist.read(), np.full(4, 30))
+
+    def test_skip_corrupt_segment(self):
+
+        self._write_segments(n_segments=3)
+
+        # Last segment is truncated, as after a crash of the converter
+        last_segment = segments.segment_path(self.seg_dir, 2)
+        with open(last_segment, 'r+b') as seg:
+            seg.truncate(os.path.getsize(last_segment) // 2)
+
+        out_file = os.path.join(self.tmp_dir.name, 'test_segments.h5')
+
+        assert segments.consolidate_segments(seg_dir=self.seg_dir, out_file=out_file) == 2
+
+        with tb.open_file(out_file) as merged:
+            np.testing.assert_array_equal(merged.root.Server.Beam.read(), self._rows(0, 20))
+            np.testing.assert_array_equal(merged.root.Server.Histogram.hist.read(), np.full(4, 20))
+
+    def test_skip_unreadable_rows(self):
+
+        self._write_segments(n_segments=3)
+
+        # Middle segment opens fine, but the data of its table is corrupt
+        corrupt_segment = segments.segment_path(self.seg_dir, 1)
+        with tb.open_file(corrupt_segment) as segment:
+            chunk = segment.root.Server.Beam.chunk_info((0,))
+        with open(corrupt_segment, 'r+b') as seg:
+            seg.seek(chunk.offset)
+            seg.write(b'\xff' * chunk.size)
+
+        out_file = os.path.join(self.tmp_dir.name, 'test_segments.h5')
+
+        assert segments.consolidate_segments(seg_dir=self.seg_dir, out_file=out_file) == 2
+
+        with tb.open_file(out_file) as merged:
+            np.testing.assert_array_equal(merged.root.Server.Beam.read(), np.concatenate([self._rows(0, 10), self._rows(20, 30)]))
+            np.testing.assert_array_equal(merged.root.Server.Histogram.hist.read(), np.full(4, 30))
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - [%(levelname)-8s] (%(threadName)-10s) %(message)s")
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestSegments)
+    unittest.TextTestRunner(verbosity=2).run(suite)
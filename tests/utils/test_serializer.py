@@ -0,0 +1,53 @@
+import json
+import logging
+import unittest
+
+from irrad_control.utils.serializer import Serializer, CODECS, detect_codec
+
+
+class TestSerializer(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+
+        cls.raw_data = {'meta': {'timestamp': 1700000000.123456, 'name': '192.168.1.2', 'type': 'raw_data', 'ntc_ch': 3},
+                        'data': {'Left': 0.1 + 0.2, 'Right': -1.5e-9, 'Up': 2.0, 'Down': float('nan'), 'Sum': 0.0}}
+
+    def test_roundtrip(self):
+
+        for codec in CODECS:
+
+            serializer = Serializer(codec=codec)
+            assert serializer.codec == codec
+
+            msg = serializer.dumps(self.raw_data)
+            assert detect_codec(msg) == codec
+
+            decoded = serializer.loads(msg)
+
+            # Floats must survive bit-exact
+            assert json.dumps(decoded) == json.dumps(self.raw_data)
+
+    def test_json_compatibility(self):
+
+        # Messages sent with zmq's send_json are decoded by any serializer
+        msg = json.dumps(self.raw_data).encode('utf8')
+
+        for codec in CODECS:
+            assert json.dumps(Serializer(codec=codec).loads(msg)) == json.dumps(self.raw_data)
+
+    @unittest.skipIf('msgpack' not in CODECS, "msgpack not installed")
+    def test_binary_is_compact(self):
+
+        assert len(Serializer('msgpack').dumps(self.raw_data)) < len(Serializer('json').dumps(self.raw_data))
+
+    def test_unknown_codec(self):
+
+        serializer = Serializer(codec='unknown')
+        assert serializer.codec == 'json'
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - [%(levelname)-8s] (%(threadName)-10s) %(message)s")
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestSerializer)
+    unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,78 @@
+import os
+import logging
+import unittest
+import tempfile
+import numpy as np
+import tables as tb
+
+from irrad_control.utils.table_buffer import TableBuffer, TableWriter
+
+
+class TestTableBuffer(unittest.TestCase):
+
+    def setUp(self):
+        self.dtype = np.dtype([('timestamp', '<f8'), ('beam', '<f4')])
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.out_file = tb.open_file(os.path.join(self.tmp_dir.name, 'test_table_buffer.h5'), 'w')
+        self.table = self.out_file.create_table('/', description=self.dtype, name='Beam')
+
+    def tearDown(self):
+        self.out_file.close()
+        self.tmp_dir.cleanup()
+
+    def _rows(self, start, stop):
+        rows = np.zeros(shape=stop - start, dtype=self.dtype)
+        rows['timestamp'] = np.arange(start, stop)
+        rows['beam'] = 10 * rows['timestamp']
+        return rows
+
+    def test_append_in_chunks(self):
+
+        buffer = TableBuffer(table=self.table, size=4)
+
+        # Single rows are buffered until the buffer is full
+        for i in range(3):
+            buffer.append(self._rows(i, i + 1))
+
+        assert len(buffer) == 3 and self.table.nrows == 0
+
+        buffer.append(self._rows(3, 4))
+        assert len(buffer) == 0 and self.table.nrows == 4
+
+        # Rows exceeding the buffer are appended in multiple chunks
+        buffer.append(self._rows(4, 14))
+        assert len(buffer) == 2 and self.table.nrows == 12
+
+        buffer.flush()
+        assert len(buffer) == 0
+        np.testing.assert_array_equal(self.table.read(), self._rows(0, 14))
+
+    def test_col_includes_buffered_rows(self):
+
+        buffer = TableBuffer(table=self.table, size=100)
+        buffer.append(self._rows(0, 5))
+
+        np.testing.assert_array_equal(buffer.col('beam'), self._rows(0, 5)['beam'])
+
+    def test_writer(self):
+
+        writer = TableWriter()
+        buffer = TableBuffer(table=self.table, size=3, writer=writer)
+
+        # The buffer is reused while the writer appends
+        row = np.zeros(shape=1, dtype=self.dtype)
+        for i in range(10):
+            row['timestamp'], row['beam'] = i, 10 * i
+            buffer.append(row)
+
+        np.testing.assert_array_equal(buffer.col('timestamp'), np.arange(10))
+
+        writer.close()
+
+        np.testing.assert_array_equal(self.table.read(), self._rows(0, 10))
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - [%(levelname)-8s] (%(threadName)-10s) %(message)s")
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestTableBuffer)
+    unittest.TextTestRunner(verbosity=2).run(suite)